@@ -1,37 +1,520 @@
+from __future__ import annotations
+
 import os
 import io
 import json
+import base64
+import html
 import re
-import requests
+import time
+import random
+import hashlib
+import itertools
+import contextvars
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unicodedata
+import uuid
+import zipfile
 import streamlit as st
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from array import array
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict, fields, is_dataclass, replace
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterable, Iterator, List, Set, Tuple, Optional, Union
+from xml.sax.saxutils import escape as xml_escape
 
-from docx import Document
-from docx.shared import Cm, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT, WD_ROW_HEIGHT_RULE
+# Těžké knihovny (python-docx, requests, PIL, pandas, numpy, reportlab) se importují až v místě použití:
+# skript se při studeném startu i při každém rerunu vykoná celý a formulář má být vidět hned.
+# Výstup `python benchmarks/bench_startup.py` to hlídá.
+if TYPE_CHECKING:
+    import numpy as np
+    import requests
+    from docx.document import Document
 
 
 # =========================
 # OpenAI
 # =========================
-OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+# OPENAI_CHAT_URL jde přepsat proměnnou prostředí (např. lokální mock API pro benchmarky)
+OPENAI_CHAT_URL = os.getenv("OPENAI_CHAT_URL") or "https://api.openai.com/v1/chat/completions"
+
+
+def get_config(name: str, default: str = "") -> str:
+    """
+    Hodnota nastavení: nejdřív Streamlit secrets, pak proměnná prostředí.
+    Bez secrets.toml (lokální běh, skripty) st.secrets vyhodí FileNotFoundError.
+    """
+    try:
+        if hasattr(st, "secrets") and name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except FileNotFoundError:
+        pass
+    return (os.getenv(name) or default).strip()
+
+
+def quiet_bare_mode_logs() -> None:
+    """Skripty mimo `streamlit run` (benchmarky, dávkový režim): ztiší varování o chybějícím ScriptRunContext."""
+    import logging
+    from streamlit import config as st_config
+
+    st_config.set_option("global.showWarningOnDirectExecution", False)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
 
 
 def get_openai_key() -> str:
-    if hasattr(st, "secrets") and "OPENAI_API_KEY" in st.secrets:
-        return str(st.secrets["OPENAI_API_KEY"]).strip()
-    return (os.getenv("OPENAI_API_KEY") or "").strip()
+    return get_config("OPENAI_API_KEY")
 
 
 def get_openai_model() -> str:
-    if hasattr(st, "secrets") and "OPENAI_MODEL" in st.secrets:
-        return str(st.secrets["OPENAI_MODEL"]).strip()
-    return (os.getenv("OPENAI_MODEL") or "gpt-4o-mini").strip()
+    return get_config("OPENAI_MODEL", "gpt-4o-mini")
+
+
+# =========================
+# Metriky a měření času
+# =========================
+# Časy se měří v sekundách; hranice histogramu pokrývají rychlé kroky (detect_pack, JSON)
+# i dlouhé dotazy na AI.
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_HELP = {
+    "edread_stage_seconds": ("histogram", "Doba jednotlivých kroků generování (stage)."),
+    "edread_llm_requests_total": ("counter", "Dotazy na AI podle výsledku (ok / error)."),
+    "edread_llm_tokens_total": ("counter", "Tokeny podle usage v odpovědi AI (prompt / completion)."),
+    "edread_cache_requests_total": ("counter", "Dotazy do cache podle výsledku (hit / miss; u near_dup i partial)."),
+    "edread_json_parse_total": ("counter", "Čtení JSON z odpovědi AI (ok / recovered / failed)."),
+    "edread_json_reask_total": ("counter", "Dodatečné dotazy jen na vybrané sekce (chybějící pole, neprošlá kontrola)."),
+    "edread_readability_retry_total": ("counter", "Opakované zjednodušení, které neprošlo kontrolou čitelnosti."),
+    "edread_single_flight_waits_total": (
+        "counter",
+        "Čekání na stejné generování jiné session / repliky (hit = převzat výsledek, miss = generuje znovu).",
+    ),
+}
+
+
+class Metrics:
+    """
+    Jednoduchý registr čítačů a histogramů ve formátu Prometheus (bez závislostí).
+    Vypnutý registr (enabled=False) nic nepočítá – span() pak jen projde.
+    """
+
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = HISTOGRAM_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        # (název, štítky) → [počty v bucketech..., +Inf, součet]
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += value
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        """Text pro /metrics (Prometheus exposition format 0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines: List[str] = []
+        for name in sorted({k[0] for k in counters} | {k[0] for k in histograms}):
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{self._labels(labels)} {value:g}")
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(self.buckets, hist):
+                    le = 'le="%g"' % bound
+                    lines.append(f"{name}_bucket{self._labels(labels, le)} {count:g}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {hist[-2]:g}")
+                lines.append(f"{name}_sum{self._labels(labels)} {hist[-1]:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {hist[-2]:g}")
+        return "\n".join(lines) + "\n"
+
+
+# náhrada za get_metrics() tam, kde se měřit nemá (např. worker v jiném procesu)
+DISABLED_METRICS = Metrics(enabled=False)
+
+
+def start_metrics_server(metrics: Metrics, port: int, host: str = "0.0.0.0"):
+    """Malý HTTP server vedle Streamlitu: GET /metrics vrací metriky pro Prometheus."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="edread-metrics", daemon=True).start()
+    return server
+
+
+@st.cache_resource
+def get_metrics() -> Metrics:
+    # cache_resource: jeden registr (a jeden server na portu) pro celý proces
+    install_worker_log_filter()
+    metrics = Metrics(enabled=get_config("EDREAD_METRICS", "0") == "1")
+    port = int(get_config("EDREAD_METRICS_PORT", "0"))
+    if metrics.enabled and port:
+        try:
+            start_metrics_server(metrics, port)
+        except OSError:
+            # port už drží jiný proces (např. druhá instance aplikace) – metriky jen v paměti
+            pass
+    return metrics
+
+
+_metrics: Optional[Metrics] = None
+
+
+def current_metrics() -> Metrics:
+    """
+    get_metrics() zapamatované v modulu – volání st.cache_resource stojí stovky µs,
+    a span() je na horké cestě. Modul se při rerunu spouští znovu, takže se jen znovu dohledá.
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = get_metrics()
+    return _metrics
+
+
+# Trasa jednoho generování (pro debug výpis v UI). Aktivní jen uvnitř collect_trace();
+# do vláken poolu se předává přes contextvars.copy_context().
+_TRACE: "contextvars.ContextVar[Optional[List[Dict]]]" = contextvars.ContextVar("edread_trace", default=None)
+
+
+@contextmanager
+def collect_trace() -> Iterator[List[Dict]]:
+    """with collect_trace() as trace: … – do `trace` se zapíšou všechny span() a usage z AI."""
+    trace: List[Dict] = []
+    token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _TRACE.reset(token)
+
+
+def trace_event(event: Dict) -> None:
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.append(event)
+
+
+@contextmanager
+def span(stage: str, metrics: Optional[Metrics] = None) -> Iterator[None]:
+    """
+    Změří dobu bloku → histogram edread_stage_seconds{stage=…} a záznam v trase.
+    Když jsou metriky vypnuté a trasa se nesbírá, neměří nic.
+    """
+    metrics = metrics or current_metrics()
+    trace = _TRACE.get()
+    if not metrics.enabled and trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.observe("edread_stage_seconds", elapsed, stage=stage)
+        if trace is not None:
+            trace.append(
+                {"stage": stage, "ms": round(elapsed * 1000, 1), "thread": threading.current_thread().name}
+            )
+
+
+def record_usage(usage: Optional[Dict], metrics: Optional[Metrics] = None) -> None:
+    """Tokeny z `usage` v odpovědi AI → čítače a trasa."""
+    if not usage:
+        return
+    metrics = metrics or current_metrics()
+    prompt = int(usage.get("prompt_tokens") or 0)
+    completion = int(usage.get("completion_tokens") or 0)
+    metrics.inc("edread_llm_tokens_total", prompt, kind="prompt")
+    metrics.inc("edread_llm_tokens_total", completion, kind="completion")
+    trace_event({"stage": "usage", "prompt_tokens": prompt, "completion_tokens": completion})
+
+
+# =========================
+# OpenAI – sdílený HTTP klient
+# =========================
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Klasický token bucket: `rate_per_min` jednotek za minutu, zásobník max. `capacity`."""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = float(rate_per_min) / 60.0
+        self.capacity = float(capacity or rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Kolik sekund ještě čekat na `amount` jednotek (0 = lze hned – a rovnou se odečtou)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Vrátí odečtené jednotky (dotaz se nakonec nepustil); zásobník nepřeteče přes `capacity`."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """
+    Po `threshold` neúspěšných voláních za sebou se „otevře“ a na `cooldown_s` odmítá dotazy.
+    Pak pustí jeden zkušební dotaz (half-open); úspěch jistič zase zavře.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown_s: float = 30.0):
+        self.threshold = int(threshold)
+        self.cooldown_s = float(cooldown_s)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown_s:
+                # half-open: posuneme čas otevření, aby prošel jen jeden zkušební dotaz
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Retry-After v sekundách nebo jako HTTP datum; OpenAI posílá i retry-after-ms."""
+    from email.utils import parsedate_to_datetime
+
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenAIClient:
+    """
+    Jeden klient pro celý proces (všechny session):
+    - requests.Session s poolem spojení (keep-alive, bez nového TLS handshaku),
+    - opakování při 429/5xx a chybách spojení s exponenciálním backoffem s jitterem (respektuje Retry-After),
+    - limit dotazů a tokenů za minutu (RPM/TPM) na straně klienta,
+    - circuit breaker, aby se při výpadku API nehromadily čekající dotazy.
+    """
+
+    def __init__(
+        self,
+        rpm: float = 500,
+        tpm: float = 200_000,
+        max_retries: int = 3,
+        backoff_base_s: float = 1.0,
+        backoff_max_s: float = 30.0,
+        pool_size: int = 16,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self.max_retries = int(max_retries)
+        self.backoff_base_s = float(backoff_base_s)
+        self.backoff_max_s = float(backoff_max_s)
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+
+    def _acquire(self, tokens: int, deadline: Optional[float] = None) -> None:
+        while True:
+            with self._lock:
+                delay = self.requests_bucket.wait_time(1)
+                if delay == 0.0:
+                    delay = self.tokens_bucket.wait_time(tokens)
+                    if delay > 0.0:
+                        # dotaz se nepustil – vrátíme odečtený „request“ token
+                        self.requests_bucket.refund(1)
+            if delay == 0.0:
+                return
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise RuntimeError("OpenAI API: limit dotazů za minutu nepustí dotaz před vypršením časového limitu.")
+            # čekání na limit účtu (RPM/TPM) – v zátěži odliší brzdu na straně API od přetížené aplikace
+            with span("rate_limit_wait"):
+                time.sleep(min(delay, 5.0))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def _fits(delay: float, deadline: Optional[float]) -> bool:
+        return deadline is None or time.monotonic() + delay < deadline
+
+    def post(
+        self,
+        url: str,
+        headers: Dict,
+        payload: Dict,
+        timeout: float,
+        stream: bool = False,
+        deadline: Optional[float] = None,
+    ) -> requests.Response:
+        """
+        deadline: čas (time.monotonic()), do kdy musí dotaz skončit i s opakováními – timeout jednoho pokusu
+        se zkrátí na zbývající čas a opakování, které by limit přesáhlo, se už nepustí.
+        """
+        import requests
+
+        if not self.breaker.allow():
+            raise RuntimeError("OpenAI API je dočasně nedostupné (opakované chyby) – zkus to za chvíli znovu.")
+
+        # hrubý odhad tokenů: ~3 znaky na token + rezervovaný výstup
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        tokens = prompt_chars // 3 + int(payload.get("max_tokens", 0))
+
+        attempt = 0
+        while True:
+            self._acquire(tokens, deadline)
+            attempt_timeout = timeout
+            if deadline is not None:
+                attempt_timeout = min(timeout, deadline - time.monotonic())
+                if attempt_timeout <= 0:
+                    raise RuntimeError("OpenAI API: vypršel časový limit dotazu.")
+            try:
+                r = self.session.post(url, headers=headers, json=payload, timeout=attempt_timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._backoff(attempt, None)
+                if attempt >= self.max_retries or not self._fits(delay, deadline):
+                    self.breaker.record(False)
+                    raise RuntimeError(f"OpenAI API nedostupné: {e}") from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if r.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, parse_retry_after(r.headers))
+                if self._fits(delay, deadline):
+                    r.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+            if r.status_code != 200:
+                # výpadek API je jen 5xx; chyby klienta (400, 401…) ani vyčerpaný limit účtu (429) jistič
+                # nemění – neotevírají ho (špička ve třídě by shodila všechny session), ale ani nezavírají
+                # (střídání 5xx/400 by ho jinak nikdy neotevřelo); 429 brzdí TokenBucket a Retry-After
+                if r.status_code >= 500:
+                    self.breaker.record(False)
+                raise RuntimeError(f"OpenAI API chyba ({r.status_code}): {r.text}")
+
+            self.breaker.record(True)
+            return r
+
+
+@st.cache_resource
+def get_openai_client() -> OpenAIClient:
+    return OpenAIClient(
+        rpm=float(get_config("OPENAI_RPM", "500")),
+        tpm=float(get_config("OPENAI_TPM", "200000")),
+        max_retries=int(get_config("OPENAI_MAX_RETRIES", "3")),
+        pool_size=int(get_config("OPENAI_POOL_SIZE", "16")),
+        breaker=CircuitBreaker(
+            threshold=int(get_config("OPENAI_BREAKER_FAILURES", "5")),
+            cooldown_s=float(get_config("OPENAI_BREAKER_COOLDOWN_S", "30")),
+        ),
+    )
 
 
-def call_openai_chat(system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 2200) -> str:
+def call_openai_chat(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    max_tokens: int = 2200,
+    timeout: float = 90,
+    client: Optional[OpenAIClient] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """
+    client: sdílený OpenAIClient; z vláken poolu ho předávej explicitně
+    (st.cache_resource mimo vlákno skriptu vypisuje varování).
+    deadline: nejzazší konec dotazu včetně opakování (time.monotonic(), viz OpenAIClient.post).
+    """
     api_key = get_openai_key()
     if not api_key:
         raise RuntimeError("Chybí OPENAI_API_KEY (Streamlit Cloud → Settings → Secrets).")
@@ -46,12 +529,17 @@ def call_openai_chat(system_prompt: str, user_prompt: str, temperature: float =
         ],
     }
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    r = requests.post(OPENAI_CHAT_URL, headers=headers, json=payload, timeout=90)
-
-    if r.status_code != 200:
-        raise RuntimeError(f"OpenAI API chyba ({r.status_code}): {r.text}")
-
-    data = r.json()
+    client = client or get_openai_client()
+    metrics = current_metrics()
+    with span("call_openai_chat", metrics):
+        try:
+            r = client.post(OPENAI_CHAT_URL, headers, payload, timeout=timeout, deadline=deadline)
+            data = r.json()
+        except Exception:
+            metrics.inc("edread_llm_requests_total", result="error")
+            raise
+    metrics.inc("edread_llm_requests_total", result="ok")
+    record_usage(data.get("usage"), metrics)
     return data["choices"][0]["message"]["content"]
 
 
@@ -59,12 +547,16 @@ def call_openai_chat(system_prompt: str, user_prompt: str, temperature: float =
 # DOCX helpers
 # =========================
 def set_doc_defaults(doc: Document) -> None:
+    from docx.shared import Pt
+
     style = doc.styles["Normal"]
     style.font.name = "Calibri"
     style.font.size = Pt(11)
 
 
 def add_h1(doc: Document, text: str) -> None:
+    from docx.shared import Pt
+
     p = doc.add_paragraph()
     r = p.add_run(text)
     r.bold = True
@@ -72,6 +564,8 @@ def add_h1(doc: Document, text: str) -> None:
 
 
 def add_h2(doc: Document, text: str) -> None:
+    from docx.shared import Pt
+
     p = doc.add_paragraph()
     r = p.add_run(text)
     r.bold = True
@@ -79,6 +573,8 @@ def add_h2(doc: Document, text: str) -> None:
 
 
 def add_spacer(doc: Document, cm: float = 0.2) -> None:
+    from docx.shared import Pt
+
     p = doc.add_paragraph("")
     p.paragraph_format.space_after = Pt(int(cm * 28.35))
 
@@ -96,36 +592,52 @@ def safe_filename(name: str) -> str:
     return name if name else "edread_ai"
 
 
+def output_names(title: str, grades: Optional[List[int]] = None) -> Dict[str, str]:
+    """
+    Jména souborů pro všechny dokumenty ve všech formátech (klíče viz file_key);
+    se `grades` pro sadu více ročníků (klíče viz grade_key, jména s „_4_rocnik“).
+    """
+    base = safe_filename(title)
+    stems = {
+        "pl_full": f"pracovni_list_{base}_plny",
+        "pl_simpl": f"pracovni_list_{base}_zjednoduseny",
+        "pl_lmp": f"pracovni_list_{base}_LMP_SPU",
+        "method": f"metodika_{base}",
+    }
+    if grades:
+        return {
+            file_key(grade_key(grade, key), fmt): f"{stem}_{int(grade)}_rocnik.{fmt}"
+            for grade in grades
+            for fmt in OUTPUT_FORMATS
+            for key, stem in stems.items()
+        }
+    return {file_key(key, fmt): f"{stem}.{fmt}" for fmt in OUTPUT_FORMATS for key, stem in stems.items()}
+
+
 def asset_candidates() -> Dict[str, List[str]]:
     """
-    Více názvů pro stejné tabulky – aby to sedělo na různé verze souborů.
+    Více názvů pro stejné tabulky – aby to sedělo na různé verze souborů (viz packs.json).
     Ulož do assets/ aspoň jednu z uvedených variant.
     """
-    return {
-        "karetni_table": [
-            "assets/karetni_table.png",
-            "assets/karetni_table_only.png",
-        ],
-        "sladke_table": [
-            "assets/sladke_table.png",
-            "assets/sladke_p1.png",
-            "assets/sladke_p1_300.png",
-        ],
-        "venecky_table": [
-            "assets/venecky_table.png",
-            "assets/venecky_p2_300.png",
-        ],
-    }
+    return {table.key: table.candidates for pack in get_pack_registry().packs for table in pack.tables}
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 def find_existing_asset(paths: List[str]) -> Optional[str]:
+    # relativní cesty bereme vůči složce aplikace, ne vůči aktuálnímu adresáři
     for p in paths:
-        if os.path.exists(p):
-            return p
+        full = p if os.path.isabs(p) else os.path.join(APP_DIR, p)
+        if os.path.exists(full):
+            return full
     return None
 
 
 def add_image_if_exists(doc: Document, path: str, width_cm: float = 16.0, center: bool = True) -> bool:
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Cm
+
     if not path or not os.path.exists(path):
         return False
     p = doc.add_paragraph()
@@ -136,28 +648,225 @@ def add_image_if_exists(doc: Document, path: str, width_cm: float = 16.0, center
     return True
 
 
+def add_image_bytes(doc: Document, data: bytes, width_cm: float = 16.0, center: bool = True) -> None:
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Cm
+
+    p = doc.add_paragraph()
+    if center:
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run = p.add_run()
+    run.add_picture(io.BytesIO(data), width=Cm(width_cm))
+
+
+# =========================
+# Tabulky (PNG) – načtené a optimalizované jednou
+# =========================
+@dataclass
+class TableImage:
+    source: str
+    data: bytes
+    original_size: int
+
+
+def optimize_table_png(path: str, width_cm: float = 16.0, dpi: int = 150, colors: int = 256) -> bytes:
+    """
+    Připraví PNG pro tisk v šířce width_cm: zmenší na šířku odpovídající DPI (nikdy nezvětšuje),
+    průhlednost slije na bílý papír a volitelně převede na paletu (colors=0 → plné barvy).
+    """
+    from PIL import Image
+
+    with Image.open(path) as im:
+        im.load()
+        if im.mode in ("RGBA", "LA", "P"):
+            rgba = im.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            img = im.convert("RGB")
+
+    target_px = int(round(width_cm / 2.54 * dpi))
+    if img.width > target_px:
+        img = img.resize((target_px, max(1, round(img.height * target_px / img.width))), Image.LANCZOS)
+    if colors:
+        img = img.quantize(colors=int(colors), method=Image.Quantize.MEDIANCUT)
+
+    bio = io.BytesIO()
+    img.save(bio, "PNG", optimize=True, dpi=(dpi, dpi))
+    return bio.getvalue()
+
+
+@st.cache_resource
+def find_table_assets() -> Dict[str, Optional[str]]:
+    """Kde leží tabulky z assets/ (None = chybí) – jen vyhledání, bez načítání obrázků (kontrola na úvodní stránce)."""
+    return {key: find_existing_asset(candidates) for key, candidates in asset_candidates().items()}
+
+
+@st.cache_resource
+def get_table_images() -> Dict[str, TableImage]:
+    """Všechny tabulky z assets/ – optimalizované jednou za běh aplikace, až při prvním generování."""
+    dpi = int(get_config("EDREAD_TABLE_DPI", "150"))
+    colors = int(get_config("EDREAD_TABLE_COLORS", "256"))
+    images: Dict[str, TableImage] = {}
+    for key, path in find_table_assets().items():
+        if not path:
+            continue
+        try:
+            data = optimize_table_png(path, width_cm=16.0, dpi=dpi, colors=colors)
+        except Exception:
+            # neznámý formát / poškozený soubor – vložíme originál tak, jak je
+            with open(path, "rb") as f:
+                data = f.read()
+        # optimalizace nesmí soubor zvětšit
+        original_size = os.path.getsize(path)
+        if len(data) >= original_size:
+            with open(path, "rb") as f:
+                data = f.read()
+        images[key] = TableImage(source=path, data=data, original_size=original_size)
+    return images
+
+
 # =========================
 # Detekce „speciálních“ textů
 # =========================
-def detect_pack(title: str, full_text: str) -> str:
-    t = (title or "").lower()
-    x = (full_text or "").lower()
-    if "karetní hra" in t or "karetni hra" in t or "karetní" in t or "karetni" in t:
-        return "karetni"
-    if "sladké mámení" in t or "sladke mamen" in t or "mámení" in t or "mamen" in t:
-        return "sladke"
-    if "věnečky" in t or "venecky" in t:
-        return "venecky"
+def fold_text(text: str) -> str:
+    """Malá písmena bez diakritiky – „Karetní“ i „karetni“ pak porovnáváme stejně."""
+    return re.sub("[\u0300-\u036f]", "", unicodedata.normalize("NFD", text or "")).lower()
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick: všechna klíčová slova najednou v jednom průchodu textem,
+    takže doba závisí jen na délce textu, ne na počtu packů a slov.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in patterns:
+            node = 0
+            for c in pattern:
+                nxt = self._goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(pattern)
+
+        # fail odkazy po úrovních (BFS; uzly 1. úrovně vedou do kořene); výstupy se dědí po fail odkazu
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for c, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> set:
+        """Množina klíčových slov, která se v textu vyskytují."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for c in text:
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+@dataclass
+class PackTable:
+    key: str
+    caption: str
+    missing: str
+    candidates: List[str]
+
+
+@dataclass
+class Pack:
+    name: str
+    label: str
+    title_keywords: List[str]
+    text_rules: List[List[str]]  # stačí jedno pravidlo; v pravidle musí být všechna slova
+    tables: List[PackTable]
+    builders: List[str]
+    method_notes: List[str]
+    text_priority: Optional[int] = None  # pořadí při rozpoznání podle obsahu; bez zadání pořadí v souboru
+
+
+class PackRegistry:
+    """Packy z konfiguračního souboru + jeden předkompilovaný matcher pro všechna klíčová slova."""
+
+    def __init__(self, packs: List[Pack]):
+        self.packs = packs
+        self.by_name = {p.name: p for p in packs}
+        for p in packs:
+            p.title_keywords = [fold_text(k) for k in p.title_keywords]
+            p.text_rules = [[fold_text(k) for k in rule] for rule in p.text_rules]
+            unknown = [b for b in p.builders if b not in PACK_BUILDERS]
+            if unknown:
+                raise ValueError(f"Pack {p.name}: neznámý builder {', '.join(unknown)}")
+        patterns = {k for p in packs for k in p.title_keywords}
+        patterns.update(k for p in packs for rule in p.text_rules for k in rule)
+        self.matcher = KeywordMatcher(sorted(patterns))
+        order = {p.name: i for i, p in enumerate(packs)}
+        self.text_order = sorted(
+            packs, key=lambda p: (p.text_priority if p.text_priority is not None else order[p.name], order[p.name])
+        )
+
+    def get(self, name: str) -> Optional[Pack]:
+        return self.by_name.get(name)
+
+    def detect(self, title: str, full_text: str) -> str:
+        # název má přednost před obsahem; mezi packy rozhoduje pořadí v souboru
+        in_title = self.matcher.find(fold_text(title))
+        for p in self.packs:
+            if any(k in in_title for k in p.title_keywords):
+                return p.name
+
+        # fallback podle obsahu – pořadí podle text_priority (text může splnit pravidla více packů)
+        in_text = self.matcher.find(fold_text(full_text))
+        for p in self.text_order:
+            if any(all(k in in_text for k in rule) for rule in p.text_rules):
+                return p.name
+        return "custom"
+
+
+def load_pack_registry(path: str) -> PackRegistry:
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    packs = [
+        Pack(
+            name=str(p["name"]),
+            label=str(p.get("label") or p["name"]),
+            title_keywords=[str(k) for k in p.get("title_keywords", [])],
+            text_rules=[[str(k) for k in rule] for rule in p.get("text_rules", [])],
+            tables=[PackTable(**t) for t in p.get("tables", [])],
+            builders=[str(b) for b in p.get("builders", [])],
+            method_notes=[str(n) for n in p.get("method_notes", [])],
+            text_priority=int(p["text_priority"]) if p.get("text_priority") is not None else None,
+        )
+        for p in config["packs"]
+    ]
+    return PackRegistry(packs)
 
-    # fallback podle obsahu
-    if "kdo přebije koho" in x or "žolík" in x or "chameleon" in x:
-        return "karetni"
-    if "věneček" in x and "cukrárn" in x:
-        return "venecky"
-    if "mámení" in x and "sladké" in x:
-        return "sladke"
 
-    return "custom"
+@st.cache_resource
+def get_pack_registry() -> PackRegistry:
+    path = get_config("EDREAD_PACKS_FILE", "packs.json")
+    return load_pack_registry(path if os.path.isabs(path) else os.path.join(APP_DIR, path))
+
+
+def detect_pack(title: str, full_text: str) -> str:
+    return get_pack_registry().detect(title, full_text)
 
 
 # =========================
@@ -198,501 +907,4359 @@ PYRAMID_ORDER_STRONG_TO_WEAK = [
 ]
 
 
-def add_karetni_cards_3col(doc: Document) -> None:
-    add_h2(doc, "Kartičky zvířat (vystřihni)")
-    doc.add_paragraph("Vystřihni kartičky. Pak je použiješ do pyramidy síly.")
-    table = doc.add_table(rows=0, cols=3)
-    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-    # rozdělení do 3 sloupců
-    cells = []
-    for emoji, name in ANIMALS:
-        cells.append((emoji, name))
-
-    # doplnění do řádků
-    idx = 0
-    while idx < len(cells):
-        row_cells = table.add_row().cells
-        for c in range(3):
-            if idx < len(cells):
-                emoji, name = cells[idx]
-                p1 = row_cells[c].paragraphs[0]
-                p1.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                r1 = p1.add_run(emoji)
-                r1.font.size = Pt(26)
-
-                p2 = row_cells[c].add_paragraph()
-                p2.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                r2 = p2.add_run(name)
-                r2.bold = True
-                r2.font.size = Pt(12)
-                idx += 1
-            else:
-                row_cells[c].text = ""
-
-    # trochu prostoru
-    doc.add_paragraph("")
-
-
-def add_pyramid_column(doc: Document, card_width_cm: float = 6.0, box_height_cm: float = 1.6) -> None:
+def karetni_cards_blocks() -> List["Block"]:
+    """Kartičky zvířat ve 3 sloupcích (k vystřižení)."""
+    rows: List[Tuple[Tuple["Para", ...], ...]] = []
+    for i in range(0, len(ANIMALS), 3):
+        cells = []
+        for emoji, name in ANIMALS[i:i + 3]:
+            cells.append((para(emoji, size_pt=26, center=True), para(name, bold=True, size_pt=12, center=True)))
+        # prázdné buňky do konce řádku
+        cells += [(Para((TextRun(""),)),)] * (3 - len(cells))
+        rows.append(tuple(cells))
+    return [
+        Heading("Kartičky zvířat (vystřihni)", 2),
+        para("Vystřihni kartičky. Pak je použiješ do pyramidy síly."),
+        GridTable(rows=tuple(rows)),
+        para(""),  # trochu prostoru
+    ]
+
+
+def pyramid_column_blocks(card_width_cm: float = 6.0, box_height_cm: float = 1.6) -> List["Block"]:
     """
     Sloupcová „pyramida“ – jedno okénko na každé zvíře.
     Okénka jsou úmyslně větší, aby se do nich vešly kartičky.
     """
-    add_h2(doc, "Pyramida síly (nalep kartičky)")
-    doc.add_paragraph(
-        "Nalep kartičky do pyramidy podle pravidel hry: Nahoře nejsilnější, dole nejslabší."
+    # 2 sloupce: vlevo pořadí (1–13), vpravo okénko pro kartičku (prázdno, aby se držela výška)
+    rows = tuple(
+        ((para(f"{i}.", center=True),), (para(" ", center=True),))
+        for i in range(1, len(PYRAMID_ORDER_STRONG_TO_WEAK) + 1)
     )
+    return [
+        Heading("Pyramida síly (nalep kartičky)", 2),
+        para("Nalep kartičky do pyramidy podle pravidel hry: Nahoře nejsilnější, dole nejslabší."),
+        GridTable(rows=rows, col_widths_cm=(1.0, card_width_cm), row_height_cm=box_height_cm),
+        para(""),
+    ]
 
-    # 2 sloupce: vlevo pořadí (1–13), vpravo okénko pro kartičku
-    table = doc.add_table(rows=len(PYRAMID_ORDER_STRONG_TO_WEAK), cols=2)
-    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-    for i, animal_name in enumerate(PYRAMID_ORDER_STRONG_TO_WEAK, start=1):
-        row = table.rows[i - 1]
-        row.height = Cm(box_height_cm)
-        row.height_rule = WD_ROW_HEIGHT_RULE.EXACTLY
-
-        left = row.cells[0]
-        right = row.cells[1]
 
-        left.text = f"{i}."
-        left.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-        # okénko – necháme prázdné, ale doplníme jemný popisek (učitel může vypnout)
-        p = right.paragraphs[0]
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        rr = p.add_run(" ")  # prázdno, aby se držela výška
-
-        # šířky sloupců (python-docx neumí 100% fixně, ale Word to drží dobře)
-        left.width = Cm(1.0)
-        right.width = Cm(card_width_cm)
-
-    doc.add_paragraph("")
-
-
-def add_karetni_pack_extras(doc: Document, include_table: bool = True) -> None:
+def karetni_extras_blocks(include_table: bool = True) -> List["Block"]:
     """
-    Přidá do pracovního listu Karetní hry:
-    - tabulku „Kdo přebije koho?“ (PNG)
-    - pyramidu + kartičky
+    Pomůcky do pracovního listu Karetní hry:
+    - tabulka „Kdo přebije koho?“ (PNG)
+    - pyramida + kartičky
     """
-    add_h2(doc, "Pomůcky k pravidlům hry")
+    blocks: List[Block] = [Heading("Pomůcky k pravidlům hry", 2)]
     # tabulka (PNG) – musí být v assets
     if include_table:
-        pth = find_existing_asset(asset_candidates()["karetni_table"])
-        if pth:
-            doc.add_paragraph("Tabulka: Kdo přebije koho?")
-            add_image_if_exists(doc, pth, width_cm=16.0, center=True)
+        img = get_table_images().get("karetni_table")
+        if img:
+            blocks += [para("Tabulka: Kdo přebije koho?"), Picture(img.data)]
         else:
-            doc.add_paragraph("⚠️ Tabulka „Kdo přebije koho?“ nebyla nalezena (chybí PNG v assets/).")
+            blocks.append(para("⚠️ Tabulka „Kdo přebije koho?“ nebyla nalezena (chybí PNG v assets/)."))
 
-    add_spacer(doc, 0.15)
-    add_pyramid_column(doc, card_width_cm=6.5, box_height_cm=1.7)
-    add_karetni_cards_3col(doc)
+    blocks.append(Spacer(0.15))
+    blocks += pyramid_column_blocks(card_width_cm=6.5, box_height_cm=1.7)
+    blocks += karetni_cards_blocks()
+    return blocks
 
 
-# =========================
-# AI – struktura z vlastního textu
-# =========================
-@dataclass
-class GeneratedStructure:
-    simpl: str
-    lmp: str
-    drama_intro: str
-    drama_scene: List[Tuple[str, str]]
-    glossary: Dict[str, str]
-    questions_A: List[str]
-    questions_B: List[str]
-    questions_C: List[str]
+# Pomůcky packů, na které odkazuje packs.json („builders“) – bloky se vkládají do pracovního listu za text.
+PACK_BUILDERS: Dict[str, Callable[[], List["Block"]]] = {
+    "karetni_extras": lambda: karetni_extras_blocks(include_table=False),  # tabulka už je u textu
+}
 
 
-def ai_generate_structure(full_text: str, grade: int, title: str) -> GeneratedStructure:
+# =========================
+# Analýza textu (lokálně, bez AI)
+# =========================
+# Čitelnost a obtížná slova spočítáme sami: AI pak dostane hotové kandidáty do slovníčku
+# a u zjednodušených verzí ověříme, že jsou opravdu jednodušší než originál.
+CZECH_VOWELS = "aeiouyáéíóúůýě"
+WORD_RE = re.compile(r"[^\W\d_]+")
+SYLLABLE_RE = re.compile(f"[{CZECH_VOWELS}]+")
+# slabikotvorné r/l mezi souhláskami nebo na konci slova (vlk, smrt, bratr)
+SYLLABIC_RL_RE = re.compile(f"(?<=[^{CZECH_VOWELS}])[rl](?=[^{CZECH_VOWELS}]|$)")
+
+# orientační cílový LIX (Björnsson) podle ročníku; LIX = slov na větu + % slov delších než 6 písmen
+GRADE_LIX_TARGETS = {1: 20, 2: 23, 3: 26, 4: 29, 5: 32, 6: 35, 7: 38, 8: 41, 9: 44}
+LONG_WORD_LEN = 7  # LIX: dlouhé slovo má víc než 6 písmen
+HARD_WORD_MIN_LEN = 7
+HARD_WORD_RANK = 700  # slova ve frekvenčním slovníku až za tímto pořadím bereme jako méně častá
+HARD_WORD_LIMIT = 14
+# kratší text nemá spolehlivou statistiku – zjednodušení u něj neověřujeme
+MIN_WORDS_FOR_CHECK = 40
+
+# lehký stemmer: odtržení pádových a nejčastějších slovesných koncovek (nejdelší napřed)
+CZECH_SUFFIXES: Tuple[Tuple[int, Tuple[str, ...]], ...] = (
+    (5, ("atech",)),
+    (4, ("ětem", "etem", "atům")),
+    (3, ("ech", "ich", "ích", "ého", "ěmi", "emi", "ému", "ěte", "ete", "ěti", "eti", "ího", "iho", "ími",
+         "imu", "ách", "ata", "aty", "ých", "ama", "ami", "ové", "ovi", "ými", "ala", "ila", "ali", "ili")),
+    (2, ("em", "es", "ém", "ím", "ům", "at", "ám", "os", "us", "ým", "mi", "ou", "al", "il", "it", "ět", "et")),
+    (1, ("a", "e", "i", "o", "u", "y", "á", "é", "í", "ý", "ě")),
+)
+
+
+def czech_stem(word: str) -> str:
+    """„zvířata“, „zvířatům“ i „zvíře“ → stejný kmen; kmen má vždy aspoň 3 písmena."""
+    w = word.lower()
+    for length, suffixes in CZECH_SUFFIXES:
+        if len(w) > length + 2 and w.endswith(suffixes):
+            return w[:-length]
+    return w
+
+
+class FrequencyLexicon:
     """
-    Z jednoho vstupního textu vygeneruje:
-    - zjednodušenou verzi
-    - LMP/SPU verzi
-    - dramatizaci (intro + 3–6 replik)
-    - slovníček pojmů
-    - otázky A/B/C
+    Frekvenční slovník v kompaktní podobě: seřazené kmeny v jednom řetězci, jejich začátky
+    a pořadí v array('I'). Hledá se binárním půlením – žádné tisíce malých objektů v paměti.
     """
-    if not get_openai_key():
-        return GeneratedStructure(
-            simpl=full_text,
-            lmp=full_text,
-            drama_intro="(Dramatizace není k dispozici – chybí OPENAI_API_KEY.)",
-            drama_scene=[],
-            glossary={},
-            questions_A=["(Otázky A nejsou k dispozici – chybí OPENAI_API_KEY.)"],
-            questions_B=["(Otázky B nejsou k dispozici – chybí OPENAI_API_KEY.)"],
-            questions_C=["(Otázky C nejsou k dispozici – chybí OPENAI_API_KEY.)"],
-        )
 
-    system = (
-        "Jsi odborník na český jazyk, čtenářskou gramotnost a RVP ZV. "
-        "Umíš tvořit pracovní listy ve stylu ČŠI (čtení s porozuměním). "
-        "Výstup musí být validní JSON, žádný komentář navíc."
-    )
+    def __init__(self, words: List[str]):
+        best: Dict[str, int] = {}
+        for rank, word in enumerate(words, start=1):
+            best.setdefault(czech_stem(word), rank)
+        stems = sorted(best)
+        self._blob = "".join(stems)
+        self._starts = array("I", itertools.accumulate((len(s) for s in stems), initial=0))
+        self._ranks = array("I", (best[s] for s in stems))
+
+    @classmethod
+    def load(cls, path: str) -> "FrequencyLexicon":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([line.strip() for line in f if line.strip() and not line.startswith("#")])
+
+    def __len__(self) -> int:
+        return len(self._ranks)
+
+    def _stem_at(self, i: int) -> str:
+        return self._blob[self._starts[i]:self._starts[i + 1]]
+
+    def rank(self, word: str) -> Optional[int]:
+        """Pořadí slova podle frekvence (1 = nejčastější), None = ve slovníku není."""
+        key = czech_stem(word)
+        lo, hi = 0, len(self._ranks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._stem_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._ranks) and self._stem_at(lo) == key:
+            return self._ranks[lo]
+        return None
 
-    user = f"""
-Máš vytvořit pracovní list pro žáky {grade}. ročníku ZŠ.
-Název úlohy: {title}
 
-Vstupní text (plná verze):
-\"\"\"{full_text}\"\"\"
+@st.cache_resource
+def get_frequency_lexicon() -> FrequencyLexicon:
+    path = get_config("EDREAD_LEXICON_FILE", "assets/cs_frequency.txt")
+    return FrequencyLexicon.load(path if os.path.isabs(path) else os.path.join(APP_DIR, path))
 
-ÚKOL:
-1) Vytvoř ZJEDNODUŠENOU verzi textu (pro běžné žáky).
-2) Vytvoř LMP/SPU verzi (velmi krátké věty, maximální srozumitelnost).
-3) Vytvoř krátkou DRAMATIZACI:
-   - 1–2 věty „drama_intro“ (co se bude hrát, proč).
-   - 3–6 replik ve formátu: [ ["Role", "replika"], ... ]
-   - Scénka má být „bez pomůcek“, jen hraní rolí.
-4) Vytvoř SLOVNÍČEK:
-   - vyber 8–14 slov z textu, která mohou být pro žáky obtížná,
-   - ke každému napiš krátké vysvětlení (max 12 slov),
-   - vrať jako slovník {{ "slovo": "vysvětlení" }}.
-5) Vytvoř OTÁZKY A/B/C:
-   - A: 3–4 otázky na vyhledávání informací.
-   - B: 2–3 otázky na porozumění a interpretaci.
-   - C: 2–3 otázky na názor / kritické čtení (žák zdůvodní).
 
-VRAŤ POUZE JSON VE FORMÁTU:
+@dataclass
+class TextAnalysis:
+    sentences: int
+    words: int
+    avg_sentence_words: float
+    avg_word_syllables: float
+    long_word_ratio: float
+    lix: float
+    hard_words: List[str]
+
+    @property
+    def estimated_grade(self) -> int:
+        """Nejnižší ročník, pro který text nepřekračuje cílový LIX (nad 9. ročník → 10)."""
+        for grade, target in GRADE_LIX_TARGETS.items():
+            if self.lix <= target:
+                return grade
+        return 10
+
+
+def lix_target(grade: int) -> float:
+    return GRADE_LIX_TARGETS[min(max(int(grade), 1), 9)]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?…])\s+|\n+", text or "") if WORD_RE.search(s)]
+
+
+def count_syllables(word: str) -> int:
+    w = word.lower()
+    return max(1, len(SYLLABLE_RE.findall(w)) + len(SYLLABIC_RL_RE.findall(w)))
+
+
+def analyze_text(text: str, lexicon: Optional[FrequencyLexicon] = None) -> TextAnalysis:
+    """Statistika vět a slov, LIX a kandidáti do slovníčku (dlouhá slova mimo běžnou slovní zásobu)."""
+    lexicon = lexicon or get_frequency_lexicon()
+    sentences = split_sentences(text)
+    words = syllables = long_words = 0
+    # kmen → (pořadí ve slovníku nebo None, první výskyt v textu)
+    candidates: Dict[str, Tuple[Optional[int], str]] = {}
+    for sentence in sentences:
+        for i, word in enumerate(WORD_RE.findall(sentence)):
+            words += 1
+            syllables += count_syllables(word)
+            if len(word) >= LONG_WORD_LEN:
+                long_words += 1
+            # velké písmeno uprostřed věty = nejspíš vlastní jméno
+            if len(word) < HARD_WORD_MIN_LEN or (i > 0 and word[0].isupper()):
+                continue
+            stem = czech_stem(word)
+            if stem in candidates:
+                continue
+            rank = lexicon.rank(word)
+            if rank is None or rank > HARD_WORD_RANK:
+                candidates[stem] = (rank, word.lower())
+
+    # napřed slova mimo slovník (delší = těžší), pak méně častá podle pořadí
+    ordered = sorted(candidates.values(), key=lambda c: (c[0] is not None, -(c[0] or len(c[1]))))
+    n_sent = max(len(sentences), 1)
+    n_words = max(words, 1)
+    return TextAnalysis(
+        sentences=len(sentences),
+        words=words,
+        avg_sentence_words=words / n_sent,
+        avg_word_syllables=syllables / n_words,
+        long_word_ratio=long_words / n_words,
+        lix=words / n_sent + 100.0 * long_words / n_words,
+        hard_words=[word for _, word in ordered[:HARD_WORD_LIMIT]],
+    )
 
-{{
-  "simpl": "...",
-  "lmp": "...",
-  "drama_intro": "...",
-  "drama_scene": [
-    ["Role 1", "replika 1"],
-    ["Role 2", "replika 2"]
-  ],
-  "glossary": {{
-    "slovo1": "vysvětlení1",
-    "slovo2": "vysvětlení2"
-  }},
-  "questions_A": ["otázka A1", "otázka A2"],
-  "questions_B": ["otázka B1", "otázka B2"],
-  "questions_C": ["otázka C1", "otázka C2"]
-}}
-"""
 
-    out = call_openai_chat(system, user, temperature=0.2, max_tokens=2600)
-    data = json.loads(out)
-
-    simpl = str(data.get("simpl", full_text)).strip() or full_text
-    lmp = str(data.get("lmp", full_text)).strip() or full_text
-    drama_intro = str(data.get("drama_intro", "")).strip()
-
-    drama_scene_raw = data.get("drama_scene", [])
-    drama_scene: List[Tuple[str, str]] = []
-    if isinstance(drama_scene_raw, list):
-        for item in drama_scene_raw:
-            if isinstance(item, (list, tuple)) and len(item) == 2:
-                role = str(item[0]).strip()
-                line = str(item[1]).strip()
-                if role and line:
-                    drama_scene.append((role, line))
-
-    glossary_raw = data.get("glossary", {})
-    glossary: Dict[str, str] = {}
-    if isinstance(glossary_raw, dict):
-        for k, v in glossary_raw.items():
-            kk = str(k).strip()
-            vv = str(v).strip()
-            if kk and vv:
-                glossary[kk] = vv
-
-    def _clean_list(key: str) -> List[str]:
-        arr = data.get(key, [])
-        out_list: List[str] = []
-        if isinstance(arr, list):
-            for q in arr:
-                qq = str(q).strip()
-                if qq:
-                    out_list.append(qq)
-        return out_list or [f"(Žádné otázky v sekci {key} – zkus generovat znovu.)"]
-
-    questions_A = _clean_list("questions_A")
-    questions_B = _clean_list("questions_B")
-    questions_C = _clean_list("questions_C")
+def context_sentences(text: str, words: List[str], per_word: int = 1) -> List[str]:
+    """Věty, ve kterých se slova vyskytují (podle kmene) – stačí AI místo celého textu."""
+    wanted = {czech_stem(w): per_word for w in words}
+    out: List[str] = []
+    for sentence in split_sentences(text):
+        stems = {czech_stem(w) for w in WORD_RE.findall(sentence)}
+        hit = [s for s in stems if wanted.get(s, 0) > 0]
+        if hit:
+            out.append(sentence)
+            for s in hit:
+                wanted[s] -= 1
+        if not any(wanted.values()):
+            break
+    return out
 
-    return GeneratedStructure(
-        simpl=simpl,
-        lmp=lmp,
-        drama_intro=drama_intro or "Na začátku si krátce zahrajeme scénku, která ti pomůže pochopit, o čem text bude.",
-        drama_scene=drama_scene,
-        glossary=glossary,
-        questions_A=questions_A,
-        questions_B=questions_B,
-        questions_C=questions_C,
-    )
 
+GLOSSARY_PLACEHOLDER = "__________________ (vysvětlete si společně)"
 
-# =========================
-# DOCX – pracovní list
-# =========================
-def add_glossary_block(doc: Document, glossary: Dict[str, str]) -> None:
-    add_h2(doc, "Slovníček pojmů (na závěr)")
-    if not glossary:
-        doc.add_paragraph("Slovníček není k dispozici.")
-        return
 
-    doc.add_paragraph("Nejdřív si slovíčka projděte společně s učitelem/kou. Pak se vraťte k textu.")
-    for w, expl in glossary.items():
-        p = doc.add_paragraph()
-        r = p.add_run(f"• {w} — ")
-        r.bold = True
-        p.add_run(expl)
-        p.add_run("  | Poznámka: ________________________________")
+def seed_glossary(analysis: TextAnalysis) -> Dict[str, str]:
+    """Slovníček bez AI: kandidátní slova s prázdným místem na vysvětlení."""
+    return {word: GLOSSARY_PLACEHOLDER for word in analysis.hard_words}
 
 
-def add_tables_for_pack_inside_text(doc: Document, pack: str) -> None:
+def simplification_failures(structure: "GeneratedStructure", analysis: TextAnalysis, grade: int) -> List[str]:
     """
-    Vloží tabulku/tabulky jako obrázek do části „Text pro čtení“.
-    Tabulky jsou nutné i pro zjednodušenou a LMP verzi.
+    Které verze nejsou jednodušší: simpl musí mít nižší LIX než originál (nebo splnit cíl ročníku),
+    lmp také a navíc nesmí být znatelně složitější než simpl (nebo splní cíl o dva ročníky nižší).
     """
-    ac = asset_candidates()
-
-    if pack == "karetni":
-        pth = find_existing_asset(ac["karetni_table"])
-        if pth:
-            doc.add_paragraph("Tabulka z pravidel: Kdo přebije koho?")
-            add_image_if_exists(doc, pth, width_cm=16.0, center=True)
-        else:
-            doc.add_paragraph("⚠️ Chybí tabulka (PNG) pro Karetní hru v assets/.")
+    if analysis.words < MIN_WORDS_FOR_CHECK:
+        return []
+    failures: List[str] = []
+    simpl = analyze_text(structure.simpl)
+    if not (simpl.lix < analysis.lix or simpl.lix <= lix_target(grade)):
+        failures.append("simpl")
+    lmp = analyze_text(structure.lmp)
+    if not ((lmp.lix < analysis.lix and lmp.lix <= simpl.lix + 2) or lmp.lix <= lix_target(grade - 2)):
+        failures.append("lmp")
+    return failures
 
-    elif pack == "sladke":
-        pth = find_existing_asset(ac["sladke_table"])
-        if pth:
-            doc.add_paragraph("Tabulka z textu (pro práci s otázkami):")
-            add_image_if_exists(doc, pth, width_cm=16.0, center=True)
-        else:
-            doc.add_paragraph("⚠️ Chybí tabulka (PNG) pro Sladké mámení v assets/.")
 
-    elif pack == "venecky":
-        pth = find_existing_asset(ac["venecky_table"])
-        if pth:
-            doc.add_paragraph("Tabulka z textu (pro práci s otázkami):")
-            add_image_if_exists(doc, pth, width_cm=16.0, center=True)
-        else:
-            doc.add_paragraph("⚠️ Chybí tabulka (PNG) pro Věnečky v assets/.")
+# =========================
+# Cache – úložiště (soubory / paměť / SQLite / Redis)
+# =========================
+# Výsledky AI, hotové soubory a zámky souběžných generování se ukládají jako bajty přes vyměnitelné
+# úložiště (EDREAD_CACHE_BACKEND), každý druh dat ve vlastním jmenném prostoru s vlastním limitem.
+# S více replikami za load balancerem je potřeba úložiště sdílené všemi (redis) – jinak se stejné
+# generování opakuje na každé replice zvlášť.
+CACHE_BACKENDS = ("files", "memory", "sqlite", "redis")
+SHARED_CACHE_BACKENDS = ("redis",)  # vidí je i ostatní stroje – přes ně se sdílí i slovníček
+
+# jmenný prostor: (podadresář a přípona souborů u files, proměnná s limitem v MB, výchozí limit; 0 = bez limitu)
+CACHE_NAMESPACES: Dict[str, Tuple[str, str, str, str]] = {
+    "structure": ("", ".json", "EDREAD_CACHE_MAX_MB", "50"),
+    "render": ("render", ".bin", "EDREAD_RENDER_CACHE_MAX_MB", "200"),
+    "glossary": ("glossary", ".json", "", "0"),
+    "lock": ("locks", ".lock", "", "0"),
+    "near_dup": ("near_dup", ".json", "", "0"),  # jen se sdíleným úložištěm (SharedNearDuplicateIndex)
+}
+
+
+class CacheBackend:
+    """
+    Rozhraní úložiště cache: klíč → bajty. Chyby úložiště se ven nešíří – cache je jen zrychlení,
+    takže nedostupné úložiště se chová jako prázdná cache (get → None, zápis se zahodí).
+    """
 
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
 
-def build_student_doc(
-    title: str,
-    grade: int,
-    variant_label: str,
-    text_variant: str,
-    drama_intro: str,
-    drama_scene: List[Tuple[str, str]],
-    glossary: Dict[str, str],
-    questions_A: List[str],
-    questions_B: List[str],
-    questions_C: List[str],
-    pack: str,
-) -> Document:
-    doc = Document()
-    set_doc_defaults(doc)
+    def peek(self, key: str) -> Optional[bytes]:
+        """Jako get, ale čtení se nepočítá jako použití (LRU, stáří) – pro zámky, jejichž platnost hlídá add."""
+        return self.get(key)
 
-    add_h1(doc, f"NÁZEV ÚLOHY: {title} — {variant_label}")
-    doc.add_paragraph(f"Ročník: {grade}. třída")
-    doc.add_paragraph("JMÉNO: ________________________________    DATUM: _______________")
-    add_spacer(doc, 0.2)
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
 
-    # 1) dramatizace
-    add_h2(doc, "1) Úvod a krátká dramatizace (začátek hodiny)")
-    doc.add_paragraph(
-        "Nejdřív si zahrajeme krátkou scénku. Pomůže ti rychle pochopit, o čem text bude."
-    )
-    doc.add_paragraph(drama_intro)
-    for role, line in drama_scene:
-        doc.add_paragraph(f"{role}: {line}")
-    add_spacer(doc, 0.2)
-
-    # 2) text + tabulky uvnitř textu
-    add_h2(doc, "2) Text pro čtení")
-    doc.add_paragraph(text_variant)
-    add_spacer(doc, 0.15)
-    # tabulky nutné pro odpovědi – ve všech verzích
-    if pack in ("karetni", "sladke", "venecky"):
-        add_tables_for_pack_inside_text(doc, pack)
-        add_spacer(doc, 0.2)
-
-    # 2b) Karetní hra – pomůcky (pyramida + kartičky + tabulka)
-    if pack == "karetni":
-        add_karetni_pack_extras(doc, include_table=False)  # tabulka už je vložená u textu
-        add_spacer(doc, 0.2)
-
-    # 3) otázky
-    add_h2(doc, "3) Otázky k textu")
-
-    doc.add_paragraph("A) Najdi v textu (vyhledávání informací):")
-    for q in questions_A:
-        doc.add_paragraph(f"• {q}\n  Odpověď: ______________________________________________")
-
-    add_spacer(doc, 0.15)
-    doc.add_paragraph("B) Přemýšlej a vysvětli (porozumění / interpretace):")
-    for q in questions_B:
-        doc.add_paragraph(
-            f"• {q}\n  Odpověď: ______________________________________________\n  ______________________________________________"
-        )
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
 
-    add_spacer(doc, 0.15)
-    doc.add_paragraph("C) Můj názor (kritické čtení / argumentace):")
-    for q in questions_C:
-        doc.add_paragraph(
-            f"• {q}\n  Odpověď: ______________________________________________\n  ______________________________________________"
-        )
+    def add(self, key: str, value: bytes, ttl_s: float = 0.0) -> bool:
+        """Zapíše jen klíč, který ještě neexistuje (zámek, první vysvětlení slova); ttl_s > 0 = platnost."""
+        raise NotImplementedError
 
-    add_spacer(doc, 0.25)
-    # slovníček až na konci
-    add_glossary_block(doc, glossary)
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
 
-    return doc
 
+FILE_TAKEOVER_STALE_S = 10.0  # strážní soubor převzetí prošlého zápisu (FileBackend.add) drží jen milisekundy
 
-def build_method_doc(
-    title: str,
-    grade: int,
-    full_text: str,
-    structure: GeneratedStructure,
-    pack: str,
-) -> Document:
-    doc = Document()
-    set_doc_defaults(doc)
 
-    add_h1(doc, f"Metodický list pro učitele — {title}")
-    doc.add_paragraph(f"Ročník: {grade}. třída")
+class FileBackend(CacheBackend):
+    """
+    Jeden soubor na klíč v adresáři (jeden stroj):
+    - LRU: čas posledního použití = mtime souboru (při zásahu se „dotkne“),
+    - limit celkové velikosti (max_bytes) a stáří záznamu (max_age_s),
+    - zápis přes dočasný soubor + os.replace, takže souběžné session nikdy nečtou půlku souboru.
+    Platnost zápisu z add(ttl_s) se počítá od mtime souboru s ttl_s volajícího (zámky SingleFlight mají
+    všechny stejný lease); čte se proto přes peek, které mtime neposouvá.
+    """
 
-    add_h2(doc, "Cíl hodiny")
-    doc.add_paragraph(
-        "Rozvoj čtenářské gramotnosti v souladu s RVP ZV: vyhledávání informací, porozumění textu, interpretace, "
-        "kritické čtení a formulace vlastního názoru."
-    )
+    def __init__(
+        self,
+        directory: str,
+        suffix: str = ".json",
+        max_bytes: int = 50 * 1024 * 1024,
+        max_age_s: float = 30 * 24 * 3600,
+    ):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.peek(key)
+        if data is not None:
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+        return data
+
+    def peek(self, key: str) -> Optional[bytes]:
+        # bez „dotyku“: platnost zámku (add s ttl_s) se počítá od mtime, čtení ji nesmí prodlužovat
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(value)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            # plný disk / práva – generování kvůli cache neshodíme
+            self._remove(tmp)
+            return
+        self.evict()
+
+    def add(self, key: str, value: bytes, ttl_s: float = 0.0) -> bool:
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                # zápis s prošlou platností (např. zámek spadlého procesu) se odstraní a zkusí se znovu
+                if not ttl_s or not self._take_expired(path, ttl_s):
+                    return False
+                continue
+            except OSError:
+                return False
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            return True
+        return False
 
-    add_h2(doc, "Doporučený postup (45 min)")
-    doc.add_paragraph("1) Úvod + dramatizace (5–7 min) – krátká scénka z pracovního listu, motivace.")
-    doc.add_paragraph(
-        "2) Slovníček (5–8 min) – i když je na konci listu, pracujte s ním hned po dramatizaci. "
-        "Vyberte slova, která mohou brzdit porozumění; žáci si doplní poznámky."
-    )
-    doc.add_paragraph("3) Čtení textu (10–12 min) – tiché čtení / čtení po odstavcích.")
-    doc.add_paragraph(
-        "4) Otázky A/B/C (15–18 min) – A: dohledání informace, B: vysvětlení vlastními slovy, "
-        "C: názor + zdůvodnění."
-    )
-    doc.add_paragraph("5) Reflexe (2–3 min) – co pomohlo porozumět (dramatizace, tabulka, slovníček).")
-
-    add_h2(doc, "Tabulky / opory v textu")
-    if pack in ("karetni", "sladke", "venecky"):
-        doc.add_paragraph("Tabulka z původního textu je vložená přímo v části „Text pro čtení“ ve všech verzích.")
-    if pack == "karetni":
-        doc.add_paragraph("Karetní hra: navíc je přiložená pyramida síly a kartičky zvířat (vystřižení a lepení).")
-
-    add_h2(doc, "Poznámka k verzím")
-    doc.add_paragraph("Plná verze: původní text (vstup učitele).")
-    doc.add_paragraph("Zjednodušená verze: kratší věty, jednodušší slovní zásoba, zachování klíčových informací.")
-    doc.add_paragraph("LMP/SPU verze: velmi krátké věty, maximální srozumitelnost, odstranění složitých souvětí.")
-    doc.add_paragraph(
-        "Rozdíly mezi verzemi jsou pouze v textu (plný / zjednodušený / LMP). "
-        "Tabulky zůstávají ve všech verzích stejné, aby šly vypracovat otázky."
-    )
+    def _take_expired(self, path: str, ttl_s: float) -> bool:
+        """
+        Smaže prošlý zápis; vrací, zda se pokus o add může zopakovat.
+        Mazat smí jen ten, kdo drží strážní soubor <cesta>.takeover (O_EXCL) – jinak by dva procesy, které
+        současně vidí starý zámek jako prošlý, mohly smazat i nový zámek toho, kdo byl rychlejší.
+        Strážní soubor spadlého procesu se po FILE_TAKEOVER_STALE_S odstraní.
+        """
+        guard = f"{path}.takeover"
+        try:
+            fd = os.open(guard, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(guard).st_mtime > FILE_TAKEOVER_STALE_S:
+                    self._remove(guard)
+            except OSError:
+                pass
+            return False  # převzetí právě dělá jiný proces
+        except OSError:
+            return False
+        try:
+            try:
+                expired = time.time() - os.stat(path).st_mtime > ttl_s
+            except OSError:
+                return True  # mezitím zmizel
+            if expired:
+                self._remove(path)
+            return expired
+        finally:
+            os.close(fd)
+            self._remove(guard)
+
+    def delete(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def evict(self) -> None:
+        if not self.max_bytes and not self.max_age_s:
+            return
+        with self._lock:
+            entries = []
+            now = time.time()
+            for name in os.listdir(self.directory):
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                if self.max_age_s and now - info.st_mtime > self.max_age_s:
+                    self._remove(path)
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if not self.max_bytes or total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class MemoryBackend(CacheBackend):
+    """LRU v paměti procesu (jedna instance bez disku, testy); limit celkové velikosti a stáří jako FileBackend."""
+
+    def __init__(self, max_bytes: int = 50 * 1024 * 1024, max_age_s: float = 30 * 24 * 3600):
+        from collections import OrderedDict
+
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self.size = 0
+        # klíč → (vyprší v čase time.time(), 0 = nikdy; hodnota); pořadí = od nejdéle nepoužitého
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires and now > expires:
+            self._pop(key)
+            return None
+        return value
+
+    def _pop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.size -= len(value)
+
+    def _store(self, key: str, value: bytes, ttl_s: float) -> None:
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (time.time() + ttl_s if ttl_s else 0.0, value)
+        self.size += len(value)
+        while self.max_bytes and self.size > self.max_bytes and len(self._data) > 1:
+            self._pop(next(iter(self._data)))
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._live(key, time.time())
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._store(key, value, self.max_age_s)
+
+    def add(self, key: str, value: bytes, ttl_s: float = 0.0) -> bool:
+        with self._lock:
+            if self._live(key, time.time()) is not None:
+                return False
+            self._store(key, value, ttl_s)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+
+class SqliteBackend(CacheBackend):
+    """
+    Tabulka klíč → hodnota v SQLite (WAL) – jedna databáze pro všechny procesy a workery na stroji.
+    Čas posledního použití je indexovaný, takže vyřazení nejstarších záznamů nad limit je jeden dotaz.
+    """
 
-    add_h2(doc, "Vstupní text (plná verze)")
-    doc.add_paragraph(full_text)
+    def __init__(
+        self, db_path: str, table: str, max_bytes: int = 50 * 1024 * 1024, max_age_s: float = 30 * 24 * 3600
+    ):
+        if not re.fullmatch(r"[a-z_]+", table):
+            raise ValueError(f"Neplatný název tabulky: {table}")
+        self.db_path = db_path
+        self.table = f"cache_{table}"
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self._init_db()
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_used ON {self.table} (used)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        try:
+            with self._db() as conn:
+                row = conn.execute(f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if row[1] and now > row[1]:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    return None
+                conn.execute(f"UPDATE {self.table} SET used = ? WHERE key = ?", (now, key))
+                return bytes(row[0])
+        except sqlite3.Error:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        try:
+            with self._db() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires, used) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + self.max_age_s if self.max_age_s else 0.0, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def add(self, key: str, value: bytes, ttl_s: float = 0.0) -> bool:
+        now = time.time()
+        try:
+            with self._db() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ? AND expires > 0 AND expires < ?", (key, now))
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO {self.table} (key, value, size, expires, used) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + ttl_s if ttl_s else 0.0, now),
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error:
+            return False
+
+    def delete(self, key: str) -> None:
+        try:
+            with self._db() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(f"DELETE FROM {self.table} WHERE expires > 0 AND expires < ?", (now,))
+        if not self.max_bytes:
+            return
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # nejdéle nepoužité záznamy, dokud součet nespadne pod limit (průběžný součet přes okno)
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM (SELECT key, size, "
+            f"SUM(size) OVER (ORDER BY used, key) AS freed FROM {self.table}) WHERE freed - size < ?)",
+            (total - self.max_bytes,),
+        )
 
-    add_h2(doc, "Zjednodušená verze (náhled)")
-    doc.add_paragraph(structure.simpl)
 
-    add_h2(doc, "LMP/SPU verze (náhled)")
-    doc.add_paragraph(structure.lmp)
+class RedisBackend(CacheBackend):
+    """
+    Server s Redis protokolem (Redis, Valkey, KeyDB) sdílený všemi replikami; klíče s prefixem jmenného prostoru.
+    Stáří hlídá server (SET … PX), limit velikosti jeho maxmemory-policy (doporučeno allkeys-lru).
+    Po opakovaných chybách spojení se jistič na chvíli otevře – nedostupný server pak generování nezdržuje.
+    """
 
-    return doc
+    def __init__(self, url: str, prefix: str, max_age_s: float = 30 * 24 * 3600):
+        import redis
+
+        self.client = get_redis_client(url)
+        self.prefix = prefix
+        self.max_age_s = float(max_age_s)
+        self.breaker = CircuitBreaker(threshold=3, cooldown_s=30.0)
+        self._errors = (redis.RedisError, OSError)
+
+    def _call(self, fn: Callable, *args, default=None, **kwargs):
+        if not self.breaker.allow():
+            return default
+        try:
+            result = fn(*args, **kwargs)
+        except self._errors:
+            self.breaker.record(False)
+            return default
+        self.breaker.record(True)
+        return result
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call(self.client.get, self.prefix + key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        values = self._call(self.client.mget, [self.prefix + key for key in keys], default=[])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key: str, value: bytes) -> None:
+        self._call(self.client.set, self.prefix + key, value, px=int(self.max_age_s * 1000) or None)
+
+    def add(self, key: str, value: bytes, ttl_s: float = 0.0) -> bool:
+        return bool(self._call(self.client.set, self.prefix + key, value, nx=True, px=int(ttl_s * 1000) or None))
+
+    def delete(self, key: str) -> None:
+        self._call(self.client.delete, self.prefix + key)
+
+
+@st.cache_resource
+def get_redis_client(url: str):
+    # jeden pool spojení pro všechny jmenné prostory a session; RESP2 umí každý server (i bez příkazu HELLO)
+    import redis
+
+    return redis.Redis.from_url(url, protocol=2, socket_timeout=2.0, socket_connect_timeout=2.0)
+
+
+def cache_backend_kind() -> str:
+    kind = get_config("EDREAD_CACHE_BACKEND", "files").strip().lower()
+    if kind not in CACHE_BACKENDS:
+        raise ValueError(f"Neznámé úložiště cache: {kind} (povoleno: {', '.join(CACHE_BACKENDS)})")
+    return kind
+
+
+@st.cache_resource
+def get_cache_backend(namespace: str) -> CacheBackend:
+    """Úložiště jednoho jmenného prostoru (CACHE_NAMESPACES) podle EDREAD_CACHE_BACKEND; jedno pro celý proces."""
+    subdir, suffix, limit_name, limit_default = CACHE_NAMESPACES[namespace]
+    kind = cache_backend_kind()
+    directory = get_config("EDREAD_CACHE_DIR", ".edread_cache")
+    max_bytes = int(get_config(limit_name, limit_default) if limit_name else limit_default) * 1024 * 1024
+    # zámky mají vlastní platnost (add), hesla slovníčku nestárnou
+    max_age_s = float(get_config("EDREAD_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600
+    if namespace in ("glossary", "lock"):
+        max_age_s = 0.0
+    if kind == "memory":
+        return MemoryBackend(max_bytes=max_bytes, max_age_s=max_age_s)
+    if kind == "sqlite":
+        db_path = os.path.join(directory, "cache.sqlite3")
+        return SqliteBackend(db_path, namespace, max_bytes=max_bytes, max_age_s=max_age_s)
+    if kind == "redis":
+        url = get_config("EDREAD_REDIS_URL", "redis://localhost:6379/0")
+        return RedisBackend(url, f"edread:{namespace}:", max_age_s=max_age_s)
+    return FileBackend(os.path.join(directory, subdir), suffix=suffix, max_bytes=max_bytes, max_age_s=max_age_s)
 
 
 # =========================
-# Generování všech dokumentů
+# Cache – jedno generování pro stejné souběžné požadavky (single-flight)
 # =========================
-def generate_all_from_text(title: str, grade: int, full_text: str) -> Dict[str, bytes]:
-    pack = detect_pack(title, full_text)
-    structure = ai_generate_structure(full_text, grade, title)
-
-    doc_full = build_student_doc(
-        title=title,
-        grade=grade,
-        variant_label="PLNÝ",
-        text_variant=full_text,
-        drama_intro=structure.drama_intro,
-        drama_scene=structure.drama_scene,
-        glossary=structure.glossary,
-        questions_A=structure.questions_A,
-        questions_B=structure.questions_B,
-        questions_C=structure.questions_C,
-        pack=pack,
-    )
+# Celá třída vloží stejný text naráz (učitel ho rozešle) – bez koordinace by každá session čekala
+# na vlastní dotaz na AI. První požadavek s daným klíčem generuje, ostatní počkají na jeho výsledek v cache.
+SINGLE_FLIGHT_LEASE_S = 240.0  # zámek spadlé repliky vyprší; déle se na cizí generování nečeká
+SINGLE_FLIGHT_POLL_S = 0.2
 
-    doc_simpl = build_student_doc(
-        title=title,
-        grade=grade,
-        variant_label="ZJEDNODUŠENÝ",
-        text_variant=structure.simpl,
-        drama_intro=structure.drama_intro,
-        drama_scene=structure.drama_scene,
-        glossary=structure.glossary,
-        questions_A=structure.questions_A,
-        questions_B=structure.questions_B,
-        questions_C=structure.questions_C,
-        pack=pack,
-    )
 
-    doc_lmp = build_student_doc(
-        title=title,
-        grade=grade,
-        variant_label="LMP/SPU",
-        text_variant=structure.lmp,
-        drama_intro=structure.drama_intro,
-        drama_scene=structure.drama_scene,
-        glossary=structure.glossary,
-        questions_A=structure.questions_A,
-        questions_B=structure.questions_B,
-        questions_C=structure.questions_C,
-        pack=pack,
+class SingleFlight:
+    """
+    Souběžné požadavky se stejným klíčem → jedno generování:
+    - v procesu: první vlákno generuje, ostatní čekají na jeho dokončení (threading.Event),
+    - mezi procesy / replikami: zámek s platností v úložišti (add = SET NX PX); kdo ho nezíská,
+      se ptá cache, dokud výsledek nepřibude – zmizelý nebo prošlý zámek (spadlý proces) převezme a generuje sám.
+    Výsledek si čekající vždy přečtou z cache (lookup) – když ho generující neuložil (nouzové sekce,
+    chyba), generují sami, aby selhání jednoho nepřevzali všichni.
+    """
+
+    def __init__(
+        self, backend: CacheBackend, lease_s: float = SINGLE_FLIGHT_LEASE_S, poll_s: float = SINGLE_FLIGHT_POLL_S
+    ):
+        self.backend = backend
+        self.lease_s = float(lease_s)
+        self.poll_s = float(poll_s)
+        self._calls: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def join(self, key: str, lookup: Callable[[], Optional[object]]) -> Iterator[Optional[object]]:
+        """
+        with flight.join(key, lookup) as done: – done je None, když má volající generovat sám
+        (ostatní na něj čekají až do konce bloku), jinak výsledek, na který se počkalo.
+        """
+        with self._lock:
+            event = self._calls.get(key)
+            leader = event is None
+            if leader:
+                event = self._calls[key] = threading.Event()
+        if not leader:
+            with span("single_flight_wait"):
+                event.wait(self.lease_s)
+                done = lookup()
+            self._count(done)
+            yield done
+            return
+
+        token = uuid.uuid4().hex.encode("ascii")
+        locked = self.backend.add(key, token, self.lease_s)
+        try:
+            if not locked:
+                # stejný vstup generuje jiný proces / replika
+                with span("single_flight_wait"):
+                    done, locked = self._poll(key, token, lookup)
+                if not locked:
+                    self._count(done)
+                    yield done
+                    return
+            yield None
+        finally:
+            # zámek po vypršení mohl převzít někdo jiný – maže se jen vlastní
+            if locked:
+                self._release(key, token)
+            with self._lock:
+                self._calls.pop(key, None)
+            event.set()
+
+    def _poll(self, key: str, token: bytes, lookup: Callable[[], Optional[object]]) -> Tuple[Optional[object], bool]:
+        """
+        Čeká na výsledek cizího generování. Když zámek zmizí (generování skončilo bez uložení) nebo
+        vyprší (spadlý proces), převezme ho – add s platností lease_s. Vrací (výsledek, převzat zámek).
+        """
+        deadline = time.monotonic() + self.lease_s
+        while True:
+            done = lookup()
+            if done is not None:
+                return done, False
+            if self.backend.add(key, token, self.lease_s):
+                # výsledek mohl přibýt těsně před uvolněním zámku
+                done = lookup()
+                if done is not None:
+                    self._release(key, token)
+                    return done, False
+                return None, True
+            # poslední pokus o převzetí až po konci lease – cizí zámek do té doby vyprší
+            if time.monotonic() >= deadline:
+                return None, False
+            time.sleep(self.poll_s)
+
+    def _release(self, key: str, token: bytes) -> None:
+        if self.backend.peek(key) == token:
+            self.backend.delete(key)
+
+    @staticmethod
+    def _count(done: Optional[object]) -> None:
+        current_metrics().inc("edread_single_flight_waits_total", result="hit" if done is not None else "miss")
+
+
+@st.cache_resource
+def get_single_flight() -> Optional[SingleFlight]:
+    if get_config("EDREAD_SINGLE_FLIGHT", "1") != "1":
+        return None
+    return SingleFlight(get_cache_backend("lock"))
+
+
+@contextmanager
+def single_flight(key: str, lookup: Callable[[], Optional[object]]) -> Iterator[Optional[object]]:
+    """SingleFlight.join(); při vypnutém EDREAD_SINGLE_FLIGHT vždy None (každý generuje sám)."""
+    flight = get_single_flight()
+    if flight is None:
+        yield None
+        return
+    with flight.join(key, lookup) as done:
+        yield done
+
+
+# =========================
+# Slovníček – sdílené úložiště vysvětlení (SQLite)
+# =========================
+# Stejná obtížná slova se v našich materiálech pořád opakují. Vysvětlení z dřívějších generování
+# a od učitelů se ukládají podle kmene (czech_stem), takže „ingredience“ najde i „ingrediencí“;
+# AI se ptáme jen na slova, která úložiště ještě nezná.
+GLOSSARY_PREFIX_MIN = 5  # kratší kmeny porovnáváme jen přesně
+GLOSSARY_PREFIX_SLACK = 2  # o kolik písmen se smí kmeny lišit při shodě začátkem (pravidla / pravidel)
+
+
+def glossary_key(word: str) -> str:
+    return " ".join(czech_stem(w) for w in WORD_RE.findall(word))
+
+
+class GlossaryStore:
+    """
+    Slovo → vysvětlení pro žáky v SQLite (WAL), klíčem je kmen slova (index = primární klíč).
+    - lookup(): přesná shoda kmene, jinak nejbližší kmen se stejným začátkem (změna kmene při skloňování),
+    - learn(): vysvětlení od AI se jen doplňují, úpravy učitele („teacher“) mají vždy přednost.
+    Se sdíleným úložištěm (backend, např. Redis) se hesla zapisují i tam a lookup() si z něj nejdřív
+    doplní přesné kmeny – vysvětlení z jedné repliky tak znají všechny.
+    """
+
+    def __init__(self, db_path: str, backend: Optional[CacheBackend] = None):
+        self.db_path = db_path
+        self.backend = backend
+        self._init_db()
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS glossary (
+                    stem TEXT PRIMARY KEY,
+                    word TEXT NOT NULL,
+                    explanation TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    uses INTEGER NOT NULL DEFAULT 0,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+
+    @staticmethod
+    def _find(conn: sqlite3.Connection, stem: str) -> Optional[sqlite3.Row]:
+        row = conn.execute("SELECT stem, word, explanation FROM glossary WHERE stem = ?", (stem,)).fetchone()
+        if row is not None or len(stem) < GLOSSARY_PREFIX_MIN or " " in stem:
+            return row
+        # rozsah nad indexem: kmeny se stejným začátkem, vybere se ten nejbližší délkou
+        prefix = stem[: max(GLOSSARY_PREFIX_MIN, len(stem) - GLOSSARY_PREFIX_SLACK)]
+        rows = conn.execute(
+            "SELECT stem, word, explanation FROM glossary WHERE stem >= ? AND stem < ?",
+            (prefix, prefix + "\U0010ffff"),
+        ).fetchall()
+        best = None
+        for candidate in rows:
+            other = candidate["stem"]
+            common = len(os.path.commonprefix([stem, other]))
+            if " " in other or common < max(len(stem), len(other)) - GLOSSARY_PREFIX_SLACK:
+                continue
+            if best is None or abs(len(other) - len(stem)) < abs(len(best["stem"]) - len(stem)):
+                best = candidate
+        return best
+
+    def lookup(self, words: List[str]) -> Dict[str, Tuple[str, str]]:
+        """slovo z textu → (heslo v úložišti, vysvětlení); slova, která úložiště nezná, ve výsledku nejsou."""
+        found: Dict[str, Tuple[str, str]] = {}
+        hits: List[str] = []
+        if self.backend is not None:
+            self._pull([glossary_key(word) for word in words])
+        with self._db() as conn:
+            for word in words:
+                row = self._find(conn, glossary_key(word))
+                if row is not None:
+                    found[word] = (row["word"], row["explanation"])
+                    hits.append(row["stem"])
+            conn.executemany("UPDATE glossary SET uses = uses + 1 WHERE stem = ?", [(stem,) for stem in hits])
+        return found
+
+    def learn(self, glossary: Dict[str, str], source: str = "ai", replace: bool = False) -> int:
+        """
+        Uloží vysvětlení; vrací počet nových / změněných hesel. Prázdná a zástupná vysvětlení se přeskočí.
+        replace: nový návrh AI (učitel si slovníček nechal vygenerovat znovu) přepíše dřívější vysvětlení
+        od AI; úpravy učitele zůstanou.
+        """
+        now = time.time()
+        rows = [
+            (glossary_key(word), word.strip(), explanation.strip(), source, now)
+            for word, explanation in glossary.items()
+            if glossary_key(word) and explanation.strip() and explanation.strip() != GLOSSARY_PLACEHOLDER
+        ]
+        if replace and self.backend is not None:
+            self._pull([row[0] for row in rows])  # úpravy učitele z jiných replik, aby se nepřepsaly
+        update = (
+            "DO UPDATE SET word = excluded.word, explanation = excluded.explanation, "
+            "source = excluded.source, updated = excluded.updated"
+        )
+        if source == "teacher":
+            conflict = update
+        elif replace:
+            conflict = f"{update} WHERE glossary.source != 'teacher'"
+        else:
+            conflict = "DO NOTHING"  # první vysvětlení zůstává – slovníček se mezi listy nemění
+        with self._db() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO glossary (stem, word, explanation, source, updated) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT(stem) {conflict}",
+                rows,
+            )
+            changed = conn.total_changes - before
+            if replace and source != "teacher" and rows:
+                # hesla upravená učitelem se do sdíleného úložiště nepřepisují
+                teacher = {
+                    row[0]
+                    for row in conn.execute(
+                        f"SELECT stem FROM glossary WHERE source = 'teacher' AND stem IN ({','.join('?' * len(rows))})",
+                        [row[0] for row in rows],
+                    )
+                }
+                rows = [row for row in rows if row[0] not in teacher]
+        if self.backend is not None:
+            for stem, word, explanation, source, updated in rows:
+                value = json.dumps(
+                    {"word": word, "explanation": explanation, "source": source, "updated": updated}, ensure_ascii=False
+                )
+                if source == "teacher" or replace:
+                    self.backend.set(stem, value.encode("utf-8"))
+                else:
+                    self.backend.add(stem, value.encode("utf-8"))
+        return changed
+
+    def _pull(self, stems: List[str]) -> None:
+        """
+        Hesla ze sdíleného úložiště do místní databáze: úprava učitele přepíše, vysvětlení AI doplní,
+        novější návrh AI (learn(replace=True) na jiné replice) nahradí starší vysvětlení od AI.
+        """
+        now = time.time()
+        rows = []
+        for stem, value in self.backend.get_many([stem for stem in dict.fromkeys(stems) if stem]).items():
+            try:
+                entry = json.loads(value)
+                updated = float(entry.get("updated") or now)
+                rows.append((stem, str(entry["word"]), str(entry["explanation"]), str(entry["source"]), updated))
+            except (ValueError, KeyError, TypeError):
+                continue
+        if not rows:
+            return
+        with self._db() as conn:
+            conn.executemany(
+                "INSERT INTO glossary (stem, word, explanation, source, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(stem) DO UPDATE SET word = excluded.word, explanation = excluded.explanation, "
+                "source = excluded.source, updated = excluded.updated "
+                "WHERE glossary.explanation != excluded.explanation AND (excluded.source = 'teacher' "
+                "OR (glossary.source = 'ai' AND excluded.updated > glossary.updated))",
+                rows,
+            )
+
+    def delete(self, word: str) -> None:
+        with self._db() as conn:
+            conn.execute("DELETE FROM glossary WHERE stem = ?", (glossary_key(word),))
+        if self.backend is not None:
+            self.backend.delete(glossary_key(word))
+
+    def search(self, prefix: str = "", limit: int = 200) -> List[Dict]:
+        """Hesla začínající na `prefix` (podle kmene), nejpoužívanější první – pro úpravy v aplikaci."""
+        stem = glossary_key(prefix)
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT word, explanation, source, uses FROM glossary WHERE stem >= ? AND stem < ? "
+                "ORDER BY uses DESC, word LIMIT ?",
+                (stem, stem + "\U0010ffff", int(limit)),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def __len__(self) -> int:
+        with self._db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM glossary").fetchone()[0]
+
+
+@st.cache_resource
+def get_glossary_store() -> GlossaryStore:
+    # místní SQLite zůstává (hledání podle začátku kmene), sdílené úložiště rozesílá hesla mezi replikami
+    shared = get_cache_backend("glossary") if cache_backend_kind() in SHARED_CACHE_BACKENDS else None
+    return GlossaryStore(get_config("EDREAD_GLOSSARY_DB", ".edread_glossary.sqlite3"), backend=shared)
+
+
+@dataclass
+class GlossaryPlan:
+    """
+    known: hesla z úložiště (heslo → vysvětlení), ask: slova z textu, na která se zeptáme AI,
+    ask_ai: False = slovníček je celý z úložiště a AI ho vůbec negeneruje.
+    """
+
+    known: Dict[str, str]
+    ask: List[str]
+    ask_ai: bool
+    covered: List[str]  # klíče slov z textu, která úložiště našlo (i přes shodu začátkem)
+
+    def merge(self, generated: Dict[str, str]) -> Dict[str, str]:
+        """Hesla z úložiště + nová od AI; slovo, které už úložiště vysvětlilo, se nezdvojí."""
+        merged = dict(self.known)
+        seen = set(self.covered) | {glossary_key(word) for word in merged}
+        for word, explanation in generated.items():
+            key = glossary_key(word)
+            if key not in seen:
+                merged[word] = explanation
+                seen.add(key)
+        return merged
+
+
+def plan_glossary(analysis: TextAnalysis, store: Optional[GlossaryStore] = None) -> GlossaryPlan:
+    store = store or get_glossary_store()
+    found = store.lookup(analysis.hard_words)
+    known: Dict[str, str] = {}
+    for word in analysis.hard_words:
+        if word in found:
+            headword, explanation = found[word]
+            known.setdefault(headword, explanation)
+    ask = [word for word in analysis.hard_words if word not in found]
+    return GlossaryPlan(
+        known=known,
+        ask=ask,
+        # bez kandidátů z analýzy vybírá slova AI sama (jako dřív)
+        ask_ai=bool(ask) or not known,
+        covered=[glossary_key(word) for word in found],
+    )
+
+
+# =========================
+# AI – struktura z vlastního textu
+# =========================
+@dataclass
+class GeneratedStructure:
+    simpl: str
+    lmp: str
+    drama_intro: str
+    drama_scene: List[Tuple[str, str]]
+    glossary: Dict[str, str]
+    questions_A: List[str]
+    questions_B: List[str]
+    questions_C: List[str]
+
+
+def structure_to_dict(structure: GeneratedStructure) -> Dict:
+    return asdict(structure)
+
+
+def structure_from_dict(data: Dict) -> GeneratedStructure:
+    return GeneratedStructure(
+        simpl=str(data["simpl"]),
+        lmp=str(data["lmp"]),
+        drama_intro=str(data["drama_intro"]),
+        drama_scene=[(str(role), str(line)) for role, line in data["drama_scene"]],
+        glossary={str(k): str(v) for k, v in data["glossary"].items()},
+        questions_A=[str(q) for q in data["questions_A"]],
+        questions_B=[str(q) for q in data["questions_B"]],
+        questions_C=[str(q) for q in data["questions_C"]],
+    )
+
+
+# =========================
+# Cache výsledků AI (na disku)
+# =========================
+# Zvyš při každé změně promptu – staré záznamy v cache se tím zneplatní.
+PROMPT_VERSION = "3"
+
+
+def normalize_text(text: str) -> str:
+    """Sjednotí Unicode, konce řádků a mezery – drobné rozdíly v bílých znacích nemění klíč."""
+    text = unicodedata.normalize("NFC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def structure_cache_key(full_text: str, grade: int, title: str, model: str, prompt_version: str = PROMPT_VERSION) -> str:
+    payload = json.dumps(
+        [normalize_text(full_text), int(grade), (title or "").strip(), model, prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    """Počítadla zásahů / minutí cache nad CacheBackend (stats() a metrika edread_cache_requests_total)."""
+
+    name = ""  # popisek v metrice edread_cache_requests_total
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        current_metrics().inc("edread_cache_requests_total", cache=self.name, result="hit" if hit else "miss")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+class StructureCache(CacheStats):
+    """
+    Cache GeneratedStructure nad CacheBackend (výchozí FileBackend – jeden JSON soubor na klíč).
+    Záznam nese čas vytvoření; starší než max_age_s se nepoužije, i když ho úložiště ještě drží.
+    """
+
+    name = "structure"
+
+    def __init__(self, backend: CacheBackend, max_age_s: float = 30 * 24 * 3600):
+        super().__init__()
+        self.backend = backend
+        self.max_age_s = float(max_age_s)
+
+    def get(self, key: str, count: bool = True) -> Optional[GeneratedStructure]:
+        """count=False: čtení mimo statistiku (podobný text z NearDuplicateIndex, čekání v SingleFlight)."""
+        data = self.backend.get(key)
+        try:
+            if data is None:
+                raise KeyError(key)
+            record = json.loads(data)
+            if self.max_age_s and time.time() - float(record["created"]) > self.max_age_s:
+                self.backend.delete(key)
+                raise KeyError(key)
+            structure = structure_from_dict(record["structure"])
+        except (ValueError, KeyError, TypeError):
+            if count:
+                self._count(False)
+            return None
+        if count:
+            self._count(True)
+        return structure
+
+    def put(self, key: str, structure: GeneratedStructure) -> None:
+        record = {"created": time.time(), "structure": structure_to_dict(structure)}
+        self.backend.set(key, json.dumps(record, ensure_ascii=False).encode("utf-8"))
+
+
+@st.cache_resource
+def get_structure_cache() -> StructureCache:
+    # cache_resource: jedna instance pro všechny session i reruny skriptu
+    return StructureCache(
+        get_cache_backend("structure"),
+        max_age_s=float(get_config("EDREAD_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+    )
+
+
+# =========================
+# Cache – téměř stejné texty (MinHash + LSH)
+# =========================
+# Učitelé často vloží tentýž článek znovu s drobnou úpravou (opravený překlep, věta navíc) a přesný klíč
+# (structure_cache_key) se tím změní. Ke každému vygenerovanému textu si proto pamatujeme MinHash otisk
+# jeho znakových k-gramů; podobné texty najde LSH (pásma otisku jako klíče v SQLite) bez procházení všech.
+NEAR_DUP_SHINGLE_CHARS = 5
+NEAR_DUP_PERMUTATIONS = 128
+NEAR_DUP_BANDS = 16  # 16 pásem po 8 hodnotách: kandidátem je text zhruba od podobnosti 0,7
+NEAR_DUP_SEED = 2025  # stejné permutace ve všech procesech – otisky v indexu se dají porovnat
+NEAR_DUP_BLOCK = 4096  # k-gramů najednou, aby matice permutace × k-gramy zůstala malá
+
+
+def shingle_hashes(text: str, k: int = NEAR_DUP_SHINGLE_CHARS) -> np.ndarray:
+    """Různé znakové k-gramy textu jako 64bitová čísla; bez ohledu na diakritiku, velká písmena a mezery."""
+    import numpy as np
+
+    folded = " ".join(fold_text(normalize_text(text)).split())
+    codes = np.frombuffer(folded.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if codes.size == 0:
+        return codes
+    k = min(k, codes.size)
+    n = codes.size - k + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for i in range(k):
+        # polynomiální hash okna; přetečení uint64 (modulo 2^64) je záměr
+        hashes = hashes * np.uint64(0x100000001B3) + codes[i : i + n]
+    return np.unique(hashes)
+
+
+def minhash_signature(text: str, permutations: int = NEAR_DUP_PERMUTATIONS) -> Optional[np.ndarray]:
+    """
+    MinHash otisk textu (uint32 × permutations), None pro prázdný text.
+    Podíl shodných pozic dvou otisků odhaduje Jaccardovu podobnost množin k-gramů.
+    """
+    import numpy as np
+
+    shingles = shingle_hashes(text)
+    if shingles.size == 0:
+        return None
+    rng = np.random.default_rng(NEAR_DUP_SEED)
+    # multiply-shift hash: (a·x + b) mod 2^64, horních 32 bitů; liché a
+    a = rng.integers(0, 2**64, size=permutations, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**64, size=permutations, dtype=np.uint64)
+    signature = np.full(permutations, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, shingles.size, NEAR_DUP_BLOCK):
+        block = shingles[start : start + NEAR_DUP_BLOCK]
+        values = (a[:, None] * block[None, :] + b[:, None]) >> np.uint64(32)
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def signature_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float((a == b).mean())
+
+
+def lsh_buckets(signature: np.ndarray, bands: int = NEAR_DUP_BANDS) -> List[str]:
+    rows = len(signature) // bands
+    return [
+        f"{i}:{hashlib.blake2b(signature[i * rows:(i + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for i in range(bands)
+    ]
+
+
+def near_dup_scope(grade: int, title: str, model: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """Texty se porovnávají jen při stejném ročníku, názvu, modelu a verzi promptu – jako u přesného klíče."""
+    payload = json.dumps([int(grade), (title or "").strip(), model, prompt_version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class NearDuplicate:
+    key: str  # klíč záznamu ve StructureCache
+    similarity: float  # odhad Jaccardovy podobnosti k-gramů (0–1)
+
+
+class NearDuplicateStats:
+    """Počítadla použití indexu téměř stejných textů (stats() a metrika edread_cache_requests_total)."""
+
+    def __init__(self):
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def count(self, result: str) -> None:
+        """result: hit (použit celý výsledek), partial (texty znovu, zbytek převzat), miss."""
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            elif result == "partial":
+                self.partial += 1
+            else:
+                self.misses += 1
+        current_metrics().inc("edread_cache_requests_total", cache="near_dup", result=result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "partial": self.partial, "misses": self.misses}
+
+
+def best_near_duplicate(
+    signature: np.ndarray, candidates: Iterable[Tuple[str, bytes]], threshold: float
+) -> Optional[NearDuplicate]:
+    """Nejpodobnější z kandidátů (klíč, otisk jako <u4 bajty) nad prahem podle celého otisku."""
+    import numpy as np
+
+    best: Optional[NearDuplicate] = None
+    for key, raw in candidates:
+        other = np.frombuffer(raw, dtype="<u4")
+        if other.shape != signature.shape:
+            continue
+        similarity = signature_similarity(signature, other)
+        if similarity >= threshold and (best is None or similarity > best.similarity):
+            best = NearDuplicate(key, similarity)
+    return best
+
+
+class NearDuplicateIndex(NearDuplicateStats):
+    """
+    MinHash otisky vygenerovaných textů v SQLite (WAL):
+    - near_dup: klíč StructureCache → otisk, rozsah (near_dup_scope) a čas vložení,
+    - near_dup_bucket: pásma otisku → klíče; kandidát sdílí s hledaným textem aspoň jedno pásmo,
+    - find(): nejpodobnější kandidát nad prahem podle celého otisku.
+    Záznamy starší než max_age_s se mažou při vkládání, záznamy vyřazené z cache při prvním nálezu.
+    Soubor sdílí procesy jednoho stroje; repliky se sdíleným úložištěm cache mají SharedNearDuplicateIndex.
+    """
+
+    def __init__(self, db_path: str, max_age_s: float = 30 * 24 * 3600):
+        super().__init__()
+        self.db_path = db_path
+        self.max_age_s = float(max_age_s)
+        self._init_db()
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS near_dup (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    created REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS near_dup_bucket (
+                    scope TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS near_dup_bucket_lookup ON near_dup_bucket (scope, bucket)")
+            conn.execute("CREATE INDEX IF NOT EXISTS near_dup_bucket_key ON near_dup_bucket (key)")
+
+    def add(self, key: str, scope: str, signature: np.ndarray) -> None:
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO near_dup (key, scope, signature, created) VALUES (?, ?, ?, ?)",
+                (key, scope, signature.astype("<u4").tobytes(), now),
+            )
+            conn.execute("DELETE FROM near_dup_bucket WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT INTO near_dup_bucket (scope, bucket, key) VALUES (?, ?, ?)",
+                [(scope, bucket, key) for bucket in lsh_buckets(signature)],
+            )
+            if self.max_age_s:
+                cutoff = now - self.max_age_s
+                conn.execute(
+                    "DELETE FROM near_dup_bucket WHERE key IN (SELECT key FROM near_dup WHERE created < ?)", (cutoff,)
+                )
+                conn.execute("DELETE FROM near_dup WHERE created < ?", (cutoff,))
+
+    def find(self, scope: str, signature: np.ndarray, threshold: float) -> Optional[NearDuplicate]:
+        buckets = lsh_buckets(signature)
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT key, signature FROM near_dup WHERE key IN "
+                f"(SELECT key FROM near_dup_bucket WHERE scope = ? AND bucket IN ({','.join('?' * len(buckets))}))",
+                (scope, *buckets),
+            ).fetchall()
+        return best_near_duplicate(signature, ((row["key"], row["signature"]) for row in rows), threshold)
+
+    def remove(self, key: str) -> None:
+        with self._db() as conn:
+            conn.execute("DELETE FROM near_dup_bucket WHERE key = ?", (key,))
+            conn.execute("DELETE FROM near_dup WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM near_dup").fetchone()[0]
+
+
+NEAR_DUP_BUCKET_KEYS = 64  # sdílený index: nejvýš tolik (nejnovějších) textů v jednom pásmu
+
+
+class SharedNearDuplicateIndex(NearDuplicateStats):
+    """
+    Index téměř stejných textů nad CacheBackend (jmenný prostor near_dup) – se sdíleným úložištěm (Redis)
+    najde dřívější text každá replika. Úložiště umí jen klíč → bajty, proto:
+    - s<klíč StructureCache> → rozsah a otisk (JSON),
+    - b<hash rozsahu a pásma> → seznam klíčů (nejnovějších NEAR_DUP_BUCKET_KEYS).
+    Pásmo se zapisuje bez zámku (přečíst, doplnit, zapsat): při souběhu se může ztratit jeden klíč, což jen
+    sníží šanci na zásah. Stáří hlídá úložiště; klíče bez otisku find() přeskočí a z pásma je vytlačí novější.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        super().__init__()
+        self.backend = backend
+
+    @staticmethod
+    def _bucket_key(scope: str, bucket: str) -> str:
+        return "b" + hashlib.sha256(f"{scope}:{bucket}".encode("utf-8")).hexdigest()[:40]
+
+    @staticmethod
+    def _keys(value: Optional[bytes]) -> List[str]:
+        try:
+            keys = json.loads(value) if value else []
+        except ValueError:
+            return []
+        return [str(k) for k in keys] if isinstance(keys, list) else []
+
+    def add(self, key: str, scope: str, signature: np.ndarray) -> None:
+        record = {"scope": scope, "signature": signature.astype("<u4").tobytes().hex()}
+        self.backend.set("s" + key, json.dumps(record).encode("utf-8"))
+        bucket_keys = [self._bucket_key(scope, bucket) for bucket in lsh_buckets(signature)]
+        current = self.backend.get_many(bucket_keys)
+        for bucket_key in bucket_keys:
+            keys = self._keys(current.get(bucket_key))
+            if key not in keys:
+                keys = (keys + [key])[-NEAR_DUP_BUCKET_KEYS:]
+                self.backend.set(bucket_key, json.dumps(keys).encode("utf-8"))
+
+    def find(self, scope: str, signature: np.ndarray, threshold: float) -> Optional[NearDuplicate]:
+        buckets = self.backend.get_many([self._bucket_key(scope, bucket) for bucket in lsh_buckets(signature)])
+        keys = list(dict.fromkeys(key for value in buckets.values() for key in self._keys(value)))
+        records = self.backend.get_many(["s" + key for key in keys])
+        candidates = []
+        for key in keys:
+            try:
+                record = json.loads(records["s" + key])
+                if record["scope"] == scope:
+                    candidates.append((key, bytes.fromhex(record["signature"])))
+            except (KeyError, ValueError, TypeError):
+                continue
+        return best_near_duplicate(signature, candidates, threshold)
+
+    def remove(self, key: str) -> None:
+        self.backend.delete("s" + key)
+
+
+@st.cache_resource
+def get_near_dup_index() -> Optional[Union[NearDuplicateIndex, SharedNearDuplicateIndex]]:
+    if get_config("EDREAD_NEAR_DUP", "1") != "1":
+        return None
+    if cache_backend_kind() in SHARED_CACHE_BACKENDS:
+        return SharedNearDuplicateIndex(get_cache_backend("near_dup"))
+    return NearDuplicateIndex(
+        os.path.join(get_config("EDREAD_CACHE_DIR", ".edread_cache"), "near_dup.sqlite3"),
+        max_age_s=float(get_config("EDREAD_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+    )
+
+
+def near_dup_signature(full_text: str) -> Optional[np.ndarray]:
+    """Otisk pro NearDuplicateIndex; None, když je index vypnutý (EDREAD_NEAR_DUP=0)."""
+    if get_near_dup_index() is None:
+        return None
+    with span("minhash"):
+        return minhash_signature(full_text)
+
+
+def cache_structure(
+    cache: StructureCache, key: str, structure: GeneratedStructure, scope: str, signature: Optional[np.ndarray]
+) -> None:
+    """Uloží výsledek pod přesný klíč a otisk textu do indexu téměř stejných textů."""
+    cache.put(key, structure)
+    index = get_near_dup_index()
+    if index is not None and signature is not None:
+        index.add(key, scope, signature)
+
+
+STRUCTURE_FIELDS = (
+    "simpl",
+    "lmp",
+    "drama_intro",
+    "drama_scene",
+    "glossary",
+    "questions_A",
+    "questions_B",
+    "questions_C",
+)
+DEFAULT_DRAMA_INTRO = "Na začátku si krátce zahrajeme scénku, která ti pomůže pochopit, o čem text bude."
+
+
+def fallback_structure(full_text: str) -> GeneratedStructure:
+    """Nouzový režim bez OPENAI_API_KEY – plný text všude, bez AI částí (slovníček z úložiště, jinak prázdná místa)."""
+    analysis = analyze_text(full_text)
+    return GeneratedStructure(
+        simpl=full_text,
+        lmp=full_text,
+        drama_intro="(Dramatizace není k dispozici – chybí OPENAI_API_KEY.)",
+        drama_scene=[],
+        glossary=plan_glossary(analysis).merge(seed_glossary(analysis)),
+        questions_A=["(Otázky A nejsou k dispozici – chybí OPENAI_API_KEY.)"],
+        questions_B=["(Otázky B nejsou k dispozici – chybí OPENAI_API_KEY.)"],
+        questions_C=["(Otázky C nejsou k dispozici – chybí OPENAI_API_KEY.)"],
+    )
+
+
+STRUCTURE_SYSTEM_PROMPT = (
+    "Jsi odborník na český jazyk, čtenářskou gramotnost a RVP ZV. "
+    "Umíš tvořit pracovní listy ve stylu ČŠI (čtení s porozuměním). "
+    "Výstup musí být validní JSON, žádný komentář navíc."
+)
+
+
+GLOSSARY_PICK = "vyber 8–14 slov z textu, která mohou být pro žáky obtížná"
+
+
+def glossary_words_line(hard_words: Optional[List[str]]) -> str:
+    """Bez kandidátů vybírá slova AI; s nimi vysvětlí jen je (ostatní jsou ve GlossaryStore)."""
+    if not hard_words:
+        return GLOSSARY_PICK
+    return f"vysvětli jen tato slova z textu (jiná nepřidávej): {', '.join(hard_words)}"
+
+
+def structure_prompts(
+    full_text: str, grade: int, title: str, hard_words: Optional[List[str]] = None, with_glossary: bool = True
+) -> Tuple[str, str]:
+    """
+    hard_words: slova do slovníčku, která AI vysvětlí (analyze_text() minus GlossaryStore);
+    with_glossary=False: slovníček je celý z úložiště – v zadání ani v JSON není.
+    """
+    system = STRUCTURE_SYSTEM_PROMPT
+    if with_glossary:
+        glossary_task = f"""4) Vytvoř SLOVNÍČEK:
+   - {glossary_words_line(hard_words)},
+   - ke každému napiš krátké vysvětlení (max 12 slov),
+   - vrať jako slovník {{ "slovo": "vysvětlení" }}."""
+        glossary_example = """
+  "glossary": {
+    "slovo1": "vysvětlení1",
+    "slovo2": "vysvětlení2"
+  },"""
+    else:
+        glossary_task = "4) SLOVNÍČEK nevytvářej – máme ho hotový."
+        glossary_example = ""
+
+    user = f"""
+Máš vytvořit pracovní list pro žáky {grade}. ročníku ZŠ.
+Název úlohy: {title}
+
+Vstupní text (plná verze):
+\"\"\"{full_text}\"\"\"
+
+ÚKOL:
+1) Vytvoř ZJEDNODUŠENOU verzi textu (pro běžné žáky).
+2) Vytvoř LMP/SPU verzi (velmi krátké věty, maximální srozumitelnost).
+3) Vytvoř krátkou DRAMATIZACI:
+   - 1–2 věty „drama_intro“ (co se bude hrát, proč).
+   - 3–6 replik ve formátu: [ ["Role", "replika"], ... ]
+   - Scénka má být „bez pomůcek“, jen hraní rolí.
+{glossary_task}
+5) Vytvoř OTÁZKY A/B/C:
+   - A: 3–4 otázky na vyhledávání informací.
+   - B: 2–3 otázky na porozumění a interpretaci.
+   - C: 2–3 otázky na názor / kritické čtení (žák zdůvodní).
+
+VRAŤ POUZE JSON VE FORMÁTU:
+
+{{
+  "simpl": "...",
+  "lmp": "...",
+  "drama_intro": "...",
+  "drama_scene": [
+    ["Role 1", "replika 1"],
+    ["Role 2", "replika 2"]
+  ],{glossary_example}
+  "questions_A": ["otázka A1", "otázka A2"],
+  "questions_B": ["otázka B1", "otázka B2"],
+  "questions_C": ["otázka C1", "otázka C2"]
+}}
+"""
+    return system, user
+
+
+def clean_section(key: str, raw, full_text: str):
+    """Očistí jednu položku z JSON odpovědi modelu; chybějící / prázdná hodnota → výchozí."""
+    if key in ("simpl", "lmp"):
+        return str(raw if raw is not None else full_text).strip() or full_text
+
+    if key == "drama_intro":
+        return str(raw if raw is not None else "").strip() or DEFAULT_DRAMA_INTRO
+
+    if key == "drama_scene":
+        drama_scene: List[Tuple[str, str]] = []
+        if isinstance(raw, list):
+            for item in raw:
+                if isinstance(item, (list, tuple)) and len(item) == 2:
+                    role = str(item[0]).strip()
+                    line = str(item[1]).strip()
+                    if role and line:
+                        drama_scene.append((role, line))
+        return drama_scene
+
+    if key == "glossary":
+        glossary: Dict[str, str] = {}
+        if isinstance(raw, dict):
+            for k, v in raw.items():
+                kk = str(k).strip()
+                vv = str(v).strip()
+                if kk and vv:
+                    glossary[kk] = vv
+        return glossary
+
+    out_list: List[str] = []
+    if isinstance(raw, list):
+        for q in raw:
+            qq = str(q).strip()
+            if qq:
+                out_list.append(qq)
+    return out_list or [f"(Žádné otázky v sekci {key} – zkus generovat znovu.)"]
+
+
+def structure_from_data(data: Dict, full_text: str) -> GeneratedStructure:
+    return GeneratedStructure(**{key: clean_section(key, data.get(key), full_text) for key in STRUCTURE_FIELDS})
+
+
+# =========================
+# AI – tolerantní čtení JSON z odpovědi
+# =========================
+# Model občas obalí JSON do ```json, připíše komentář nebo odpověď usekne (max_tokens).
+# Místo nového generování celé struktury vezmeme, co jde, a dogenerujeme jen chybějící pole.
+STRUCTURE_SCHEMA: Dict[str, type] = {
+    "simpl": str,
+    "lmp": str,
+    "drama_intro": str,
+    "drama_scene": list,
+    "glossary": dict,
+    "questions_A": list,
+    "questions_B": list,
+    "questions_C": list,
+}
+
+
+def strip_code_fences(text: str) -> str:
+    m = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.S)
+    return m.group(1) if m else text
+
+
+def repair_truncated_json(text: str, max_attempts: int = 200) -> Optional[Dict]:
+    """
+    Nejdelší platný začátek useknutého JSON objektu: text se zkrátí za poslední
+    dokončenou hodnotu a doplní se chybějící uzavírací závorky. Rozepsaný řetězec se zahodí.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    stack: List[str] = []
+    in_string = escape = False
+    cuts: List[Tuple[int, str]] = []  # (konec platné hodnoty, chybějící závorky)
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+                cuts.append((i + 1, "".join(reversed(stack))))
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cuts.append((i + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif c in "0123456789el":  # konec čísla / true / false / null
+            cuts.append((i + 1, "".join(reversed(stack))))
+
+    for end, closers in reversed(cuts[-max_attempts:]):
+        candidate = text[start:end].rstrip().rstrip(",") + closers
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue  # např. řez hned za klíčem – zkusíme kratší začátek
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def parse_model_json(text: str, metrics: Optional[Metrics] = None) -> Dict:
+    """
+    json.loads odpovědi modelu s opravami: ```ploty```, text před/za objektem, useknutý konec.
+    Vyhodí ValueError, jen když v odpovědi není nic použitelného.
+    """
+    metrics = metrics or current_metrics()
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            metrics.inc("edread_json_parse_total", result="ok")
+            return data
+    except ValueError:
+        pass
+
+    body = strip_code_fences(text)
+    start = body.find("{")
+    data = None
+    if start >= 0:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(body, start)
+        except ValueError:
+            data = repair_truncated_json(body[start:])
+    if not isinstance(data, dict):
+        metrics.inc("edread_json_parse_total", result="failed")
+        raise ValueError("AI nevrátila platný JSON.")
+    metrics.inc("edread_json_parse_total", result="recovered")
+    return data
+
+
+def invalid_fields(data: Dict, fields=STRUCTURE_FIELDS) -> List[str]:
+    """Pole, která v odpovědi chybí, mají špatný typ nebo jsou prázdná."""
+    bad: List[str] = []
+    for key in fields:
+        raw = data.get(key)
+        if not isinstance(raw, STRUCTURE_SCHEMA[key]):
+            bad.append(key)
+        elif isinstance(raw, str):
+            if not raw.strip():
+                bad.append(key)
+        elif key in ("drama_scene", "glossary"):
+            if not clean_section(key, raw, ""):
+                bad.append(key)
+        elif not any(str(q).strip() for q in raw):
+            bad.append(key)
+    return bad
+
+
+def ai_regenerate_fields(
+    fields: List[str],
+    full_text: str,
+    grade: int,
+    title: str,
+    timeout: Optional[float] = None,
+    hard_words: Optional[List[str]] = None,
+) -> Tuple[Dict, List[str]]:
+    """
+    Dogeneruje jen zadaná pole – souběžnými dotazy na sekce (SECTION_PROMPTS), do kterých patří.
+    Vrací (data jen pro úspěšné sekce, seznam neúspěšných sekcí).
+    """
+    sections = [name for name, spec in SECTION_PROMPTS.items() if set(spec[0]) & set(fields)]
+    metrics = current_metrics()
+    for name in sections:
+        metrics.inc("edread_json_reask_total", section=name)
+    partial, failed = ai_generate_structure_split(
+        full_text, grade, title, sections=sections, timeout=timeout, hard_words=hard_words
+    )
+    data = {
+        key: getattr(partial, key)
+        for name in sections
+        if name not in failed
+        for key in SECTION_PROMPTS[name][0]
+        if key in fields
+    }
+    return data, failed
+
+
+def complete_structure_data(
+    data: Dict, full_text: str, grade: int, title: str, hard_words: Optional[List[str]] = None
+) -> Tuple[Dict, List[str]]:
+    """Doplní chybějící / neplatná pole dotazem jen na ně; vrací (data, neúspěšné sekce)."""
+    missing = invalid_fields(data)
+    if not missing:
+        return data, []
+    extra, failed = ai_regenerate_fields(missing, full_text, grade, title, hard_words=hard_words)
+    return {**data, **extra}, failed
+
+
+def ensure_simpler(
+    structure: GeneratedStructure, full_text: str, grade: int, title: str, analysis: TextAnalysis
+) -> GeneratedStructure:
+    """
+    Ověří, že simpl/lmp jsou jednodušší než originál (simplification_failures); neprošlé verze
+    se jednou vygenerují znovu – jen ony. Nová verze se použije, jen když kontrolou projde.
+    """
+    failing = simplification_failures(structure, analysis, grade)
+    if not failing:
+        return structure
+    metrics = current_metrics()
+    for key in failing:
+        metrics.inc("edread_readability_retry_total", field=key)
+    extra, _ = ai_regenerate_fields(failing, full_text, grade, title)
+    for key in failing:
+        if key not in extra:
+            continue
+        candidate = replace(structure, **{key: clean_section(key, extra[key], full_text)})
+        if key not in simplification_failures(candidate, analysis, grade):
+            structure = candidate
+    return structure
+
+
+NEAR_DUP_TEXT_FIELDS = ("simpl", "lmp")  # doslova ze znění textu vycházejí jen upravené verze
+
+
+def near_duplicate_structure(
+    cache: StructureCache,
+    key: str,
+    scope: str,
+    signature: Optional[np.ndarray],
+    full_text: str,
+    grade: int,
+    title: str,
+    partial: bool = True,
+) -> Optional[GeneratedStructure]:
+    """
+    Výsledek dříve vygenerovaného, téměř stejného textu (NearDuplicateIndex), nebo None.
+    - podobnost ≥ EDREAD_NEAR_DUP_REUSE (výchozí 0.95; mezery, překlep): výsledek se použije celý,
+    - podobnost ≥ EDREAD_NEAR_DUP_MIN (výchozí 0.8; věta navíc, upravený odstavec) a partial: dramatizace,
+      slovníček a otázky zůstanou, zjednodušená a LMP verze se vygenerují znovu z nového textu.
+    Výsledek se uloží pod přesný klíč nového textu. Do indexu přibude jen s nově vygenerovanými verzemi,
+    takže řada drobných úprav se vždy porovnává s textem, ze kterého verze opravdu vznikly.
+    """
+    index = get_near_dup_index()
+    if index is None or signature is None:
+        return None
+    reuse_at = float(get_config("EDREAD_NEAR_DUP_REUSE", "0.95"))
+    threshold = min(reuse_at, float(get_config("EDREAD_NEAR_DUP_MIN", "0.8"))) if partial else reuse_at
+    with span("near_dup_lookup"):
+        match = index.find(scope, signature, threshold)
+        cached = cache.get(match.key, count=False) if match is not None else None
+    if cached is None:
+        if match is not None:
+            index.remove(match.key)  # záznam už cache vyřadila (LRU / stáří)
+        index.count("miss")
+        return None
+    if match.similarity >= reuse_at:
+        index.count("hit")
+        cache.put(key, cached)
+        return cached
+
+    index.count("partial")
+    extra, failed = ai_regenerate_fields(list(NEAR_DUP_TEXT_FIELDS), full_text, grade, title)
+    structure = replace(cached, **{field: clean_section(field, extra.get(field), full_text) for field in NEAR_DUP_TEXT_FIELDS})
+    structure = ensure_simpler(structure, full_text, grade, title, analyze_text(full_text))
+    if not failed:
+        cache_structure(cache, key, structure, scope, signature)
+    return structure
+
+
+AI_MODES = ("single", "split", "long")
+
+
+def default_ai_mode(full_text: str) -> str:
+    """Režim podle EDREAD_AI_MODE; text delší než EDREAD_LONG_TEXT_CHARS jde vždy po částech („long“)."""
+    if len(full_text) > int(get_config("EDREAD_LONG_TEXT_CHARS", "8000")):
+        return "long"
+    return get_config("EDREAD_AI_MODE", "single").lower()
+
+
+def stream_ai_mode(full_text: str) -> str:
+    """
+    Režim streamovaného generování: jeden velký prompt bez kontroly zjednodušení („stream“ – vlastní
+    klíč cache, viz STREAM_PROMPT_VERSION), dlouhý text po částech (nedá se streamovat).
+    """
+    return "long" if default_ai_mode(full_text) == "long" else "stream"
+
+
+def ai_generate_structure(
+    full_text: str,
+    grade: int,
+    title: str,
+    use_cache: bool = True,
+    mode: Optional[str] = None,
+    shared: Optional[SharedTextPass] = None,
+) -> GeneratedStructure:
+    """
+    Z jednoho vstupního textu vygeneruje:
+    - zjednodušenou verzi
+    - LMP/SPU verzi
+    - dramatizaci (intro + 3–6 replik)
+    - slovníček pojmů
+    - otázky A/B/C
+
+    mode: "single" (jeden velký prompt), "split" (souběžné dotazy po sekcích)
+    nebo "long" (dlouhý text po částech, map-reduce); bez zadání viz default_ai_mode().
+    shared: části nezávislé na ročníku ze sady více ročníků (viz ai_generate_structures).
+    Výsledek se ukládá do cache podle (text, ročník, název, model, verze promptu).
+    """
+    if not get_openai_key():
+        return fallback_structure(full_text)
+
+    with span("ai_generate_structure"):
+        return _ai_generate_structure(full_text, grade, title, use_cache, mode, shared)
+
+
+def mode_prompt_version(mode: str) -> str:
+    """Verze promptu do klíče cache; „stream“ (stream_ai_mode) se nedá zvolit přes EDREAD_AI_MODE."""
+    if mode not in AI_MODES + ("stream",):
+        raise ValueError(f"Neznámý režim AI: {mode} (povoleno: {', '.join(AI_MODES)})")
+    versions = {"split": SPLIT_PROMPT_VERSION, "long": LONG_PROMPT_VERSION, "stream": STREAM_PROMPT_VERSION}
+    return versions.get(mode, PROMPT_VERSION)
+
+
+def _ai_generate_structure(
+    full_text: str, grade: int, title: str, use_cache: bool, mode: Optional[str], shared: Optional[SharedTextPass]
+) -> GeneratedStructure:
+    mode = (mode or default_ai_mode(full_text)).lower()
+    prompt_version = mode_prompt_version(mode)
+    if not use_cache:
+        return _generate_structure(full_text, grade, title, mode, shared)[0]
+
+    cache = get_structure_cache()
+    key = structure_cache_key(full_text, grade, title, get_openai_model(), prompt_version)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    # stejný vstup právě generuje jiná session (nebo replika) – převezme se její výsledek z cache
+    with single_flight(key, lambda: cache.get(key, count=False)) as done:
+        if done is not None:
+            return done
+        # drobně upravený text: převezme se výsledek původního (dlouhý text jen celý, texty se po částech nedogenerují)
+        scope = near_dup_scope(grade, title, get_openai_model(), prompt_version)
+        signature = near_dup_signature(full_text)
+        near = near_duplicate_structure(cache, key, scope, signature, full_text, grade, title, partial=mode != "long")
+        if near is not None:
+            return near
+
+        structure, failed = _generate_structure(full_text, grade, title, mode, shared)
+        # výsledek s nouzovými sekcemi do cache nedáváme – příště se zkusí znovu
+        if not failed:
+            cache_structure(cache, key, structure, scope, signature)
+        return structure
+
+
+def _generate_structure(
+    full_text: str, grade: int, title: str, mode: str, shared: Optional[SharedTextPass]
+) -> Tuple[GeneratedStructure, List[str]]:
+    """Generování bez cache; vrací (struktura, sekce s nouzovou náhradou)."""
+    # lokální analýza (CPU, bez AI): kandidáti do slovníčku a měřítko pro kontrolu zjednodušení;
+    # slova, která zná GlossaryStore, už AI nevysvětluje
+    if shared is not None:
+        analysis, plan = shared.analysis, shared.plan
+    else:
+        with span("analyze_text"):
+            analysis = analyze_text(full_text)
+            plan = plan_glossary(analysis)
+
+    failed: List[str] = []
+    if mode == "split":
+        sections = [name for name in SECTION_PROMPTS if plan.ask_ai or name != "glossary"]
+        structure, failed = ai_generate_structure_split(full_text, grade, title, sections=sections, hard_words=plan.ask)
+    elif mode == "long":
+        sections = [name for name in REDUCE_SECTIONS if plan.ask_ai or name != "glossary"]
+        structure, failed = ai_generate_structure_long(full_text, grade, title, sections=sections, hard_words=plan.ask)
+    else:
+        system, user = structure_prompts(full_text, grade, title, plan.ask, with_glossary=plan.ask_ai)
+        out = call_openai_chat(system, user, temperature=0.2, max_tokens=2600)
+        with span("parse_json"):
+            try:
+                data = parse_model_json(out)
+            except ValueError:
+                data = {}  # nic použitelného – všechna pole se dogenerují po sekcích
+        if not plan.ask_ai:
+            data["glossary"] = shared.glossary() if shared is not None else plan.known
+        data, failed = complete_structure_data(data, full_text, grade, title, plan.ask)
+        structure = structure_from_data(data, full_text)
+
+    # dlouhý text se zjednodušuje po částech – celek znovu negenerujeme
+    if mode != "long":
+        structure = ensure_simpler(structure, full_text, grade, title, analysis)
+    if shared is not None:
+        structure.glossary = shared.glossary()
+        if shared.failed:
+            failed.append("glossary")
+    else:
+        if plan.ask_ai:
+            get_glossary_store().learn(structure.glossary)
+        structure.glossary = plan.merge(structure.glossary) or seed_glossary(analysis)
+    return structure, failed
+
+
+# =========================
+# AI – souběžné dotazy po sekcích
+# =========================
+# Místo jednoho dlouhého výstupu se každá sekce generuje zvlášť a souběžně –
+# celková doba je pak zhruba doba nejpomalejší sekce, ne součet všech.
+SPLIT_PROMPT_VERSION = "split-3"
+
+QUESTION_TASKS = {
+    "questions_A": "3–4 otázky na vyhledávání informací",
+    "questions_B": "2–3 otázky na porozumění a interpretaci",
+    "questions_C": "2–3 otázky na názor / kritické čtení (žák zdůvodní)",
+}
+
+# název: (pole ve výsledku, zadání, ukázka JSON, max_tokens)
+SECTION_PROMPTS: Dict[str, Tuple[Tuple[str, ...], str, str, int]] = {
+    "simpl": (
+        ("simpl",),
+        "Vytvoř ZJEDNODUŠENOU verzi textu (pro běžné žáky).",
+        '{"simpl": "..."}',
+        1200,
+    ),
+    "lmp": (
+        ("lmp",),
+        "Vytvoř LMP/SPU verzi (velmi krátké věty, maximální srozumitelnost).",
+        '{"lmp": "..."}',
+        1000,
+    ),
+    "drama": (
+        ("drama_intro", "drama_scene"),
+        "Vytvoř krátkou DRAMATIZACI:\n"
+        "   - 1–2 věty „drama_intro“ (co se bude hrát, proč).\n"
+        "   - 3–6 replik ve formátu: [ [\"Role\", \"replika\"], ... ]\n"
+        "   - Scénka má být „bez pomůcek“, jen hraní rolí.",
+        '{"drama_intro": "...", "drama_scene": [["Role 1", "replika 1"], ["Role 2", "replika 2"]]}',
+        500,
+    ),
+    "glossary": (
+        ("glossary",),
+        "Vytvoř SLOVNÍČEK:\n"
+        f"   - {GLOSSARY_PICK},\n"
+        "   - ke každému napiš krátké vysvětlení (max 12 slov),\n"
+        '   - vrať jako slovník { "slovo": "vysvětlení" }.',
+        '{"glossary": {"slovo1": "vysvětlení1", "slovo2": "vysvětlení2"}}',
+        500,
+    ),
+    "questions": (
+        ("questions_A", "questions_B", "questions_C"),
+        "Vytvoř OTÁZKY A/B/C:\n" + "\n".join(f"   - {key[-1]}: {task}." for key, task in QUESTION_TASKS.items()),
+        '{"questions_A": ["otázka A1", "otázka A2"], "questions_B": ["otázka B1"], "questions_C": ["otázka C1"]}',
+        600,
+    ),
+}
+
+
+def section_prompts(
+    section: str,
+    full_text: str,
+    grade: int,
+    title: str,
+    hard_words: Optional[List[str]] = None,
+    spec: Optional[Tuple[Tuple[str, ...], str, str, int]] = None,
+) -> Tuple[str, str]:
+    """spec: zadání místo SECTION_PROMPTS[section] (viz REGENERATE_UNITS)."""
+    system = STRUCTURE_SYSTEM_PROMPT
+    _, task, example, _ = spec or SECTION_PROMPTS[section]
+    source_label, source = "Vstupní text (plná verze)", full_text
+    if section == "glossary" and hard_words:
+        # slovníček nepotřebuje celý text – stačí věty s kandidátními slovy z analyze_text()
+        context = "\n".join(context_sentences(full_text, hard_words))
+        if context and len(context) < len(full_text):
+            source_label, source = "Věty z textu, ve kterých jsou obtížná slova", context
+        task = task.replace(GLOSSARY_PICK, glossary_words_line(hard_words))
+    user = f"""
+Máš vytvořit část pracovního listu pro žáky {grade}. ročníku ZŠ.
+Název úlohy: {title}
+
+{source_label}:
+\"\"\"{source}\"\"\"
+
+ÚKOL:
+{task}
+
+VRAŤ POUZE JSON VE FORMÁTU:
+{example}
+"""
+    return system, user
+
+
+def ai_generate_section(
+    section: str,
+    full_text: str,
+    grade: int,
+    title: str,
+    timeout: float,
+    client: Optional[OpenAIClient] = None,
+    hard_words: Optional[List[str]] = None,
+    deadline: Optional[float] = None,
+) -> Dict:
+    fields, _, _, max_tokens = SECTION_PROMPTS[section]
+    system, user = section_prompts(section, full_text, grade, title, hard_words)
+    out = call_openai_chat(
+        system, user, temperature=0.2, max_tokens=max_tokens, timeout=timeout, client=client, deadline=deadline
+    )
+    with span("parse_json"):
+        data = parse_model_json(out)
+    missing = invalid_fields(data, fields)
+    if missing:
+        # sekce je malá – neúplná odpověď znamená neúspěch sekce (výchozí hodnoty, bez cache)
+        raise ValueError(f"Sekce {section}: chybí {', '.join(missing)}.")
+    return {key: data.get(key) for key in fields}
+
+
+def ai_generate_structure_split(
+    full_text: str,
+    grade: int,
+    title: str,
+    sections: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    hard_words: Optional[List[str]] = None,
+) -> Tuple[GeneratedStructure, List[str]]:
+    """
+    Souběžně vygeneruje sekce (None = všechny ze SECTION_PROMPTS, [] = žádnou) a složí z nich GeneratedStructure.
+    Sekce, která selže nebo nestihne timeout (EDREAD_SECTION_TIMEOUT_S), dostane výchozí hodnoty.
+    Timeout platí pro každou sekci zvlášť včetně opakování dotazu (deadline v OpenAIClient.post).
+    hard_words: kandidáti do slovníčku – sekce glossary pak dostane jen věty s nimi.
+    Vrací (struktura, seznam neúspěšných sekcí).
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    sections = list(SECTION_PROMPTS) if sections is None else list(sections)
+    if not sections:
+        return structure_from_data({}, full_text), []
+    timeout = float(timeout or get_config("EDREAD_SECTION_TIMEOUT_S", "60"))
+    deadline = time.monotonic() + timeout
+    data: Dict = {}
+    failed: List[str] = []
+    client = get_openai_client()
+
+    pool = ThreadPoolExecutor(max_workers=len(sections), thread_name_prefix="edread-ai")
+    try:
+        futures = {
+            # copy_context: span() ve vláknech zapisuje do trasy volajícího
+            pool.submit(
+                contextvars.copy_context().run,
+                ai_generate_section,
+                name,
+                full_text,
+                grade,
+                title,
+                timeout,
+                client,
+                hard_words,
+                deadline,
+            ): name
+            for name in sections
+        }
+        # všechny sekce startují naráz, takže společný limit je zároveň limit každé z nich
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        failed.extend(futures[fut] for fut in not_done)
+        for fut in done:
+            try:
+                data.update(fut.result())
+            except Exception:
+                # chyba jedné sekce neshodí celé generování – zůstanou výchozí hodnoty
+                failed.append(futures[fut])
+    finally:
+        # vlákna, která limit nestihla, se nečekají – dotaz v nich skončí nejpozději s deadline
+        # (další pokus se už nepustí) a jeho výsledek se zahodí
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return structure_from_data(data, full_text), failed
+
+
+# =========================
+# AI – dlouhé texty (map-reduce po částech)
+# =========================
+# Dlouhý text se rozdělí na části po celých odstavcích; zjednodušení (simpl + lmp) každé části
+# běží souběžně (map) a slovníček, dramatizace a otázky se pak udělají ze spojené
+# zjednodušené verze (reduce). Doba roste jen s nejpomalejší částí, ne s celou délkou.
+LONG_PROMPT_VERSION = "long-2"
+
+# kratší výstup než tento podíl délky části bereme jako useknutý / vynechaný
+CHUNK_MIN_RATIO = 0.15
+REDUCE_SECTIONS = ["drama", "glossary", "questions"]
+
+
+def split_into_chunks(full_text: str, max_chars: int) -> List[str]:
+    """
+    Rozdělí text na části o max. `max_chars` znacích. Hranice vede mezi odstavci;
+    delší odstavec se dělí po větách a extrémně dlouhá věta natvrdo. Nic se nevynechá.
+    """
+    # (kus textu, oddělovač před ním) – věty jednoho odstavce spojuje mezera, odstavce prázdný řádek
+    units: List[Tuple[str, str]] = []
+    for para in re.split(r"\n\s*\n", full_text.strip()):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            units.append((para, "\n\n"))
+            continue
+        sep = "\n\n"
+        for sentence in re.split(r"(?<=[.!?…])\s+", para):
+            while len(sentence) > max_chars:
+                units.append((sentence[:max_chars], sep))
+                sentence, sep = sentence[max_chars:], ""
+            if sentence:
+                units.append((sentence, sep))
+            sep = " "
+
+    chunks: List[str] = []
+    current = ""
+    for text, sep in units:
+        if current and len(current) + len(sep) + len(text) > max_chars:
+            chunks.append(current)
+            current = text
+        else:
+            current = f"{current}{sep}{text}" if current else text
+    if current:
+        chunks.append(current)
+
+    # pojistka: části musí dát dohromady celý vstup (až na bílé znaky)
+    if re.sub(r"\s+", "", "".join(chunks)) != re.sub(r"\s+", "", full_text):
+        raise RuntimeError("Rozdělení textu na části ztratilo obsah.")
+    return chunks
+
+
+def chunk_prompts(chunk: str, index: int, total: int, grade: int, title: str) -> Tuple[str, str]:
+    system = STRUCTURE_SYSTEM_PROMPT
+    user = f"""
+Upravuješ {index}. část z {total} delšího textu pro žáky {grade}. ročníku ZŠ.
+Název úlohy: {title}
+
+Část textu:
+\"\"\"{chunk}\"\"\"
+
+ÚKOL:
+1) Vytvoř ZJEDNODUŠENOU verzi této části (pro běžné žáky).
+2) Vytvoř LMP/SPU verzi této části (velmi krátké věty, maximální srozumitelnost).
+Zachovej všechny důležité informace i jejich pořadí. Nepiš úvod ani závěr – části se pak spojí za sebe.
+
+VRAŤ POUZE JSON VE FORMÁTU:
+{{"simpl": "...", "lmp": "..."}}
+"""
+    return system, user
+
+
+def chunk_result_ok(chunk: str, data: Dict) -> bool:
+    """Kontrola, že se část neztratila: simpl i lmp jsou vyplněné a nejsou podezřele krátké."""
+    for key in ("simpl", "lmp"):
+        value = str(data.get(key) or "").strip()
+        if len(value) < CHUNK_MIN_RATIO * len(chunk):
+            return False
+    return True
+
+
+def ai_generate_chunk(
+    chunk: str, index: int, total: int, grade: int, title: str, timeout: float, client: Optional[OpenAIClient] = None
+) -> Dict:
+    system, user = chunk_prompts(chunk, index, total, grade, title)
+    # simpl + lmp dohromady bývají zhruba stejně dlouhé jako vstup; ~2,5 znaku na token
+    max_tokens = min(4000, max(600, int(len(chunk) / 2.5)))
+    out = call_openai_chat(system, user, temperature=0.2, max_tokens=max_tokens, timeout=timeout, client=client)
+    with span("parse_json"):
+        data = parse_model_json(out)
+    if not chunk_result_ok(chunk, data):
+        raise RuntimeError(f"Část {index}/{total}: neúplná odpověď AI.")
+    return {"simpl": str(data["simpl"]).strip(), "lmp": str(data["lmp"]).strip()}
+
+
+def ai_generate_structure_long(
+    full_text: str,
+    grade: int,
+    title: str,
+    max_chars: Optional[int] = None,
+    timeout: Optional[float] = None,
+    hard_words: Optional[List[str]] = None,
+    sections: Optional[List[str]] = None,
+) -> Tuple[GeneratedStructure, List[str]]:
+    """
+    Map-reduce pro dlouhé texty (EDREAD_CHUNK_CHARS znaků na část, EDREAD_CHUNK_WORKERS souběžně).
+    Část, která selže, se jednou zopakuje; když selže znovu, použije se její původní text –
+    žádná část z výsledku nevypadne. sections: sekce kroku reduce (výchozí REDUCE_SECTIONS).
+    Vrací (struktura, seznam neúspěšných částí a sekcí).
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    max_chars = int(max_chars or get_config("EDREAD_CHUNK_CHARS", "3000"))
+    timeout = float(timeout or get_config("EDREAD_SECTION_TIMEOUT_S", "60"))
+    workers = int(get_config("EDREAD_CHUNK_WORKERS", "8"))
+    chunks = split_into_chunks(full_text, max_chars)
+    results: Dict[int, Dict] = {}
+    client = get_openai_client()
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks))), thread_name_prefix="edread-ai")
+
+    def submit(i: int):
+        return pool.submit(
+            contextvars.copy_context().run, ai_generate_chunk, chunks[i], i + 1, len(chunks), grade, title, timeout, client
+        )
+
+    try:
+        futures = {submit(i): i for i in range(len(chunks))}
+        for attempt in range(2):
+            done, _ = wait(futures, timeout=timeout)
+            raised = []
+            for fut in done:
+                i = futures.pop(fut)
+                try:
+                    results[i] = fut.result()
+                except Exception:
+                    raised.append(i)
+            if attempt == 0:
+                # znovu jen části, které skončily chybou; první pokusy, které ještě běží, se neposílají
+                # podruhé (dvojí tokeny, fronta v poolu) – počkají do dalšího limitu spolu s opakováním
+                futures.update({submit(i): i for i in raised})
+            if not futures:
+                break
+    finally:
+        # co nestihlo ani druhý limit, se zruší a použije se původní text
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    pending = [i for i in range(len(chunks)) if i not in results]
+    failed = [f"chunk{i + 1}" for i in pending]
+    # nezdařená část → původní text, aby ve výsledku nechyběla
+    simpl = "\n\n".join(results[i]["simpl"] if i in results else chunks[i] for i in range(len(chunks)))
+    lmp = "\n\n".join(results[i]["lmp"] if i in results else chunks[i] for i in range(len(chunks)))
+
+    # reduce: slovníček, dramatizace a otázky ze spojené zjednodušené verze (souběžně po sekcích)
+    structure, failed_sections = ai_generate_structure_split(
+        simpl, grade, title, sections=REDUCE_SECTIONS if sections is None else sections, timeout=timeout, hard_words=hard_words
+    )
+    structure.simpl = simpl
+    structure.lmp = lmp
+    return structure, failed + failed_sections
+
+
+# =========================
+# AI – sada pro více ročníků z jednoho textu
+# =========================
+# Stejný text pro 3., 4. a 5. ročník nemusí projít třemi celými generováními: analýza textu, plán
+# slovníčku i slovníček sám na ročníku nezávisí. Ročníky se na AI ptají jen na zjednodušení, dramatizaci
+# a otázky – souběžně mezi sebou i se společným dotazem na slovníček. Každý z těchto dotazů ale nese celý
+# text (výstup na ročníku závisí): dotazů je pořád N a tokeny ušetří jen slovníček, zrychlení je ze souběhu.
+class SharedTextPass:
+    """
+    Části nezávislé na ročníku pro ai_generate_structures:
+    - analysis a plan (GlossaryPlan s ask_ai=False – ročníky slovníček negenerují),
+    - glossary(): jeden dotaz na slovníček pro nejnižší ročník (vysvětlení pro mladší žáky poslouží
+      i starším), běží ve vlákně poolu souběžně s dotazy ročníků; failed = dotaz selhal.
+    """
+
+    def __init__(self, full_text: str, grade: int, title: str, pool):
+        with span("analyze_text"):
+            self.analysis = analyze_text(full_text)
+            self._base = plan_glossary(self.analysis)
+        self.plan = GlossaryPlan(known=self._base.known, ask=[], ask_ai=False, covered=self._base.covered)
+        self.failed = False
+        self._lock = threading.Lock()
+        self._glossary: Optional[Dict[str, str]] = None
+        self._future = None
+        if self._base.ask_ai:
+            self._future = pool.submit(
+                contextvars.copy_context().run, self._generate_glossary, full_text, grade, title
+            )
+
+    def _generate_glossary(self, full_text: str, grade: int, title: str) -> Dict[str, str]:
+        timeout = float(get_config("EDREAD_SECTION_TIMEOUT_S", "60"))
+        data = ai_generate_section("glossary", full_text, grade, title, timeout, hard_words=self._base.ask)
+        glossary = clean_section("glossary", data["glossary"], full_text)
+        get_glossary_store().learn(glossary)
+        return glossary
+
+    def glossary(self) -> Dict[str, str]:
+        with self._lock:
+            if self._glossary is None:
+                generated: Dict[str, str] = {}
+                if self._future is not None:
+                    try:
+                        generated = self._future.result()
+                    except Exception:
+                        # stejně jako u sekce v režimu split: výchozí hodnoty a výsledek se necachuje
+                        self.failed = True
+                self._glossary = self._base.merge(generated) or seed_glossary(self.analysis)
+            return dict(self._glossary)
+
+
+def ai_generate_structures(
+    full_text: str, grades: Iterable[int], title: str, use_cache: bool = True, mode: Optional[str] = None
+) -> Dict[int, GeneratedStructure]:
+    """
+    GeneratedStructure pro každý ročník z `grades` – jako ai_generate_structure, ale ročníky běží souběžně
+    a části nezávislé na ročníku se spočítají jednou (SharedTextPass). Ročníky, které už jsou v cache,
+    se negenerují; zbývá-li jeden, je to obyčejné ai_generate_structure.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    grades = sorted({int(g) for g in grades})
+    mode = (mode or default_ai_mode(full_text)).lower()
+    prompt_version = mode_prompt_version(mode)
+    cache = get_structure_cache() if use_cache else None
+    missing = [
+        grade
+        for grade in grades
+        if cache is None
+        or cache.get(structure_cache_key(full_text, grade, title, get_openai_model(), prompt_version), count=False) is None
+    ]
+    if not get_openai_key() or len(missing) < 2:
+        return {grade: ai_generate_structure(full_text, grade, title, use_cache, mode) for grade in grades}
+
+    pool = ThreadPoolExecutor(max_workers=len(grades) + 1, thread_name_prefix="edread-grades")
+    try:
+        with span("ai_generate_structures"):
+            shared = SharedTextPass(full_text, min(missing), title, pool)
+            futures = {
+                grade: pool.submit(
+                    contextvars.copy_context().run,
+                    ai_generate_structure,
+                    full_text,
+                    grade,
+                    title,
+                    use_cache,
+                    mode,
+                    shared,
+                )
+                for grade in grades
+            }
+            return {grade: fut.result() for grade, fut in futures.items()}
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# =========================
+# AI – nový návrh jedné části
+# =========================
+# Když se učiteli nelíbí jen otázky C nebo dramatizace, AI dostane cílené zadání jen pro tuto část
+# (s předchozím návrhem, aby vytvořila jiný) a výsledek se vloží do hotové struktury – dlouhé
+# přepisy simpl/lmp ani dokumenty, které na části nezávisí, se neopakují.
+# jednotka úpravy: (pole ve struktuře, zadání, ukázka JSON, max_tokens) jako SECTION_PROMPTS
+REGENERATE_UNITS: Dict[str, Tuple[Tuple[str, ...], str, str, int]] = {
+    **{name: SECTION_PROMPTS[name] for name in ("simpl", "lmp", "drama", "glossary")},
+    **{
+        key: ((key,), f"Vytvoř OTÁZKY {key[-1]}: {task}.", f'{{"{key}": ["otázka 1", "otázka 2"]}}', 300)
+        for key, task in QUESTION_TASKS.items()
+    },
+}
+REGENERATE_TEMPERATURE = 0.7  # vyšší než při generování – má vzniknout jiný návrh
+
+
+def regenerate_prompts(
+    unit: str, structure: GeneratedStructure, full_text: str, grade: int, title: str
+) -> Tuple[str, str]:
+    fields, task, example, max_tokens = REGENERATE_UNITS[unit]
+    if unit not in ("simpl", "lmp"):
+        # celé zjednodušené verze zpět neposíláme (zbytečně dlouhé), u krátkých částí předchozí návrh ano
+        previous = json.dumps({f: getattr(structure, f) for f in fields}, ensure_ascii=False)
+        task += f"\n\nPředchozí návrh se učiteli nelíbil, vytvoř jiný (stejný rozsah i formát):\n{previous}"
+    # slovníček: vysvětlení stejných slov, jen jinými slovy
+    hard_words = list(structure.glossary) if unit == "glossary" else None
+    return section_prompts(unit, full_text, grade, title, hard_words, spec=(fields, task, example, max_tokens))
+
+
+def ai_regenerate_section(
+    unit: str, structure: GeneratedStructure, full_text: str, grade: int, title: str
+) -> GeneratedStructure:
+    """
+    Nový návrh jedné části (klíč REGENERATE_UNITS: simpl, lmp, drama, glossary, questions_A/B/C);
+    ostatní pole struktury zůstanou. Neplatná odpověď AI → ValueError, struktura se nemění.
+    """
+    if not get_openai_key():
+        raise RuntimeError("Bez OPENAI_API_KEY nejde část vygenerovat znovu.")
+    fields, _, _, max_tokens = REGENERATE_UNITS[unit]
+    system, user = regenerate_prompts(unit, structure, full_text, grade, title)
+    with span(f"regenerate_{unit}"):
+        out = call_openai_chat(system, user, temperature=REGENERATE_TEMPERATURE, max_tokens=max_tokens)
+    with span("parse_json"):
+        data = parse_model_json(out)
+    missing = invalid_fields(data, fields)
+    if missing:
+        raise ValueError(f"AI nevrátila platnou část ({', '.join(missing)}) – zkus to znovu.")
+    patched = replace(structure, **{f: clean_section(f, data[f], full_text) for f in fields})
+    if "glossary" in fields:
+        # nelíbilo se vysvětlení od AI – nový návrh ho nahradí i ve sdíleném slovníčku (jinak by se vracelo)
+        get_glossary_store().learn(patched.glossary, replace=True)
+    return patched
+
+
+def patch_cached_structure(
+    full_text: str, grade: int, title: str, structure: GeneratedStructure, mode: Optional[str] = None
+) -> bool:
+    """
+    Nahradí v cache uložený výsledek téhož vstupu upravenou strukturou, aby ji převzalo i příští generování.
+    mode: režim, kterým původní výsledek vznikl (klíč cache závisí na verzi promptu; streamování viz
+    stream_ai_mode); bez zadání default_ai_mode(). Vstup, který v cache není (např. s nouzovými sekcemi),
+    se nepřidává; vrací, zda se záznam nahradil.
+    """
+    cache = get_structure_cache()
+    prompt_version = mode_prompt_version((mode or default_ai_mode(full_text)).lower())
+    key = structure_cache_key(full_text, grade, title, get_openai_model(), prompt_version)
+    if cache.get(key, count=False) is None:
+        return False
+    cache.put(key, structure)
+    return True
+
+
+# =========================
+# AI – streamování (průběžné sekce)
+# =========================
+# Sekce se posílají do UI a rendererů hned, jak dorazí, takže streamovaný výsledek neprochází
+# kontrolou zjednodušení (ensure_simpler). Má proto vlastní klíč cache i rozsah NearDuplicateIndex –
+# nepřevezme ho běžné generování (UI, batch.py, fronta úloh) a stream zase nepřevezme jeho výsledky.
+STREAM_PROMPT_VERSION = "stream-3"
+
+
+class JsonSectionParser:
+    """
+    Inkrementální parser odpovědi ve tvaru jednoho JSON objektu.
+    feed() dostává kousky textu ze streamu a vrací položky nejvyšší úrovně,
+    které jsou už kompletní – [(klíč, hodnota), ...]. Text mimo objekt (např. ```json) ignoruje.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        self._text += chunk
+        done: List[Tuple[str, object]] = []
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1 and c == "{":
+                    self._item_start = i + 1
+            elif c in "}]":
+                if self._depth == 1:
+                    done.extend(self._emit(i))
+                    self._item_start = None
+                self._depth = max(self._depth - 1, 0)
+            elif c == "," and self._depth == 1:
+                done.extend(self._emit(i))
+                self._item_start = i + 1
+            i += 1
+        self._pos = i
+        return done
+
+    def _emit(self, end: int) -> List[Tuple[str, object]]:
+        if self._item_start is None:
+            return []
+        item = self._text[self._item_start:end].strip()
+        if not item:
+            return []
+        try:
+            return list(json.loads("{" + item + "}").items())
+        except ValueError:
+            return []
+
+
+def call_openai_chat_stream(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    max_tokens: int = 2200,
+    client: Optional[OpenAIClient] = None,
+) -> Iterator[str]:
+    """Stejné jako call_openai_chat, ale se stream=True – vrací kousky textu z SSE odpovědi."""
+    api_key = get_openai_key()
+    if not api_key:
+        raise RuntimeError("Chybí OPENAI_API_KEY (Streamlit Cloud → Settings → Secrets).")
+
+    payload = {
+        "model": get_openai_model(),
+        "temperature": float(temperature),
+        "max_tokens": int(max_tokens),
+        "stream": True,
+        # poslední událost streamu pak nese usage (tokeny) – pro metriky
+        "stream_options": {"include_usage": True},
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+    }
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    client = client or get_openai_client()
+    metrics = current_metrics()
+    with span("call_openai_chat_stream", metrics):
+        try:
+            r = client.post(OPENAI_CHAT_URL, headers, payload, timeout=90, stream=True)
+        except Exception:
+            metrics.inc("edread_llm_requests_total", result="error")
+            raise
+        metrics.inc("edread_llm_requests_total", result="ok")
+        with r:
+            for raw in r.iter_lines():
+                line = raw.decode("utf-8").strip() if raw else ""
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                record_usage(event.get("usage"), metrics)
+                for choice in event.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+
+
+def ai_generate_structure_stream(
+    full_text: str, grade: int, title: str, use_cache: bool = True
+) -> Iterator[Tuple[str, object]]:
+    """
+    Streamovaná varianta ai_generate_structure.
+    Vrací události (klíč, očištěná hodnota) pro každou sekci hned, jak je v odpovědi celá,
+    a nakonec ("structure", GeneratedStructure).
+    """
+    if not get_openai_key():
+        structure = fallback_structure(full_text)
+        for key in STRUCTURE_FIELDS:
+            yield key, getattr(structure, key)
+        yield "structure", structure
+        return
+
+    if stream_ai_mode(full_text) == "long":
+        # dlouhý text se streamovat nedá (jde po částech) – sekce pošleme najednou
+        structure = ai_generate_structure(full_text, grade, title, use_cache=use_cache, mode="long")
+        for key in STRUCTURE_FIELDS:
+            yield key, getattr(structure, key)
+        yield "structure", structure
+        return
+
+    cache = get_structure_cache() if use_cache else None
+    cache_key = structure_cache_key(full_text, grade, title, get_openai_model(), STREAM_PROMPT_VERSION)
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is None:
+        # stejný vstup generuje jiná session: bez streamu se počká na její výsledek (sekce pak přijdou najednou)
+        def lookup() -> Optional[GeneratedStructure]:
+            return cache.get(cache_key, count=False)
+
+        with single_flight(cache_key, lookup) if cache is not None else nullcontext() as cached:
+            if cached is None:
+                yield from _stream_structure(full_text, grade, title, cache, cache_key)
+                return
+    for key in STRUCTURE_FIELDS:
+        yield key, getattr(cached, key)
+    yield "structure", cached
+
+
+def _stream_structure(
+    full_text: str, grade: int, title: str, cache: Optional[StructureCache], cache_key: str
+) -> Iterator[Tuple[str, object]]:
+    scope = near_dup_scope(grade, title, get_openai_model(), STREAM_PROMPT_VERSION)
+    signature = None
+    if cache is not None:
+        signature = near_dup_signature(full_text)
+        near = near_duplicate_structure(cache, cache_key, scope, signature, full_text, grade, title)
+        if near is not None:
+            for key in STRUCTURE_FIELDS:
+                yield key, getattr(near, key)
+            yield "structure", near
+            return
+
+    # sekce se posílají dál hned, jak dorazí – kontrolu zjednodušení (ensure_simpler) tu nepouštíme
+    analysis = analyze_text(full_text)
+    plan = plan_glossary(analysis)
+    sections: Dict[str, object] = {}
+    if not plan.ask_ai:
+        sections["glossary"] = plan.known
+        yield "glossary", plan.known
+
+    def finish(key: str, value):
+        # slovníček od AI se uloží do GlossaryStore a doplní o hesla, která už úložiště znalo
+        if key == "glossary":
+            get_glossary_store().learn(value)
+            value = plan.merge(value) or seed_glossary(analysis)
+        sections[key] = value
+        return value
+
+    system, user = structure_prompts(full_text, grade, title, plan.ask, with_glossary=plan.ask_ai)
+    parser = JsonSectionParser()
+    for chunk in call_openai_chat_stream(system, user, temperature=0.2, max_tokens=2600):
+        for key, raw in parser.feed(chunk):
+            if key in STRUCTURE_FIELDS and key not in sections and not invalid_fields({key: raw}, [key]):
+                yield key, finish(key, clean_section(key, raw, full_text))
+
+    # pole, která v odpovědi chyběla (useknutý konec, neplatná hodnota), se dogenerují zvlášť
+    missing = [key for key in STRUCTURE_FIELDS if key not in sections]
+    failed: List[str] = []
+    if missing:
+        extra, failed = ai_regenerate_fields(missing, full_text, grade, title, hard_words=plan.ask)
+        for key in missing:
+            yield key, finish(key, clean_section(key, extra.get(key), full_text))
+
+    structure = structure_from_data(sections, full_text)
+    if cache is not None and not failed:
+        cache_structure(cache, cache_key, structure, scope, signature)
+    yield "structure", structure
+
+
+# =========================
+# Pracovní list – model nezávislý na formátu
+# =========================
+# Obsah dokumentů se z GeneratedStructure sestaví jednou jako seznam bloků (nadpis, odstavec,
+# obrázek, tabulka, mezera). DOCX, ODT, PDF i HTML jsou jen renderery nad stejnými bloky
+# (OUTPUT_FORMATS) – rozvržení listu je na jednom místě a další formát nic znovu negeneruje.
+@dataclass(frozen=True)
+class TextRun:
+    text: str
+    bold: bool = False
+    size_pt: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Para:
+    runs: Tuple[TextRun, ...] = ()
+    center: bool = False
+
+    @property
+    def text(self) -> str:
+        return "".join(run.text for run in self.runs)
+
+
+@dataclass(frozen=True)
+class Heading:
+    text: str
+    level: int = 2  # 1 = název listu (16 pt), 2 = oddíl (13 pt)
+
+
+@dataclass(frozen=True)
+class Spacer:
+    cm: float = 0.2
+
+
+@dataclass(frozen=True)
+class Picture:
+    data: bytes  # PNG
+    width_cm: float = 16.0
+    center: bool = True
+
+
+@dataclass(frozen=True)
+class GridTable:
+    rows: Tuple[Tuple[Tuple[Para, ...], ...], ...]  # řádek → buňka → odstavce
+    col_widths_cm: Optional[Tuple[float, ...]] = None
+    row_height_cm: Optional[float] = None  # pevná výška řádku (okénka na kartičky)
+
+
+@dataclass(frozen=True)
+class Slot:
+    """Dynamická část listu; DOCX ji doplní do předem vyrenderované kostry (šablony)."""
+
+    name: str
+    blocks: Tuple["Block", ...] = ()
+
+
+Block = Union[Heading, Para, Spacer, Picture, GridTable, Slot]
+
+
+def para(text: str = "", bold: bool = False, size_pt: Optional[float] = None, center: bool = False) -> Para:
+    """Odstavec s jedním úsekem textu; prázdný text = odstavec bez úseku (jako add_paragraph(""))."""
+    return Para((TextRun(text, bold, size_pt),) if text else (), center)
+
+
+def _digest_value(value):
+    if is_dataclass(value):
+        return [type(value).__name__] + [_digest_value(getattr(value, f.name)) for f in fields(value)]
+    if isinstance(value, (list, tuple)):
+        return [_digest_value(v) for v in value]
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return value
+
+
+@dataclass(frozen=True)
+class Worksheet:
+    kind: str  # "student" | "method"
+    title: str
+    blocks: Tuple[Block, ...]
+
+    def flat_blocks(self) -> Iterator[Block]:
+        """Bloky se sloty rozbalenými na místě – pro formáty bez šablony."""
+        for block in self.blocks:
+            if isinstance(block, Slot):
+                yield from block.blocks
+            else:
+                yield block
+
+    def skeleton(self) -> "Worksheet":
+        """Stejný list s prázdnými sloty a bez názvu – statická kostra pro šablonu DOCX."""
+        blocks = tuple(Slot(b.name) if isinstance(b, Slot) else b for b in self.blocks)
+        return replace(self, title="", blocks=blocks)
+
+    def digest(self) -> str:
+        """Otisk obsahu (sha256) – klíč cache hotových souborů i šablon."""
+        payload = json.dumps(_digest_value(self), ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def glossary_blocks(glossary: Dict[str, str]) -> List[Block]:
+    blocks: List[Block] = [Heading("Slovníček pojmů (na závěr)")]
+    if not glossary:
+        return blocks + [para("Slovníček není k dispozici.")]
+
+    blocks.append(para("Nejdřív si slovíčka projděte společně s učitelem/kou. Pak se vraťte k textu."))
+    for w, expl in glossary.items():
+        blocks.append(
+            Para((TextRun(f"• {w} — ", bold=True), TextRun(expl), TextRun("  | Poznámka: ________________________________")))
+        )
+    return blocks
+
+
+def pack_table_blocks(info: Pack, images: Dict[str, TableImage]) -> List[Block]:
+    """
+    Tabulka/tabulky packu jako obrázek do části „Text pro čtení“.
+    Tabulky jsou nutné i pro zjednodušenou a LMP verzi.
+    """
+    blocks: List[Block] = []
+    for table in info.tables:
+        img = images.get(table.key)
+        if img:
+            blocks += [para(table.caption), Picture(img.data)]
+        else:
+            blocks.append(para(table.missing))
+    return blocks
+
+
+def question_blocks(items: List[str], answer_lines: int) -> Tuple[Block, ...]:
+    blank = "\n  ______________________________________________" * (answer_lines - 1)
+    return tuple(para(f"• {q}\n  Odpověď: ______________________________________________{blank}") for q in items)
+
+
+def student_worksheet(
+    title: str,
+    grade: int,
+    variant_label: str,
+    text_variant: str,
+    drama_intro: str,
+    drama_scene: List[Tuple[str, str]],
+    glossary: Dict[str, str],
+    questions_A: List[str],
+    questions_B: List[str],
+    questions_C: List[str],
+    pack: str,
+    pack_info: Optional[Pack] = None,
+    table_images: Optional[Dict[str, TableImage]] = None,
+) -> Worksheet:
+    """pack_info, table_images: předem načtené zdroje (jinak z registru packů a get_table_images())."""
+    info = pack_info or get_pack_registry().get(pack)
+
+    blocks: List[Block] = [
+        Slot("header", (Heading(f"NÁZEV ÚLOHY: {title} — {variant_label}", 1), para(f"Ročník: {grade}. třída"))),
+        para("JMÉNO: ________________________________    DATUM: _______________"),
+        Spacer(0.2),
+        # 1) dramatizace
+        Heading("1) Úvod a krátká dramatizace (začátek hodiny)"),
+        para("Nejdřív si zahrajeme krátkou scénku. Pomůže ti rychle pochopit, o čem text bude."),
+        Slot("drama", (para(drama_intro),) + tuple(para(f"{role}: {line}") for role, line in drama_scene)),
+        Spacer(0.2),
+        # 2) text + tabulky uvnitř textu
+        Heading("2) Text pro čtení"),
+        Slot("text", (para(text_variant),)),
+        Spacer(0.15),
+    ]
+    # tabulky nutné pro odpovědi – ve všech verzích
+    if info is not None and info.tables:
+        blocks += pack_table_blocks(info, table_images if table_images is not None else get_table_images())
+        blocks.append(Spacer(0.2))
+
+    # 2b) pomůcky packu (např. Karetní hra – pyramida + kartičky)
+    for builder in info.builders if info is not None else []:
+        blocks += PACK_BUILDERS[builder]()
+        blocks.append(Spacer(0.2))
+
+    # 3) otázky, slovníček až na konci
+    blocks += [
+        Heading("3) Otázky k textu"),
+        para("A) Najdi v textu (vyhledávání informací):"),
+        Slot("questions_A", question_blocks(questions_A, 1)),
+        Spacer(0.15),
+        para("B) Přemýšlej a vysvětli (porozumění / interpretace):"),
+        Slot("questions_B", question_blocks(questions_B, 2)),
+        Spacer(0.15),
+        para("C) Můj názor (kritické čtení / argumentace):"),
+        Slot("questions_C", question_blocks(questions_C, 2)),
+        Spacer(0.25),
+        Slot("glossary", tuple(glossary_blocks(glossary))),
+    ]
+    return Worksheet("student", f"{title} — {variant_label}", tuple(blocks))
+
+
+def method_worksheet(
+    title: str,
+    grade: int,
+    full_text: str,
+    structure: GeneratedStructure,
+    pack: str,
+    pack_info: Optional[Pack] = None,
+) -> Worksheet:
+    info = pack_info or get_pack_registry().get(pack)
+    blocks: List[Block] = [
+        Heading(f"Metodický list pro učitele — {title}", 1),
+        para(f"Ročník: {grade}. třída"),
+        Heading("Cíl hodiny"),
+        para(
+            "Rozvoj čtenářské gramotnosti v souladu s RVP ZV: vyhledávání informací, porozumění textu, interpretace, "
+            "kritické čtení a formulace vlastního názoru."
+        ),
+        Heading("Doporučený postup (45 min)"),
+        para("1) Úvod + dramatizace (5–7 min) – krátká scénka z pracovního listu, motivace."),
+        para(
+            "2) Slovníček (5–8 min) – i když je na konci listu, pracujte s ním hned po dramatizaci. "
+            "Vyberte slova, která mohou brzdit porozumění; žáci si doplní poznámky."
+        ),
+        para("3) Čtení textu (10–12 min) – tiché čtení / čtení po odstavcích."),
+        para(
+            "4) Otázky A/B/C (15–18 min) – A: dohledání informace, B: vysvětlení vlastními slovy, "
+            "C: názor + zdůvodnění."
+        ),
+        para("5) Reflexe (2–3 min) – co pomohlo porozumět (dramatizace, tabulka, slovníček)."),
+        Heading("Tabulky / opory v textu"),
+    ]
+    if info is not None and info.tables:
+        blocks.append(para("Tabulka z původního textu je vložená přímo v části „Text pro čtení“ ve všech verzích."))
+    for note in info.method_notes if info is not None else []:
+        blocks.append(para(note))
+
+    blocks += [
+        Heading("Poznámka k verzím"),
+        para("Plná verze: původní text (vstup učitele)."),
+        para("Zjednodušená verze: kratší věty, jednodušší slovní zásoba, zachování klíčových informací."),
+        para("LMP/SPU verze: velmi krátké věty, maximální srozumitelnost, odstranění složitých souvětí."),
+        para(
+            "Rozdíly mezi verzemi jsou pouze v textu (plný / zjednodušený / LMP). "
+            "Tabulky zůstávají ve všech verzích stejné, aby šly vypracovat otázky."
+        ),
+        Heading("Vstupní text (plná verze)"),
+        para(full_text),
+        Heading("Zjednodušená verze (náhled)"),
+        para(structure.simpl),
+        Heading("LMP/SPU verze (náhled)"),
+        para(structure.lmp),
+    ]
+    return Worksheet("method", f"Metodický list — {title}", tuple(blocks))
+
+
+# =========================
+# Výstupní formáty – DOCX (šablona + sloty)
+# =========================
+# Statické části listu (styly, nadpisy, pokyny, tabulky, pyramida, kartičky) se vyrenderují jednou
+# pro každou kostru (Worksheet.skeleton, klíčem je otisk) a uloží jako bytes. Každý dokument je pak
+# jen načtená kopie šablony, do které se na místa „slotů“ doplní dynamický obsah.
+SLOT_MARKER = "{{edread:%s}}"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class SlotWriter:
+    """
+    Vkládá odstavce před zástupný odstavec šablony.
+    Má stejné add_paragraph jako Document, takže funguje s add_h2, add_spacer apod.
+    """
+
+    def __init__(self, anchor):
+        self._anchor = anchor
+
+    def add_paragraph(self, text: str = "", style=None):
+        return self._anchor.insert_paragraph_before(text, style)
+
+
+def add_slot(doc: Document, name: str) -> None:
+    doc.add_paragraph(SLOT_MARKER % name)
+
+
+def fill_slots(doc: Document, writers: Dict[str, Callable[[SlotWriter], None]]) -> None:
+    anchors = {p.text: p for p in doc.paragraphs if p.text.startswith("{{edread:")}
+    for name, write in writers.items():
+        anchor = anchors[SLOT_MARKER % name]
+        write(SlotWriter(anchor))
+        anchor._element.getparent().remove(anchor._element)
+
+
+def docx_paragraph(p, block: Para) -> None:
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    if block.center:
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    for run in block.runs:
+        r = p.add_run(run.text)
+        if run.bold:
+            r.bold = True
+        if run.size_pt:
+            r.font.size = Pt(run.size_pt)
+
+
+def docx_table(doc: Document, block: GridTable) -> None:
+    from docx.enum.table import WD_ROW_HEIGHT_RULE, WD_TABLE_ALIGNMENT
+    from docx.shared import Cm
+
+    table = doc.add_table(rows=0, cols=max(len(row) for row in block.rows))
+    table.alignment = WD_TABLE_ALIGNMENT.CENTER
+    for cells in block.rows:
+        row = table.add_row()
+        if block.row_height_cm:
+            row.height = Cm(block.row_height_cm)
+            row.height_rule = WD_ROW_HEIGHT_RULE.EXACTLY
+        for c, (cell, paragraphs) in enumerate(zip(row.cells, cells)):
+            for i, p in enumerate(paragraphs):
+                docx_paragraph(cell.paragraphs[0] if i == 0 else cell.add_paragraph(), p)
+            # šířky sloupců (python-docx neumí 100% fixně, ale Word to drží dobře)
+            if block.col_widths_cm:
+                cell.width = Cm(block.col_widths_cm[c])
+
+
+def docx_add_blocks(container, blocks: Iterable[Block]) -> None:
+    """container: Document nebo SlotWriter (ve slotu jsou jen odstavce, nadpisy a mezery)."""
+    for block in blocks:
+        if isinstance(block, Heading):
+            (add_h1 if block.level == 1 else add_h2)(container, block.text)
+        elif isinstance(block, Para):
+            docx_paragraph(container.add_paragraph(), block)
+        elif isinstance(block, Spacer):
+            add_spacer(container, block.cm)
+        elif isinstance(block, Picture):
+            add_image_bytes(container, block.data, width_cm=block.width_cm, center=block.center)
+        elif isinstance(block, GridTable):
+            docx_table(container, block)
+        elif isinstance(block, Slot):
+            add_slot(container, block.name)
+
+
+def docx_document(worksheet: Worksheet, template: Optional[bytes] = None) -> Document:
+    """template: kostra z get_docx_template() – do workerů poolu se posílá hotová; bez ní se list staví celý."""
+    from docx import Document
+
+    if template is None:
+        doc = Document()
+        set_doc_defaults(doc)
+        docx_add_blocks(doc, worksheet.flat_blocks())
+        return doc
+
+    doc = Document(io.BytesIO(template))
+    fill_slots(
+        doc,
+        {
+            block.name: (lambda w, blocks=block.blocks: docx_add_blocks(w, blocks))
+            for block in worksheet.blocks
+            if isinstance(block, Slot)
+        },
+    )
+    return doc
+
+
+@st.cache_resource
+def _docx_template(digest: str, _skeleton: Worksheet) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    set_doc_defaults(doc)
+    docx_add_blocks(doc, _skeleton.blocks)
+    return doc_to_bytes(doc)
+
+
+def get_docx_template(worksheet: Worksheet) -> Optional[bytes]:
+    """Šablona pro listy se sloty (pracovní list); metodika se staví rovnou, vrací None."""
+    if not any(isinstance(block, Slot) for block in worksheet.blocks):
+        return None
+    skeleton = worksheet.skeleton()
+    return _docx_template(skeleton.digest(), skeleton)
+
+
+def render_docx(worksheet: Worksheet, template: Optional[bytes] = None) -> bytes:
+    return doc_to_bytes(docx_document(worksheet, template))
+
+
+def build_student_doc(
+    title: str,
+    grade: int,
+    variant_label: str,
+    text_variant: str,
+    drama_intro: str,
+    drama_scene: List[Tuple[str, str]],
+    glossary: Dict[str, str],
+    questions_A: List[str],
+    questions_B: List[str],
+    questions_C: List[str],
+    pack: str,
+) -> Document:
+    """Pracovní list jako python-docx Document (student_worksheet → šablona DOCX)."""
+    worksheet = student_worksheet(
+        title, grade, variant_label, text_variant, drama_intro, drama_scene, glossary,
+        questions_A, questions_B, questions_C, pack,
+    )
+    return docx_document(worksheet, get_docx_template(worksheet))
+
+
+def build_method_doc(
+    title: str, grade: int, full_text: str, structure: GeneratedStructure, pack: str
+) -> Document:
+    return docx_document(method_worksheet(title, grade, full_text, structure, pack))
+
+
+# =========================
+# Výstupní formáty – ODT, HTML, PDF
+# =========================
+# ODT (OpenDocument) a HTML se skládají přímo jako XML/HTML – bez další knihovny.
+# PDF potřebuje reportlab a TrueType písmo s českou diakritikou (základní PDF písma ji nemají).
+XML_INVALID_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+ODF_NAMESPACES = (
+    'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink" '
+    'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0" '
+    'office:version="1.2"'
+)
+ODF_FONTS = '<office:font-face-decls><style:font-face style:name="Calibri" svg:font-family="Calibri"/></office:font-face-decls>'
+ODF_STYLES = f"""<?xml version="1.0" encoding="UTF-8"?>
+<office:document-styles {ODF_NAMESPACES}>{ODF_FONTS}
+<office:styles>
+<style:default-style style:family="paragraph"><style:paragraph-properties fo:margin-bottom="0.12cm"/>\
+<style:text-properties style:font-name="Calibri" fo:font-size="11pt" fo:language="cs" fo:country="CZ"/></style:default-style>
+</office:styles>
+<office:automatic-styles><style:page-layout style:name="pm1"><style:page-layout-properties fo:page-width="21cm" \
+fo:page-height="29.7cm" fo:margin-top="2cm" fo:margin-bottom="2cm" fo:margin-left="2cm" fo:margin-right="2cm"/>\
+</style:page-layout></office:automatic-styles>
+<office:master-styles><style:master-page style:name="Standard" style:page-layout-name="pm1"/></office:master-styles>
+</office:document-styles>"""
+
+
+def png_size(data: bytes) -> Tuple[int, int]:
+    """Rozměry PNG (šířka, výška) v pixelech z hlavičky IHDR."""
+    return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+
+
+def picture_height_cm(block: Picture) -> float:
+    width, height = png_size(block.data)
+    return block.width_cm * height / max(width, 1)
+
+
+class OdtWriter:
+    """Skládá content.xml; automatické styly vznikají podle potřeby (stejné vlastnosti = jeden styl)."""
+
+    def __init__(self):
+        self.styles: Dict[Tuple[str, str], str] = {}
+        self.pictures: List[bytes] = []
+        self.tables = 0
+        self.body: List[str] = []
+
+    def style(self, family: str, props: str) -> str:
+        key = (family, props)
+        if key not in self.styles:
+            self.styles[key] = f"{family[:2].upper()}{len(self.styles) + 1}"
+        return self.styles[key]
+
+    @staticmethod
+    def text(value: str) -> str:
+        """Escapování + zalomení řádků; víc mezer za sebou (a mezeru na začátku) ODF jinak slije."""
+        lines = [
+            re.sub(r"^ +| {2,}", lambda m: f'<text:s text:c="{len(m.group())}"/>', xml_escape(line))
+            for line in XML_INVALID_RE.sub("", value).split("\n")
+        ]
+        return "<text:line-break/>".join(lines)
+
+    def paragraph(self, block: Para) -> str:
+        p_style = self.style("paragraph", '<style:paragraph-properties fo:text-align="center"/>' if block.center else "")
+        spans = []
+        for run in block.runs:
+            props = (' fo:font-weight="bold"' if run.bold else "") + (f' fo:font-size="{run.size_pt:g}pt"' if run.size_pt else "")
+            if props:
+                spans.append(f'<text:span text:style-name="{self.style("text", f"<style:text-properties{props}/>")}">{self.text(run.text)}</text:span>')
+            else:
+                spans.append(self.text(run.text))
+        return f'<text:p text:style-name="{p_style}">{"".join(spans)}</text:p>'
+
+    def add(self, block: Block) -> None:
+        if isinstance(block, Heading):
+            size = "16pt" if block.level == 1 else "13pt"
+            style = self.style("paragraph", f'<style:text-properties fo:font-weight="bold" fo:font-size="{size}"/>')
+            self.body.append(
+                f'<text:h text:style-name="{style}" text:outline-level="{block.level}">{self.text(block.text)}</text:h>'
+            )
+        elif isinstance(block, Para):
+            self.body.append(self.paragraph(block))
+        elif isinstance(block, Spacer):
+            style = self.style("paragraph", f'<style:paragraph-properties fo:margin-bottom="{block.cm:g}cm"/>')
+            self.body.append(f'<text:p text:style-name="{style}"/>')
+        elif isinstance(block, Picture):
+            self.pictures.append(block.data)
+            n = len(self.pictures)
+            align = '<style:paragraph-properties fo:text-align="center"/>' if block.center else ""
+            self.body.append(
+                f'<text:p text:style-name="{self.style("paragraph", align)}">'
+                f'<draw:frame draw:name="obrazek{n}" text:anchor-type="as-char" '
+                f'svg:width="{block.width_cm:g}cm" svg:height="{picture_height_cm(block):.2f}cm">'
+                f'<draw:image xlink:href="Pictures/obrazek{n}.png" xlink:type="simple" xlink:show="embed" '
+                f'xlink:actuate="onLoad"/></draw:frame></text:p>'
+            )
+        elif isinstance(block, GridTable):
+            self.add_table(block)
+
+    def add_table(self, block: GridTable) -> None:
+        self.tables += 1
+        cols = max(len(row) for row in block.rows)
+        widths = block.col_widths_cm or (16.0 / cols,) * cols
+        table_style = self.style(
+            "table", f'<style:table-properties style:width="{sum(widths):g}cm" table:align="center"/>'
+        )
+        cell_style = self.style(
+            "table-cell",
+            '<style:table-cell-properties fo:border="0.5pt solid #000000" fo:padding="0.1cm" style:vertical-align="middle"/>',
+        )
+        out = [f'<table:table table:name="Tabulka{self.tables}" table:style-name="{table_style}">']
+        for width in widths:
+            col_style = self.style("table-column", f'<style:table-column-properties style:column-width="{width:g}cm"/>')
+            out.append(f'<table:table-column table:style-name="{col_style}"/>')
+        row_attr = ""
+        if block.row_height_cm:
+            row_style = self.style(
+                "table-row", f'<style:table-row-properties style:row-height="{block.row_height_cm:g}cm"/>'
+            )
+            row_attr = f' table:style-name="{row_style}"'
+        for cells in block.rows:
+            out.append(f"<table:table-row{row_attr}>")
+            for paragraphs in cells:
+                inner = "".join(self.paragraph(p) for p in paragraphs) or "<text:p/>"
+                out.append(f'<table:table-cell table:style-name="{cell_style}" office:value-type="string">{inner}</table:table-cell>')
+            out.append("</table:table-row>")
+        out.append("</table:table>")
+        self.body.append("".join(out))
+
+    def content_xml(self) -> str:
+        styles = "".join(
+            f'<style:style style:name="{name}" style:family="{family}">{props}</style:style>'
+            for (family, props), name in self.styles.items()
+        )
+        return (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<office:document-content {ODF_NAMESPACES}>{ODF_FONTS}'
+            f"<office:automatic-styles>{styles}</office:automatic-styles>"
+            f'<office:body><office:text>{"".join(self.body)}</office:text></office:body></office:document-content>'
+        )
+
+
+def render_odt(worksheet: Worksheet, _resource=None) -> bytes:
+    writer = OdtWriter()
+    for block in worksheet.flat_blocks():
+        writer.add(block)
+    pictures = [f"Pictures/obrazek{i}.png" for i in range(1, len(writer.pictures) + 1)]
+    manifest = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+        '<manifest:file-entry manifest:full-path="/" manifest:version="1.2" '
+        'manifest:media-type="application/vnd.oasis.opendocument.text"/>'
+        '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+        '<manifest:file-entry manifest:full-path="styles.xml" manifest:media-type="text/xml"/>'
+        + "".join(f'<manifest:file-entry manifest:full-path="{p}" manifest:media-type="image/png"/>' for p in pictures)
+        + "</manifest:manifest>"
+    )
+    bio = io.BytesIO()
+    with zipfile.ZipFile(bio, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # mimetype musí být první a nekomprimovaný
+        zf.writestr(zipfile.ZipInfo("mimetype"), "application/vnd.oasis.opendocument.text", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/manifest.xml", manifest)
+        zf.writestr("styles.xml", ODF_STYLES)
+        zf.writestr("content.xml", writer.content_xml())
+        for path, data in zip(pictures, writer.pictures):
+            zf.writestr(path, data, compress_type=zipfile.ZIP_STORED)  # PNG už je komprimované
+    return bio.getvalue()
+
+
+HTML_STYLE = """
+@page { size: A4; margin: 2cm; }
+body { font-family: Calibri, Carlito, Arial, sans-serif; font-size: 11pt; line-height: 1.3; max-width: 17cm; margin: 1cm auto; }
+p { margin: 0 0 0.12cm; white-space: pre-wrap; }
+h1 { font-size: 16pt; margin: 0 0 0.15cm; }
+h2 { font-size: 13pt; margin: 0.2cm 0 0.12cm; }
+.center { text-align: center; }
+img { max-width: 100%; }
+table { border-collapse: collapse; margin: 0.2cm auto; }
+td { border: 0.5pt solid #000; padding: 0.1cm; vertical-align: middle; }
+table, tr, img, h2 { break-inside: avoid; }
+h2 { break-after: avoid; }
+@media print { body { margin: 0; max-width: none; } }
+"""
+
+
+def html_paragraph(block: Para, tag: str = "p") -> str:
+    parts = []
+    for run in block.runs:
+        text = html.escape(XML_INVALID_RE.sub("", run.text), quote=False)
+        if run.size_pt:
+            text = f'<span style="font-size:{run.size_pt:g}pt">{text}</span>'
+        parts.append(f"<b>{text}</b>" if run.bold else text)
+    css = ' class="center"' if block.center else ""
+    return f"<{tag}{css}>{''.join(parts) or '<br>'}</{tag}>"
+
+
+def render_html(worksheet: Worksheet, _resource=None) -> bytes:
+    """Samostatný HTML soubor pro tisk z prohlížeče (obrázky jsou vložené jako data URI)."""
+    out = [
+        '<!DOCTYPE html>\n<html lang="cs"><head><meta charset="utf-8">',
+        f"<title>{html.escape(worksheet.title)}</title><style>{HTML_STYLE}</style></head><body>",
+    ]
+    for block in worksheet.flat_blocks():
+        if isinstance(block, Heading):
+            out.append(f"<h{block.level}>{html.escape(block.text, quote=False)}</h{block.level}>")
+        elif isinstance(block, Para):
+            out.append(html_paragraph(block))
+        elif isinstance(block, Spacer):
+            out.append(f'<div style="height:{block.cm:g}cm"></div>')
+        elif isinstance(block, Picture):
+            src = "data:image/png;base64," + base64.b64encode(block.data).decode("ascii")
+            css = ' class="center"' if block.center else ""
+            out.append(f'<p{css}><img src="{src}" style="width:{block.width_cm:g}cm" alt=""></p>')
+        elif isinstance(block, GridTable):
+            out.append("<table>")
+            if block.col_widths_cm:
+                out.append("".join(f'<col style="width:{w:g}cm">' for w in block.col_widths_cm))
+            row_css = f' style="height:{block.row_height_cm:g}cm"' if block.row_height_cm else ""
+            for cells in block.rows:
+                tds = "".join(f"<td>{''.join(html_paragraph(p) for p in paragraphs)}</td>" for paragraphs in cells)
+                out.append(f"<tr{row_css}>{tds}</tr>")
+            out.append("</table>")
+    out.append("</body></html>\n")
+    return "".join(out).encode("utf-8")
+
+
+# (normální, tučné) – první nalezená dvojice; EDREAD_PDF_FONT / EDREAD_PDF_FONT_BOLD mají přednost
+PDF_FONT_CANDIDATES: List[Tuple[str, str]] = [
+    ("assets/fonts/DejaVuSans.ttf", "assets/fonts/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+    ("/Library/Fonts/Arial.ttf", "/Library/Fonts/Arial Bold.ttf"),
+]
+
+
+@st.cache_resource
+def get_pdf_fonts() -> Tuple[str, str]:
+    """Cesty k písmům pro PDF; ve workerech se písmo registruje podle nich (reportlab má registr na proces)."""
+    regular = get_config("EDREAD_PDF_FONT")
+    if regular:
+        return regular, get_config("EDREAD_PDF_FONT_BOLD") or regular
+    for regular, bold in PDF_FONT_CANDIDATES:
+        found = find_existing_asset([regular])
+        if found:
+            return found, find_existing_asset([bold]) or found
+    raise RuntimeError("PDF: nenalezeno písmo s českou diakritikou (nastav EDREAD_PDF_FONT, např. DejaVuSans.ttf).")
+
+
+def prepare_pdf(_worksheet: Worksheet) -> Tuple[str, str]:
+    try:
+        import reportlab  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("PDF: chybí balíček reportlab (pip install reportlab).") from e
+    return get_pdf_fonts()
+
+
+def pdf_markup(block: Para, face) -> str:
+    """Text pro Paragraph z reportlab (mini-HTML); znaky, které písmo nemá (emoji), se vynechají."""
+    parts = []
+    for run in block.runs:
+        text = "".join(ch for ch in run.text if ch == "\n" or ord(ch) in face.charToGlyph)
+        text = html.escape(text, quote=False).replace("\n", "<br/>")
+        text = re.sub(r"^ +| {2,}", lambda m: "&nbsp;" * len(m.group()), text, flags=re.M)
+        text = re.sub(r"(?<=<br/>) +", lambda m: "&nbsp;" * len(m.group()), text)
+        if run.size_pt:
+            text = f'<font size="{run.size_pt:g}">{text}</font>'
+        parts.append(f"<b>{text}</b>" if run.bold else text)
+    return "".join(parts)
+
+
+def render_pdf(worksheet: Worksheet, fonts: Optional[Tuple[str, str]] = None) -> bytes:
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Image as RlImage
+    from reportlab.platypus import Paragraph as RlParagraph
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.platypus import Spacer as RlSpacer
+    from reportlab.platypus import Table as RlTable
+    from reportlab.platypus import TableStyle
+
+    regular, bold = fonts or get_pdf_fonts()
+    if "EdRead" not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont("EdRead", regular))
+        pdfmetrics.registerFont(TTFont("EdRead-Bold", bold))
+        pdfmetrics.registerFontFamily("EdRead", normal="EdRead", bold="EdRead-Bold")
+    face = pdfmetrics.getFont("EdRead").face
+    base = ParagraphStyle("edread", fontName="EdRead", fontSize=11, leading=14, spaceAfter=3)
+    centered = ParagraphStyle("edread-center", parent=base, alignment=TA_CENTER)
+    headings = {
+        1: ParagraphStyle("edread-h1", parent=base, fontName="EdRead-Bold", fontSize=16, leading=20),
+        2: ParagraphStyle("edread-h2", parent=base, fontName="EdRead-Bold", fontSize=13, leading=17, spaceBefore=4),
+    }
+
+    def paragraph(block: Para):
+        style = centered if block.center else base
+        size = max((run.size_pt or 11 for run in block.runs), default=11)
+        if size > 11:
+            style = ParagraphStyle(f"{style.name}-{size:g}", parent=style, leading=size * 1.25)
+        return RlParagraph(pdf_markup(block, face) or "&nbsp;", style)
+
+    story = []
+    for block in worksheet.flat_blocks():
+        if isinstance(block, Heading):
+            story.append(RlParagraph(pdf_markup(para(block.text), face), headings[block.level]))
+        elif isinstance(block, Para):
+            story.append(paragraph(block))
+        elif isinstance(block, Spacer):
+            story.append(RlSpacer(1, block.cm * cm))
+        elif isinstance(block, Picture):
+            img = RlImage(io.BytesIO(block.data), width=block.width_cm * cm, height=picture_height_cm(block) * cm)
+            img.hAlign = "CENTER" if block.center else "LEFT"
+            story.append(img)
+        elif isinstance(block, GridTable):
+            cols = max(len(row) for row in block.rows)
+            widths = [w * cm for w in block.col_widths_cm or (16.0 / cols,) * cols]
+            data = [[[paragraph(p) for p in paragraphs] for paragraphs in cells] for cells in block.rows]
+            heights = [block.row_height_cm * cm] * len(data) if block.row_height_cm else None
+            table = RlTable(data, colWidths=widths, rowHeights=heights, hAlign="CENTER")
+            table.setStyle(
+                TableStyle([("GRID", (0, 0), (-1, -1), 0.5, colors.black), ("VALIGN", (0, 0), (-1, -1), "MIDDLE")])
+            )
+            story.append(table)
+
+    bio = io.BytesIO()
+    doc = SimpleDocTemplate(
+        bio, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+        title=worksheet.title, author="EdRead AI",
+    )
+    doc.build(story)
+    return bio.getvalue()
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    label: str
+    mime: str
+    render: Callable[[Worksheet, object], bytes]  # (list, zdroj z prepare) → bytes; běží i v process poolu
+    prepare: Optional[Callable[[Worksheet], object]] = None  # ve vlákně volajícího (st.cache_resource)
+
+
+OUTPUT_FORMATS: Dict[str, OutputFormat] = {
+    "docx": OutputFormat("Word (DOCX)", DOCX_MIME, render_docx, get_docx_template),
+    "pdf": OutputFormat("PDF", "application/pdf", render_pdf, prepare_pdf),
+    "odt": OutputFormat("OpenDocument (ODT)", "application/vnd.oasis.opendocument.text", render_odt),
+    "html": OutputFormat("HTML pro tisk", "text/html", render_html),
+}
+
+
+def get_output_formats(formats: Optional[List[str]] = None) -> List[str]:
+    """Formáty ke generování: zadané, jinak EDREAD_FORMATS (výchozí jen docx)."""
+    selected = formats or [f.strip().lower() for f in get_config("EDREAD_FORMATS", "docx").split(",") if f.strip()]
+    unknown = [fmt for fmt in selected if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"Neznámý formát: {', '.join(unknown)} (povoleno: {', '.join(OUTPUT_FORMATS)})")
+    return selected
+
+
+def file_key(doc_key: str, fmt: str) -> str:
+    """Klíč souboru ve výsledku: DOCX zůstává pod klíčem dokumentu (pl_full…), ostatní „pl_full.pdf“."""
+    return doc_key if fmt == "docx" else f"{doc_key}.{fmt}"
+
+
+def file_formats(keys: Iterable[str]) -> Set[str]:
+    """Formáty, ve kterých výsledek (klíče viz file_key) už je."""
+    return {key.partition(".")[2] or "docx" for key in keys}
+
+
+# =========================
+# Cache hotových souborů (podle otisku obsahu)
+# =========================
+# Zvyš při změně rendererů – staré soubory v cache se tím zneplatní.
+RENDER_VERSION = "1"
+
+
+def render_cache_key(worksheet: Worksheet, fmt: str) -> str:
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{worksheet.digest()}".encode("utf-8")).hexdigest()
+
+
+class RenderCache(CacheStats):
+    """Hotové soubory (bytes) podle otisku listu a formátu; stáří a limit velikosti hlídá úložiště."""
+
+    name = "render"
+
+    def __init__(self, backend: CacheBackend):
+        super().__init__()
+        self.backend = backend
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.backend.get(key)
+        self._count(data is not None)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.backend.set(key, data)
+
+
+@st.cache_resource
+def get_render_cache() -> RenderCache:
+    return RenderCache(get_cache_backend("render"))
+
+
+# =========================
+# Generování všech dokumentů
+# =========================
+RENDER_EXECUTORS = ("serial", "thread", "process")
+STUDENT_VARIANTS: List[Tuple[str, str]] = [
+    ("pl_full", "PLNÝ"),
+    ("pl_simpl", "ZJEDNODUŠENÝ"),
+    ("pl_lmp", "LMP/SPU"),
+]
+DOCUMENT_KEYS: Tuple[str, ...] = tuple(key for key, _ in STUDENT_VARIANTS) + ("method",)
+
+
+def build_worksheet(
+    doc_key: str, title: str, grade: int, full_text: str, structure: GeneratedStructure, pack: str
+) -> Worksheet:
+    """Jeden dokument (pl_full / pl_simpl / pl_lmp / method) jako Worksheet; běží ve vlákně volajícího."""
+    info = get_pack_registry().get(pack)
+    if doc_key == "method":
+        return method_worksheet(title, grade, full_text, structure, pack, pack_info=info)
+    texts = {"pl_full": full_text, "pl_simpl": structure.simpl, "pl_lmp": structure.lmp}
+    return student_worksheet(
+        title,
+        grade,
+        dict(STUDENT_VARIANTS)[doc_key],
+        texts[doc_key],
+        structure.drama_intro,
+        structure.drama_scene,
+        structure.glossary,
+        structure.questions_A,
+        structure.questions_B,
+        structure.questions_C,
+        pack,
+        pack_info=info,
+        table_images=get_table_images(),
+    )
+
+
+def build_worksheets(
+    title: str, grade: int, full_text: str, structure: GeneratedStructure, pack: str
+) -> Dict[str, Worksheet]:
+    return {key: build_worksheet(key, title, grade, full_text, structure, pack) for key in DOCUMENT_KEYS}
+
+
+def render_job(fmt: str, worksheet: Worksheet, resource=None, metrics: Optional[Metrics] = None) -> bytes:
+    """
+    Vyrenderuje jeden list do jednoho formátu. Funkce je na úrovni modulu,
+    aby ji šlo poslat i do ProcessPoolExecutor (pickle).
+    resource: výsledek OutputFormat.prepare (šablona DOCX, písma PDF) – připravený ve vlákně volajícího.
+    metrics: registr z current_metrics(); do procesů se neposílá (měření tam neběží).
+    """
+    with span(f"render_{fmt}", metrics or DISABLED_METRICS):
+        return OUTPUT_FORMATS[fmt].render(worksheet, resource)
+
+
+@st.cache_resource
+def get_render_executor(mode: str, workers: int):
+    # sdílený pool pro všechny session – vytvoření procesů je drahé
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    if mode == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="edread-render")
+
+
+def get_render_mode(executor: Optional[str] = None) -> str:
+    mode = (executor or get_config("EDREAD_RENDER_EXECUTOR", "serial")).lower()
+    if mode not in RENDER_EXECUTORS:
+        raise ValueError(f"Neznámý režim renderování: {mode} (povoleno: {', '.join(RENDER_EXECUTORS)})")
+    return mode
+
+
+def render_documents(
+    title: str,
+    grade: int,
+    full_text: str,
+    structure: GeneratedStructure,
+    pack: str,
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, bytes]:
+    """
+    Vytvoří všechny 4 dokumenty (3× pracovní list + metodika) v každém formátu jako bytes (klíče viz file_key).
+    executor: "serial" (výchozí), "thread" nebo "process"; bez zadání se bere EDREAD_RENDER_EXECUTOR.
+    formats: např. ["docx", "pdf"]; bez zadání EDREAD_FORMATS.
+    Soubor se stejným obsahem a formátem se vezme z cache a znovu se nerenderuje.
+    """
+    worksheets = build_worksheets(title, grade, full_text, structure, pack)
+    return render_worksheets(worksheets, executor=executor, formats=formats, use_cache=use_cache)
+
+
+def render_worksheets(
+    worksheets: Dict[str, Worksheet],
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, bytes]:
+    """Jako render_documents pro libovolnou sadu listů (klíč listu → Worksheet), všechny v jednom běhu executoru."""
+    cache = get_render_cache() if use_cache else None
+    files: Dict[str, bytes] = {}
+    jobs: Dict[str, Tuple[str, Worksheet, object]] = {}
+    cache_keys: Dict[str, str] = {}
+    order: List[str] = []
+    for fmt in get_output_formats(formats):
+        output = OUTPUT_FORMATS[fmt]
+        for doc_key, worksheet in worksheets.items():
+            key = file_key(doc_key, fmt)
+            order.append(key)
+            if cache is not None:
+                cache_keys[key] = render_cache_key(worksheet, fmt)
+                cached = cache.get(cache_keys[key])
+                if cached is not None:
+                    files[key] = cached
+                    continue
+            jobs[key] = (fmt, worksheet, output.prepare(worksheet) if output.prepare else None)
+
+    mode = get_render_mode(executor)
+    metrics = current_metrics()
+    if mode == "serial" or not jobs:
+        done = {key: render_job(fmt, ws, resource, metrics) for key, (fmt, ws, resource) in jobs.items()}
+    else:
+        workers = int(get_config("EDREAD_RENDER_WORKERS", str(len(DOCUMENT_KEYS))))
+        pool = get_render_executor(mode, workers)
+        if mode == "process":
+            futures = {key: pool.submit(render_job, *job) for key, job in jobs.items()}
+        else:
+            futures = {
+                key: pool.submit(contextvars.copy_context().run, render_job, *job, metrics)
+                for key, job in jobs.items()
+            }
+        done = {key: fut.result() for key, fut in futures.items()}
+
+    for key, data in done.items():
+        if cache is not None:
+            cache.put(cache_keys[key], data)
+        files[key] = data
+    return {key: files[key] for key in order}
+
+
+def generate_all(
+    title: str,
+    grade: int,
+    full_text: str,
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+) -> Tuple[GeneratedStructure, Dict[str, bytes]]:
+    """Jako generate_all_from_text, ale vrací i strukturu – z ní jdou později vyrenderovat další formáty bez AI."""
+    with span("detect_pack"):
+        pack = detect_pack(title, full_text)
+    structure = ai_generate_structure(full_text, grade, title)
+    return structure, render_documents(title, grade, full_text, structure, pack, executor=executor, formats=formats)
+
+
+def grade_key(grade: int, key: str) -> str:
+    """Klíč dokumentu v sadě více ročníků: „4/pl_full“, „4/pl_full.pdf“."""
+    return f"{int(grade)}/{key}"
+
+
+def split_grade_key(key: str) -> Tuple[Optional[int], str]:
+    """„4/pl_full.pdf“ → (4, "pl_full.pdf"); klíč bez ročníku → (None, klíč)."""
+    grade, sep, rest = key.partition("/")
+    return (int(grade), rest) if sep and grade.isdigit() else (None, key)
+
+
+def grade_worksheets(
+    title: str, full_text: str, structures: Dict[int, GeneratedStructure], pack: str
+) -> Dict[str, Worksheet]:
+    return {
+        grade_key(grade, key): worksheet
+        for grade, structure in sorted(structures.items())
+        for key, worksheet in build_worksheets(title, grade, full_text, structure, pack).items()
+    }
+
+
+def generate_all_grades(
+    title: str,
+    grades: Iterable[int],
+    full_text: str,
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+) -> Tuple[Dict[int, GeneratedStructure], Dict[str, bytes]]:
+    """
+    Sada pro více ročníků (např. 3, 4, 5) z jednoho textu: pack a části nezávislé na ročníku jen jednou
+    (ai_generate_structures), dokumenty všech ročníků v jednom běhu render executoru (sdílené šablony
+    DOCX, tabulky i cache). Klíče souborů viz grade_key.
+    """
+    with span("detect_pack"):
+        pack = detect_pack(title, full_text)
+    structures = ai_generate_structures(full_text, grades, title)
+    worksheets = grade_worksheets(title, full_text, structures, pack)
+    return structures, render_worksheets(worksheets, executor=executor, formats=formats)
+
+
+def generate_all_from_text(
+    title: str,
+    grade: int,
+    full_text: str,
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+) -> Dict[str, bytes]:
+    return generate_all(title, grade, full_text, executor=executor, formats=formats)[1]
+
+
+# Na čem závisí jednotlivé dokumenty – při streamování se dokument začne stavět,
+# jakmile jsou jeho sekce hotové (plná verze nepotřebuje simpl/lmp).
+STUDENT_SHARED_FIELDS = ("drama_intro", "drama_scene", "glossary", "questions_A", "questions_B", "questions_C")
+RENDER_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "pl_full": STUDENT_SHARED_FIELDS,
+    "pl_simpl": STUDENT_SHARED_FIELDS + ("simpl",),
+    "pl_lmp": STUDENT_SHARED_FIELDS + ("lmp",),
+    "method": ("simpl", "lmp"),
+}
+
+
+def generate_all_streaming(
+    title: str,
+    grade: int,
+    full_text: str,
+    on_section: Optional[Callable[[str, object], None]] = None,
+    on_document: Optional[Callable[[str, bytes], None]] = None,
+    formats: Optional[List[str]] = None,
+) -> Tuple[GeneratedStructure, Dict[str, bytes]]:
+    """
+    Jako generate_all, ale se streamovanou odpovědí AI.
+    on_section(klíč, hodnota) se volá pro každou hotovou sekci, on_document(klíč, bytes)
+    pro každý hotový soubor (klíč viz file_key). Obojí se volá z vlákna volajícího (Streamlit skriptu).
+    """
+    with span("detect_pack"):
+        pack = detect_pack(title, full_text)
+    formats = get_output_formats(formats)
+    workers = int(get_config("EDREAD_RENDER_WORKERS", str(len(RENDER_DEPENDENCIES))))
+    pool = get_render_executor("thread", workers)
+    metrics = current_metrics()
+    cache = get_render_cache()
+    sections: Dict[str, object] = {}
+    futures = {}
+    files: Dict[str, bytes] = {}
+    submitted: List[str] = []
+    structure: Optional[GeneratedStructure] = None
+
+    def collect(wait: bool) -> None:
+        for key, (fut, cache_key) in futures.items():
+            if key not in files and (wait or fut.done()):
+                files[key] = fut.result()
+                cache.put(cache_key, files[key])
+                if on_document:
+                    on_document(key, files[key])
+
+    def submit(doc_key: str) -> None:
+        submitted.append(doc_key)
+        worksheet = build_worksheet(doc_key, title, grade, full_text, structure_from_data(sections, full_text), pack)
+        for fmt in formats:
+            key, cache_key = file_key(doc_key, fmt), render_cache_key(worksheet, fmt)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                files[key] = cached
+                if on_document:
+                    on_document(key, cached)
+                continue
+            output = OUTPUT_FORMATS[fmt]
+            resource = output.prepare(worksheet) if output.prepare else None
+            futures[key] = (
+                pool.submit(contextvars.copy_context().run, render_job, fmt, worksheet, resource, metrics),
+                cache_key,
+            )
+
+    for key, value in ai_generate_structure_stream(full_text, grade, title):
+        if key == "structure":
+            structure = value
+            continue
+        sections[key] = value
+        if on_section:
+            on_section(key, value)
+
+        for doc_key, deps in RENDER_DEPENDENCIES.items():
+            if doc_key not in submitted and all(d in sections for d in deps):
+                submit(doc_key)
+        collect(wait=False)
+
+    collect(wait=True)
+    return structure or structure_from_data(sections, full_text), {
+        file_key(doc_key, fmt): files[file_key(doc_key, fmt)] for fmt in formats for doc_key in RENDER_DEPENDENCIES
+    }
+
+
+def regenerate_section(
+    title: str,
+    grade: int,
+    full_text: str,
+    structure: GeneratedStructure,
+    unit: str,
+    executor: Optional[str] = None,
+    formats: Optional[List[str]] = None,
+    mode: Optional[str] = None,
+) -> Tuple[GeneratedStructure, Dict[str, bytes]]:
+    """
+    Nový návrh jedné části (ai_regenerate_section) místo generate_all znovu: upravená struktura nahradí
+    záznam v cache a vyrenderují se jen dokumenty, které na části závisí (RENDER_DEPENDENCIES).
+    mode: režim původního generování (viz patch_cached_structure).
+    Vrací (nová struktura, soubory jen těchto dokumentů; klíče viz file_key).
+    """
+    patched = ai_regenerate_section(unit, structure, full_text, grade, title)
+    patch_cached_structure(full_text, grade, title, patched, mode)
+    with span("detect_pack"):
+        pack = detect_pack(title, full_text)
+    worksheets = {
+        doc_key: build_worksheet(doc_key, title, grade, full_text, patched, pack)
+        for doc_key in regenerated_documents(unit)
+    }
+    return patched, render_worksheets(worksheets, executor=executor, formats=formats)
+
+
+def regenerated_documents(unit: str) -> List[str]:
+    fields = set(REGENERATE_UNITS[unit][0])
+    return [doc_key for doc_key, deps in RENDER_DEPENDENCIES.items() if fields & set(deps)]
+
+
+# =========================
+# Úlohy na pozadí (fronta v SQLite)
+# =========================
+JOB_STATUS_LABELS = {
+    "queued": "čeká ve frontě",
+    "running": "generuje se",
+    "done": "hotovo",
+    "failed": "chyba",
+}
+
+
+def install_worker_log_filter() -> None:
+    """
+    Vlákna našich poolů (edread-*) nemají ScriptRunContext; st.cache_resource v nich
+    funguje, jen při každém volání loguje neškodné varování – to tady odfiltrujeme.
+    """
+    import logging
+
+    log = logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context")
+    if any(getattr(f, "edread_worker_filter", False) for f in log.filters):
+        return
+
+    def drop_worker_warnings(_record: logging.LogRecord) -> bool:
+        return not threading.current_thread().name.startswith("edread-")
+
+    drop_worker_warnings.edread_worker_filter = True
+    log.addFilter(drop_worker_warnings)
+
+
+class JobQueue:
+    """
+    Fronta generování v SQLite + pool workerů v tomto procesu.
+    - submit() vrátí id úlohy hned; generování běží ve vlákně poolu (max. `workers` najednou),
+    - stav i hotové soubory jsou v databázi, takže přežijí reload stránky i restart aplikace,
+    - běžící úloha nese vlastníka (proces) a heartbeat, který vlastník obnovuje každých `heartbeat_s`;
+      znovu se zařadí jen úloha, jejíž heartbeat je starší než 4 × heartbeat_s (spadlý proces / replika) –
+      úlohy živých procesů nad stejnou databází se neopakují (další placené generování).
+    """
+
+    def __init__(self, db_path: str, workers: int = 2, ttl_s: float = 24 * 3600, heartbeat_s: float = 15.0):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.db_path = db_path
+        self.ttl_s = float(ttl_s)
+        self.heartbeat_s = float(heartbeat_s)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._init_db()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="edread-jobs")
+        self._resume()
+        threading.Thread(target=self._heartbeat, name="edread-jobs-heartbeat", daemon=True).start()
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    grade INTEGER NOT NULL,
+                    full_text TEXT NOT NULL,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    trace TEXT,
+                    structure TEXT,
+                    grades TEXT,
+                    owner TEXT,
+                    heartbeat REAL
+                )
+                """
+            )
+            # databáze ze starší verze – chybějící sloupce doplníme
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            added = (("trace", "TEXT"), ("structure", "TEXT"), ("grades", "TEXT"), ("owner", "TEXT"), ("heartbeat", "REAL"))
+            for column, kind in added:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (job_id, key)
+                )
+                """
+            )
+
+    def _resume(self) -> None:
+        """Při startu: znovu zařadí úlohy spadlých procesů a převezme všechny čekající."""
+        self._requeue_stale()
+        with self._db() as conn:
+            ids = [row["id"] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created")]
+        for job_id in ids:
+            self._pool.submit(self._run, job_id)
+
+    def _requeue_stale(self) -> List[str]:
+        """Běžící úlohy bez čerstvého heartbeatu (vlastník spadl) vrátí do fronty; vrací jejich id."""
+        cutoff = time.time() - 4 * self.heartbeat_s
+        with self._db() as conn:
+            ids = [
+                row["id"]
+                for row in conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)", (cutoff,)
+                )
+            ]
+            # podmínka znovu v UPDATE: mezitím mohl vlastník heartbeat obnovit
+            ids = [
+                job_id
+                for job_id in ids
+                if conn.execute(
+                    "UPDATE jobs SET status = 'queued', started = NULL, owner = NULL, heartbeat = NULL "
+                    "WHERE id = ? AND status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                    (job_id, cutoff),
+                ).rowcount
+            ]
+        return ids
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.heartbeat_s)
+            try:
+                with self._db() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'", (time.time(), self.owner)
+                    )
+                # úlohy procesu, který mezitím spadl, převezme kterýkoli živý
+                for job_id in self._requeue_stale():
+                    self._pool.submit(self._run, job_id)
+            except sqlite3.Error:
+                pass  # zamčená / nedostupná databáze – zkusí se při dalším tiku
+
+    def submit(self, title: str, grade: int, full_text: str, grades: Optional[List[int]] = None) -> str:
+        """grades: sada pro více ročníků (generate_all_grades); structure úlohy je pak {"ročník": struktura}."""
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, title, grade, full_text, created, grades) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, title, int(grade), full_text, time.time(), json.dumps(grades) if grades else None),
+            )
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id: str) -> None:
+        with self._db() as conn:
+            # atomické převzetí – úlohu nespustí dva workery
+            now = time.time()
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?, owner = ?, heartbeat = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, self.owner, now, job_id),
+            ).rowcount
+            row = conn.execute("SELECT title, grade, full_text, grades FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not claimed or row is None:
+            return
+
+        with collect_trace() as trace:
+            try:
+                if row["grades"]:
+                    structures, files = generate_all_grades(row["title"], json.loads(row["grades"]), row["full_text"])
+                    structure = {str(grade): structure_to_dict(s) for grade, s in structures.items()}
+                else:
+                    structure, files = generate_all(row["title"], int(row["grade"]), row["full_text"])
+                    structure = structure_to_dict(structure)
+            except Exception as e:
+                with self._db() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished = ?, trace = ? "
+                        "WHERE id = ? AND owner = ?",
+                        (str(e), time.time(), json.dumps(trace), job_id, self.owner),
+                    )
+                return
+
+        with self._db() as conn:
+            # úlohu mezitím (např. po dlouhém výpadku heartbeatu) mohl převzít jiný proces – výsledek nepřepíšeme
+            owned = conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, trace = ?, structure = ? WHERE id = ? AND owner = ?",
+                (time.time(), json.dumps(trace), json.dumps(structure, ensure_ascii=False), job_id, self.owner),
+            ).rowcount
+            if owned:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO job_files (job_id, key, data) VALUES (?, ?, ?)",
+                    [(job_id, key, sqlite3.Binary(data)) for key, data in files.items()],
+                )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT id, status, title, grade, full_text, error, created, started, finished, trace, structure, grades "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["trace"] = json.loads(job["trace"]) if job["trace"] else []
+            job["structure"] = json.loads(job["structure"]) if job["structure"] else None
+            job["grades"] = json.loads(job["grades"]) if job["grades"] else None
+            job["position"] = 0
+            if job["status"] == "queued":
+                job["position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < ?", (job["created"],)
+                ).fetchone()[0] + 1
+        return job
+
+    def files(self, job_id: str) -> Dict[str, bytes]:
+        with self._db() as conn:
+            rows = conn.execute("SELECT key, data FROM job_files WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["key"]: bytes(row["data"]) for row in rows}
+
+    def cleanup(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        with self._db() as conn:
+            conn.execute(
+                "DELETE FROM job_files WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?)",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,))
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    install_worker_log_filter()
+    return JobQueue(
+        db_path=get_config("EDREAD_JOBS_DB", ".edread_jobs.sqlite3"),
+        workers=int(get_config("EDREAD_JOB_WORKERS", "2")),
+        ttl_s=float(get_config("EDREAD_JOB_TTL_H", "24")) * 3600,
+        heartbeat_s=float(get_config("EDREAD_JOB_HEARTBEAT_S", "15")),
     )
 
-    doc_method = build_method_doc(
-        title=title,
-        grade=grade,
-        full_text=full_text,
-        structure=structure,
-        pack=pack,
+
+# =========================
+# Úložiště vygenerovaných souborů (na disku)
+# =========================
+@dataclass
+class Artifact:
+    """Odkaz na soubor v ArtifactStore – v session_state se drží jen tohle, ne bytes."""
+
+    session_id: str
+    artifact_id: str
+    name: str
+    size: int
+
+
+class ArtifactStore:
+    """
+    Vygenerované soubory leží na disku v <root>/<session>/<id>; session drží jen Artifact.
+    Soubory starší než ttl_s maže gc() (volá se při zápisu, nejvýš jednou za minutu).
+    """
+
+    def __init__(self, root: str, ttl_s: float = 6 * 3600):
+        self.root = root
+        self.ttl_s = float(ttl_s)
+        self._last_gc = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, artifact: Artifact) -> str:
+        return os.path.join(self.root, artifact.session_id, artifact.artifact_id)
+
+    def put(self, session_id: str, name: str, data: bytes) -> Artifact:
+        return self.put_stream(session_id, name, lambda f: f.write(data))
+
+    def put_stream(self, session_id: str, name: str, write: Callable[[BinaryIO], None]) -> Artifact:
+        """Jako put, ale obsah zapíše write(f) rovnou do souboru (např. ZIP po kouscích) – bez bytes v paměti."""
+        artifact = Artifact(session_id=session_id, artifact_id=uuid.uuid4().hex, name=name, size=0)
+        path = self.path(artifact)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+        except BaseException:
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
+            raise
+        self.maybe_gc()
+        return replace(artifact, size=os.path.getsize(path))
+
+    def open(self, artifact: Artifact) -> Optional[BinaryIO]:
+        """Otevře soubor pro čtení; None, pokud už vypršel."""
+        try:
+            return open(self.path(artifact), "rb")
+        except OSError:
+            return None
+
+    def read(self, artifact: Artifact) -> Optional[bytes]:
+        f = self.open(artifact)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def delete_session(self, session_id: str) -> None:
+        shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+
+    def session_bytes(self, session_id: str) -> int:
+        folder = os.path.join(self.root, session_id)
+        try:
+            return sum(e.stat().st_size for e in os.scandir(folder) if e.is_file())
+        except OSError:
+            return 0
+
+    def maybe_gc(self) -> None:
+        with self._lock:
+            if time.time() - self._last_gc < 60:
+                return
+            self._last_gc = time.time()
+        self.gc()
+
+    def gc(self) -> int:
+        removed = 0
+        cutoff = time.time() - self.ttl_s
+        for session in os.scandir(self.root):
+            if not session.is_dir():
+                continue
+            for entry in os.scandir(session.path):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+            try:
+                os.rmdir(session.path)  # jen když je prázdná
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        sessions = files = size = 0
+        for session in os.scandir(self.root):
+            if session.is_dir():
+                sessions += 1
+                for entry in os.scandir(session.path):
+                    files += 1
+                    size += entry.stat().st_size
+        return {"sessions": sessions, "files": files, "bytes": size}
+
+
+@st.cache_resource
+def get_artifact_store() -> ArtifactStore:
+    return ArtifactStore(
+        root=get_config("EDREAD_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "edread_artifacts")),
+        ttl_s=float(get_config("EDREAD_ARTIFACT_TTL_H", "6")) * 3600,
     )
 
+
+def session_storage_metrics() -> Dict[str, int]:
+    """
+    Kolik bajtů drží tato session: soubory na disku (ArtifactStore), soubor připravený ke stažení
+    (st.download_button ho celý drží v paměti serveru – media file manager) a bytes přímo v session_state.
+    """
     return {
-        "pl_full": doc_to_bytes(doc_full),
-        "pl_simpl": doc_to_bytes(doc_simpl),
-        "pl_lmp": doc_to_bytes(doc_lmp),
-        "method": doc_to_bytes(doc_method),
+        "disk_bytes": get_artifact_store().session_bytes(st.session_state["session_id"]),
+        "media_bytes": int(st.session_state.get("download_bytes", 0)),
+        "state_bytes": sum(len(v) for v in st.session_state.values() if isinstance(v, (bytes, bytearray))),
+    }
+
+
+def prepare_download(key: str) -> None:
+    """Callback tlačítka souboru: ke stažení (do paměti serveru) se připraví jen tento soubor, předchozí se uvolní."""
+    st.session_state["download_key"] = key
+
+
+def reset_download() -> None:
+    st.session_state["download_key"] = None
+    st.session_state["download_bytes"] = 0
+
+
+def store_files(files: Dict[str, bytes], names: Dict[str, str], keep_existing: bool = False) -> None:
+    """
+    Uloží vygenerované soubory do ArtifactStore a do session_state dá jen odkazy.
+    keep_existing: soubory se přidají k dosavadním (další formáty téhož generování).
+    """
+    store = get_artifact_store()
+    session_id = st.session_state["session_id"]
+    stored: Dict[str, Artifact] = {}
+    if keep_existing:
+        stored = dict(st.session_state.get("files", {}))
+    else:
+        store.delete_session(session_id)  # předchozí generování této session už nepotřebujeme
+        st.session_state["bundles"] = {}
+        reset_download()
+    for k, data in files.items():
+        stored[k] = store.put(session_id, names.get(k, f"{k}.docx"), data)
+    st.session_state["files"] = stored
+    st.session_state["names"] = names
+    st.session_state["generated"] = True
+
+
+def remember_source(
+    title: str,
+    grade: int,
+    full_text: str,
+    structure: Optional[Dict],
+    grades: Optional[List[int]] = None,
+    mode: Optional[str] = None,
+) -> None:
+    """
+    Vstup a struktura posledního generování – z nich se vyrenderují další formáty bez nového dotazu na AI.
+    Sada více ročníků (grades): structure je {"ročník": struktura}. mode: režim AI, kterým struktura vznikla
+    (výchozí default_ai_mode) – podle něj najde úprava části záznam v cache.
+    """
+    st.session_state["source"] = {
+        "title": title,
+        "grade": int(grade),
+        "full_text": full_text,
+        "grades": grades,
+        "mode": mode or default_ai_mode(full_text),
     }
+    st.session_state["structure"] = structure
+
+
+# =========================
+# Stažení všeho najednou (ZIP)
+# =========================
+# ZIP se skládá po kouscích z hotových souborů v ArtifactStore přímo do dalšího souboru na disku:
+# žádný dokument není v paměti celý, natož dvakrát. Hotový balík se pamatuje podle souborů, které obsahuje.
+BUNDLE_CHUNK_BYTES = 256 * 1024
+# DOCX a ODT už jsou ZIP – druhá komprese by jen pálila CPU
+BUNDLE_STORED_FORMATS = ("docx", "odt")
+BUNDLE_DOWNLOAD_KEY = "bundle"  # download_key připraveného ZIP (viz prepare_download)
+
+
+def write_bundle(out: BinaryIO, store: ArtifactStore, files: Dict[str, Artifact], names: Dict[str, str]) -> None:
+    with zipfile.ZipFile(out, "w") as zf:
+        for key, artifact in files.items():
+            src = store.open(artifact)
+            if src is None:
+                raise FileNotFoundError(f"Soubor {artifact.name} už vypršel, vygeneruj dokumenty znovu.")
+            fmt = key.partition(".")[2] or "docx"  # viz file_key
+            info = zipfile.ZipInfo(names.get(key, artifact.name), date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED if fmt in BUNDLE_STORED_FORMATS else zipfile.ZIP_DEFLATED
+            info.file_size = artifact.size
+            with src, zf.open(info, "w") as dst:
+                shutil.copyfileobj(src, dst, BUNDLE_CHUNK_BYTES)
+
+
+def bundle_name(title: str) -> str:
+    return f"edread_{safe_filename(title)}.zip"
+
+
+def get_bundle(with_pdf: bool) -> Artifact:
+    """ZIP se všemi vygenerovanými soubory session (PDF jen s with_pdf); znovu se skládá, jen když se soubory změní."""
+    files: Dict[str, Artifact] = {
+        k: a for k, a in st.session_state["files"].items() if with_pdf or not k.endswith(".pdf")
+    }
+    signature = tuple(sorted(a.artifact_id for a in files.values()))
+    store = get_artifact_store()
+    bundles: Dict[Tuple[str, ...], Artifact] = st.session_state.setdefault("bundles", {})
+    cached = bundles.get(signature)
+    if cached and os.path.exists(store.path(cached)):
+        return cached
+
+    source = st.session_state.get("source") or {}
+    with span("bundle_zip"):
+        artifact = store.put_stream(
+            st.session_state["session_id"],
+            bundle_name(source.get("title", "")),
+            lambda out: write_bundle(out, store, files, st.session_state.get("names", {})),
+        )
+    bundles[signature] = artifact
+    return artifact
 
 
 # =========================
 # Streamlit state + UI
 # =========================
 def ensure_state():
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
     if "files" not in st.session_state:
         st.session_state["files"] = {}
     if "names" not in st.session_state:
         st.session_state["names"] = {}
     if "generated" not in st.session_state:
         st.session_state["generated"] = False
+    if "trace" not in st.session_state:
+        st.session_state["trace"] = []
+    if "structure" not in st.session_state:
+        st.session_state["source"] = None
+        st.session_state["structure"] = None
+    if "job_id" not in st.session_state:
+        # po reloadu stránky navážeme na úlohu z URL (?job=…)
+        st.session_state["job_id"] = st.query_params.get("job")
+        if st.session_state["job_id"]:
+            job = get_job_queue().get(st.session_state["job_id"])
+            if job is not None and job["status"] == "done":
+                store_files(get_job_queue().files(job["id"]), output_names(job["title"], job["grades"]))
+                remember_source(job["title"], job["grade"], job["full_text"], job["structure"], job["grades"])
+                st.session_state["trace"] = job["trace"]
+                st.session_state["job_id"] = None
 
 
 def show_downloads():
-    files: Dict[str, bytes] = st.session_state.get("files", {})
+    files: Dict[str, Artifact] = st.session_state.get("files", {})
     names: Dict[str, str] = st.session_state.get("names", {})
     if not files:
         return
+    store = get_artifact_store()
 
     st.subheader("Stažení dokumentů")
 
@@ -703,26 +5270,356 @@ def show_downloads():
         "method": "⬇️ Metodický list pro učitele",
     }
 
-    order = ["pl_full", "pl_simpl", "pl_lmp", "method"]
-    cols = st.columns(2)
-    for i, k in enumerate(order):
-        if k in files:
+    order = [(file_key(doc_key, fmt), fmt) for fmt in OUTPUT_FORMATS for doc_key in DOCUMENT_KEYS]
+    # sada více ročníků: tlačítka po ročnících (klíče viz grade_key)
+    for grade in sorted({split_grade_key(k)[0] for k in files}, key=lambda g: g or 0):
+        items = [(grade_key(grade, k) if grade else k, k, fmt) for k, fmt in order]
+        if grade:
+            st.markdown(f"**{grade}. ročník**")
+        cols = st.columns(2)
+        for i, (k, doc_key, fmt) in enumerate(item for item in items if item[0] in files):
+            label = labels.get(doc_key.split(".")[0], f"Stáhnout {k}")
+            if fmt != "docx":
+                label += f" ({OUTPUT_FORMATS[fmt].label})"
             with cols[i % 2]:
-                st.download_button(
-                    label=labels.get(k, f"Stáhnout {k}"),
-                    data=files[k],
-                    file_name=names.get(k, f"{k}.docx"),
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key=f"dl_{k}",
-                )
+                show_file_download(k, files[k], label, names.get(k, files[k].name), OUTPUT_FORMATS[fmt].mime)
+
+    show_bundle_download(files)
+    show_extra_formats(files)
+    show_section_regeneration()
+
+    m = session_storage_metrics()
+    st.caption(
+        f"Soubory jsou uložené na disku ({m['disk_bytes'] / 1024:.0f} KiB); v paměti serveru je jen soubor "
+        f"připravený ke stažení ({m['media_bytes'] / 1024:.0f} KiB)."
+    )
 
     if st.button("🧹 Vymazat vygenerované soubory", key="clear_btn"):
+        store.delete_session(st.session_state["session_id"])
         st.session_state["files"] = {}
         st.session_state["names"] = {}
         st.session_state["generated"] = False
+        st.session_state["job_id"] = None
+        st.session_state["source"] = None
+        st.session_state["structure"] = None
+        st.session_state["bundles"] = {}
+        reset_download()
+        st.query_params.pop("job", None)
         st.success("Vygenerované soubory byly vymazány.")
 
 
+def show_file_download(key: str, artifact: Artifact, label: str, file_name: str, mime: str) -> None:
+    """
+    Tlačítko souboru. st.download_button načte data celá do paměti serveru hned při vykreslení, proto se
+    vykreslí jen u souboru, o který si učitel klikl (prepare_download); ostatní jsou obyčejná tlačítka.
+    """
+    if st.session_state.get("download_key") != key:
+        st.button(label, key=f"prep_{key}", on_click=prepare_download, args=(key,))
+        return
+    f = get_artifact_store().open(artifact)
+    if f is None:
+        st.warning(f"{label}: soubor už vypršel, vygeneruj ho znovu.")
+        return
+    with f:
+        st.download_button(
+            label=f"{label.replace('⬇️', '💾', 1)} – uložit ({artifact.size / 1024:.0f} KiB)",
+            data=f,
+            file_name=file_name,
+            mime=mime,
+            key=f"dl_{key}",
+            type="primary",
+        )
+    st.session_state["download_bytes"] = artifact.size
+
+
+def show_extra_formats(files: Dict[str, Artifact]) -> None:
+    """Další formáty téhož generování – renderují se z uložené struktury, AI se znovu nevolá."""
+    source, structure = st.session_state.get("source"), st.session_state.get("structure")
+    missing = [fmt for fmt in OUTPUT_FORMATS if fmt not in file_formats(files)]
+    if not source or not structure or not missing:
+        return
+    chosen = st.multiselect(
+        "Další formáty (bez nového dotazu na AI):",
+        missing,
+        format_func=lambda fmt: OUTPUT_FORMATS[fmt].label,
+        key="extra_formats",
+    )
+    if st.button("Vytvořit ve vybraných formátech", key="btn_extra_formats", disabled=not chosen):
+        try:
+            with st.spinner("Vytvářím další formáty…"):
+                render_extra_formats(chosen)
+        except Exception as e:
+            st.error(f"Došlo k chybě při vytváření formátů: {e}")
+            return
+        st.rerun()
+
+
+def render_extra_formats(formats: List[str]) -> None:
+    """Vyrenderuje formáty z uložené struktury posledního generování a přidá je k souborům session."""
+    source, structure = st.session_state["source"], st.session_state["structure"]
+    title, full_text, grades = source["title"], source["full_text"], source.get("grades")
+    pack = detect_pack(title, full_text)
+    if grades:
+        structures = {int(grade): structure_from_dict(data) for grade, data in structure.items()}
+        out = render_worksheets(grade_worksheets(title, full_text, structures, pack), formats=formats)
+    else:
+        out = render_documents(title, source["grade"], full_text, structure_from_dict(structure), pack, formats=formats)
+    store_files(out, output_names(title, grades), keep_existing=True)
+
+
+def show_bundle_download(files: Dict[str, Artifact]) -> None:
+    """
+    Jedno tlačítko na všechno: ZIP z hotových souborů na disku, volitelně i s PDF. Balík se skládá až po
+    kliknutí na „Připravit ZIP“ a jako jediný soubor session se pak drží v paměti serveru (viz show_file_download).
+    """
+    has_pdf = "pdf" in file_formats(files)
+    can_render = bool(st.session_state.get("source") and st.session_state.get("structure"))
+    with_pdf = st.checkbox("Přidat do ZIP i PDF", key="bundle_pdf", disabled=not (has_pdf or can_render))
+    if with_pdf and not has_pdf:
+        try:
+            with st.spinner("Vytvářím PDF…"):
+                render_extra_formats(["pdf"])
+        except Exception as e:
+            st.error(f"PDF se nepodařilo vytvořit: {e}")
+            with_pdf = False
+        else:
+            st.rerun()
+
+    if st.session_state.get("download_key") != BUNDLE_DOWNLOAD_KEY:
+        st.button("📦 Připravit ZIP se vším", key="prep_bundle", on_click=prepare_download, args=(BUNDLE_DOWNLOAD_KEY,))
+        return
+    try:
+        bundle = get_bundle(with_pdf)
+    except (OSError, zipfile.BadZipFile) as e:
+        st.warning(f"ZIP se nepodařilo připravit: {e}")
+        return
+    f = get_artifact_store().open(bundle)
+    if f is None:
+        return
+    with f:
+        st.download_button(
+            label=f"📦 Stáhnout vše (ZIP, {bundle.size / 1024:.0f} KiB)",
+            data=f,
+            file_name=bundle.name,
+            mime="application/zip",
+            key="dl_bundle",
+            type="primary",
+        )
+    st.session_state["download_bytes"] = bundle.size
+
+
+def show_section_regeneration() -> None:
+    """Nový návrh jedné části posledního generování – ostatní části a dokumenty, které na ní nezávisí, zůstanou."""
+    source, structure = st.session_state.get("source"), st.session_state.get("structure")
+    if not source or not structure or not get_openai_key():
+        return
+    grades = source.get("grades")
+    done = st.session_state.pop("regenerated", None)
+    if done:
+        # náhled mimo expander níže – show_section_preview má vlastní expander a ty nejdou vnořit
+        grade, unit = done
+        data = structure[str(grade)] if grades else structure
+        st.success(f"{REGENERATE_LABELS[unit]}: nový návrh je v dokumentech ke stažení.")
+        for field in REGENERATE_UNITS[unit][0]:
+            show_section_preview(st.container(), field, data[field])
+
+    with st.expander("✏️ Vygenerovat znovu jen jednu část", expanded=False):
+        grade = st.selectbox("Ročník:", grades, key="regen_grade") if grades else source["grade"]
+        unit = st.selectbox("Část:", list(REGENERATE_UNITS), format_func=REGENERATE_LABELS.get, key="regen_unit")
+        docs = regenerated_documents(unit)
+        st.caption(f"Znovu se vytvoří jen: {', '.join(DOCUMENT_LABELS[d] for d in docs)}.")
+        if st.button("Vygenerovat znovu", key="btn_regenerate"):
+            try:
+                with st.spinner(f"Generuji znovu: {REGENERATE_LABELS[unit]}…"), collect_trace() as trace:
+                    regenerate_in_session(unit, int(grade))
+            except Exception as e:
+                st.error(f"Část se nepodařilo vygenerovat znovu: {e}")
+                return
+            st.session_state["trace"] = trace
+            st.session_state["regenerated"] = (int(grade), unit)
+            st.rerun()
+
+
+def regenerate_in_session(unit: str, grade: int) -> None:
+    """regenerate_section nad strukturou posledního generování; nové soubory nahradí jen dotčené dokumenty."""
+    source, structure = st.session_state["source"], st.session_state["structure"]
+    title, full_text, grades = source["title"], source["full_text"], source.get("grades")
+    current = structure_from_dict(structure[str(grade)] if grades else structure)
+    formats = [fmt for fmt in OUTPUT_FORMATS if fmt in file_formats(st.session_state["files"])]
+    patched, out = regenerate_section(title, grade, full_text, current, unit, formats=formats, mode=source.get("mode"))
+    if grades:
+        st.session_state["structure"] = {**structure, str(grade): structure_to_dict(patched)}
+        out = {grade_key(grade, key): data for key, data in out.items()}
+    else:
+        st.session_state["structure"] = structure_to_dict(patched)
+    store_files(out, output_names(title, grades), keep_existing=True)
+
+
+@st.fragment(run_every=2)
+def show_job_status(job_id: str) -> None:
+    """Běží samostatně každé 2 s (fragment) – zbytek stránky se kvůli tomu nepřekresluje."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.warning("Úloha nebyla nalezena (možná už vypršela).")
+        st.session_state["job_id"] = None
+        st.query_params.pop("job", None)
+        return
+
+    if job["status"] in ("queued", "running"):
+        since = job["started"] or job["created"]
+        extra = f", pořadí ve frontě: {job['position']}" if job["status"] == "queued" else ""
+        st.info(f"⏳ Úloha {job_id[:8]}: {JOB_STATUS_LABELS[job['status']]} ({time.time() - since:.0f} s{extra})")
+        return
+
+    st.session_state["job_id"] = None
+    st.session_state["trace"] = job["trace"]
+    if job["status"] == "failed":
+        st.query_params.pop("job", None)
+        st.error(f"Došlo k chybě při generování: {job['error']}")
+        return
+
+    store_files(get_job_queue().files(job_id), output_names(job["title"], job["grades"]))
+    remember_source(job["title"], job["grade"], job["full_text"], job["structure"], job["grades"])
+    st.rerun()
+
+
+SECTION_LABELS = {
+    "simpl": "Zjednodušená verze",
+    "lmp": "LMP/SPU verze",
+    "drama_intro": "Dramatizace – úvod",
+    "drama_scene": "Dramatizace – repliky",
+    "glossary": "Slovníček",
+    "questions_A": "Otázky A",
+    "questions_B": "Otázky B",
+    "questions_C": "Otázky C",
+}
+DOCUMENT_LABELS = {
+    "pl_full": "Pracovní list – plná verze",
+    "pl_simpl": "Pracovní list – zjednodušená verze",
+    "pl_lmp": "Pracovní list – LMP/SPU verze",
+    "method": "Metodický list pro učitele",
+}
+REGENERATE_LABELS = {
+    "simpl": "Zjednodušená verze",
+    "lmp": "LMP/SPU verze",
+    "drama": "Dramatizace",
+    "glossary": "Slovníček",
+    "questions_A": "Otázky A",
+    "questions_B": "Otázky B",
+    "questions_C": "Otázky C",
+}
+
+
+@st.cache_resource(max_entries=32)
+def get_text_analysis(text: str) -> TextAnalysis:
+    """analyze_text pro náhled pod polem s textem – rerun při každé změně formuláře ho nepočítá znovu."""
+    return analyze_text(text)
+
+
+def show_section_preview(container, key: str, value) -> None:
+    with container:
+        with st.expander(f"✅ {SECTION_LABELS.get(key, key)}", expanded=False):
+            if key == "drama_scene":
+                for role, line in value:
+                    st.markdown(f"**{role}:** {line}")
+            elif key == "glossary":
+                for w, expl in value.items():
+                    st.markdown(f"**{w}** — {expl}")
+            elif isinstance(value, list):
+                for q in value:
+                    st.markdown(f"- {q}")
+            else:
+                st.write(value)
+
+
+def show_glossary_editor() -> None:
+    """Sdílený slovníček (GlossaryStore): učitel opraví nebo doplní vysvětlení, AI je pak u těchto slov nepřepíše."""
+    store = get_glossary_store()
+    with st.expander(f"📖 Sdílený slovníček (hesel: {len(store)})", expanded=False):
+        st.caption("Vysvětlení se použijí ve všech dalších pracovních listech. Prázdné vysvětlení heslo smaže.")
+        # tabulka (pandas + pyarrow) se načte až na požádání – úvodní stránka bez ní naběhne rychleji
+        if not st.toggle("Zobrazit a upravit hesla", key="glossary_open"):
+            return
+        import pandas as pd
+
+        prefix = st.text_input("Hledat heslo (začátek slova):", key="glossary_prefix").strip()
+        rows = store.search(prefix)
+        table = pd.DataFrame(
+            [[r["word"], r["explanation"], r["source"], r["uses"]] for r in rows],
+            columns=["slovo", "vysvětlení", "zdroj", "použito"],
+        )
+        edited = st.data_editor(
+            table,
+            num_rows="dynamic",
+            use_container_width=True,
+            disabled=["zdroj", "použito"],
+            hide_index=True,
+            key=f"glossary_editor_{prefix}",
+        )
+        if st.button("Uložit úpravy slovníčku", key="btn_glossary_save"):
+            def cell(value) -> str:
+                return "" if pd.isna(value) else str(value).strip()
+
+            original = {r["word"]: r["explanation"] for r in rows}
+            kept: Dict[str, str] = {}
+            for word, explanation in zip(edited["slovo"], edited["vysvětlení"]):
+                if cell(word):
+                    kept[cell(word)] = cell(explanation)
+            for word in original:
+                if not kept.get(word):
+                    store.delete(word)
+            changed = store.learn(
+                {w: e for w, e in kept.items() if e and original.get(w) != e}, source="teacher"
+            )
+            st.success(f"Uloženo ({changed} změněných hesel).")
+
+
+def show_debug_trace() -> None:
+    """Debug: průběh posledního generování (kroky, časy, vlákna, tokeny)."""
+    trace: List[Dict] = st.session_state.get("trace") or []
+    with st.expander("🐞 Průběh posledního generování (debug)", expanded=False):
+        if not trace:
+            st.caption("Zatím žádné záznamy – spusť generování.")
+            return
+        steps = [e for e in trace if e["stage"] != "usage"]
+        usage = [e for e in trace if e["stage"] == "usage"]
+        st.dataframe(steps, use_container_width=True)
+        if usage:
+            prompt = sum(e["prompt_tokens"] for e in usage)
+            completion = sum(e["completion_tokens"] for e in usage)
+            st.caption(f"Tokeny: {prompt} vstup / {completion} výstup ({len(usage)} dotazů na AI).")
+        cs = get_structure_cache().stats()
+        st.caption(f"Cache AI výsledků: úspěšnost {cs['hit_rate'] * 100:.0f} % ({cs['hits']} / {cs['hits'] + cs['misses']}).")
+        index = get_near_dup_index()
+        if index is not None:
+            ns = index.stats()
+            st.caption(
+                f"Téměř stejné texty (z minutí): {ns['hits']}× převzat celý výsledek, "
+                f"{ns['partial']}× jen znovu zjednodušení, {ns['misses']}× nic podobného."
+            )
+
+
+def run_streaming_generation(title: str, grade: int, full_text: str) -> Tuple[GeneratedStructure, Dict[str, bytes]]:
+    st.caption("Sekce se zobrazují, jakmile je AI dokončí; dokumenty se staví průběžně.")
+    sections_box = st.container()
+    docs_box = st.empty()
+    finished: List[str] = []
+    total = len(DOCUMENT_KEYS) * len(get_output_formats())
+
+    def on_document(key: str, _data: bytes) -> None:
+        doc_key, _, fmt = key.partition(".")
+        finished.append(DOCUMENT_LABELS.get(doc_key, doc_key) + (f" ({fmt.upper()})" if fmt else ""))
+        docs_box.info(f"Hotové dokumenty ({len(finished)}/{total}): " + ", ".join(finished))
+
+    return generate_all_streaming(
+        title,
+        grade,
+        full_text,
+        on_section=lambda key, value: show_section_preview(sections_box, key, value),
+        on_document=on_document,
+    )
+
+
 def main():
     st.set_page_config(page_title="EdRead AI – vlastní text", layout="centered")
     ensure_state()
@@ -742,41 +5639,92 @@ def main():
 
     title = st.text_input("Název úlohy:", value="Moje čtení s porozuměním")
     grade = st.number_input("Ročník (1–9):", min_value=1, max_value=9, value=5, step=1)
+    extra_grades = st.multiselect(
+        "Stejný text i pro další ročníky (sada):",
+        list(range(1, 10)),
+        key="extra_grades",
+        help="Analýza textu, slovníček a tabulky se připraví jednou; pro každý ročník se AI ptá jen "
+        "na zjednodušení, dramatizaci a otázky – všechny ročníky najednou.",
+    )
+    grades = sorted({int(grade), *extra_grades})
+    multi = len(grades) > 1
     full_text = st.text_area("Vlož text pro čtení:", height=320, placeholder="Sem vlož celý text, se kterým chceš pracovat...")
+    if full_text.strip():
+        a = get_text_analysis(full_text)
+        st.caption(
+            f"Čitelnost (LIX): {a.lix:.0f} – odpovídá zhruba "
+            + (f"{a.estimated_grade}. ročníku" if a.estimated_grade <= 9 else "textu nad 9. ročník")
+            + f" (cíl pro {int(grade)}. ročník: ≤ {lix_target(int(grade)):.0f}). "
+            f"Vět: {a.sentences}, slov: {a.words}, průměrně {a.avg_sentence_words:.1f} slova na větu. "
+            + (f"Obtížná slova: {', '.join(a.hard_words[:8])}." if a.hard_words else "")
+        )
 
-    # rychlá kontrola assets
+    # rychlá kontrola assets – jen vyhledání; PNG se optimalizují až při prvním generování
     with st.expander("🔎 Kontrola tabulek v assets/ (doporučeno)", expanded=False):
-        ac = asset_candidates()
-        for key, candidates in ac.items():
-            found = find_existing_asset(candidates)
-            if found:
-                st.success(f"{key}: nalezeno → {found}")
+        for key, path in find_table_assets().items():
+            if path:
+                st.success(f"{key}: nalezeno → {os.path.relpath(path, APP_DIR)} ({os.path.getsize(path) / 1024:.0f} KiB)")
             else:
                 st.warning(f"{key}: nenalezeno (nahraj PNG do assets/)")
 
+    streaming = st.checkbox(
+        "Zobrazovat výsledky průběžně (streamování)", value=False, key="streaming", disabled=multi,
+        help="Jednotlivé části se ukážou hned, jak je AI dopíše (jen pro jeden ročník).",
+    )
+
     if st.button("Vygenerovat pracovní listy", type="primary", key="btn_generate"):
         if not full_text.strip():
             st.error("Nejdřív vlož text.")
         else:
             try:
-                with st.spinner("Generuji pracovní listy…"):
-                    out = generate_all_from_text(title, int(grade), full_text.strip())
-
-                base = safe_filename(title)
-                st.session_state["files"] = out
-                st.session_state["names"] = {
-                    "pl_full": f"pracovni_list_{base}_plny.docx",
-                    "pl_simpl": f"pracovni_list_{base}_zjednoduseny.docx",
-                    "pl_lmp": f"pracovni_list_{base}_LMP_SPU.docx",
-                    "method": f"metodika_{base}.docx",
-                }
-                st.session_state["generated"] = True
-                st.success("Hotovo. Dokumenty jsou připravené ke stažení.")
+                st.session_state["trace"] = []
+                mode = None
+                if streaming and not multi:
+                    with collect_trace() as trace:
+                        structure, out = run_streaming_generation(title, int(grade), full_text.strip())
+                    st.session_state["trace"] = trace
+                    mode = stream_ai_mode(full_text.strip())
+                elif get_config("EDREAD_BACKGROUND_JOBS", "1") == "1":
+                    job_id = get_job_queue().submit(title, int(grade), full_text.strip(), grades if multi else None)
+                    st.session_state["job_id"] = job_id
+                    st.session_state["files"] = {}
+                    st.query_params["job"] = job_id
+                    out = None
+                elif multi:
+                    with st.spinner(f"Generuji pracovní listy pro {len(grades)} ročníky…"), collect_trace() as trace:
+                        structures, out = generate_all_grades(title, grades, full_text.strip())
+                    st.session_state["trace"] = trace
+                else:
+                    with st.spinner("Generuji pracovní listy…"), collect_trace() as trace:
+                        structure, out = generate_all(title, int(grade), full_text.strip())
+                    st.session_state["trace"] = trace
+
+                if out is not None:
+                    if multi:
+                        store_files(out, output_names(title, grades))
+                        structure_dict = {str(g): structure_to_dict(s) for g, s in structures.items()}
+                        remember_source(title, int(grade), full_text.strip(), structure_dict, grades)
+                    else:
+                        store_files(out, output_names(title))
+                        remember_source(title, int(grade), full_text.strip(), structure_to_dict(structure), mode=mode)
+                    st.success("Hotovo. Dokumenty jsou připravené ke stažení.")
+                    cs = get_structure_cache().stats()
+                    index = get_near_dup_index()
+                    near = index.stats() if index is not None else {"hits": 0, "partial": 0}
+                    reused = near["hits"] + near["partial"]
+                    note = f", z toho {reused} převzato z téměř stejného textu" if reused else ""
+                    st.caption(f"Cache AI výsledků: {cs['hits']} zásahů / {cs['misses']} minutí{note}.")
             except Exception as e:
                 st.error(f"Došlo k chybě při generování: {e}")
 
-    # Tlačítka zůstanou – držíme bytes v session_state
+    if st.session_state.get("job_id"):
+        show_job_status(st.session_state["job_id"])
+
     show_downloads()
+    show_glossary_editor()
+
+    if get_config("EDREAD_DEBUG", "0") == "1":
+        show_debug_trace()
 
 
 if __name__ == "__main__":
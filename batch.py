@@ -0,0 +1,180 @@
+"""
+EdRead AI – dávkové generování pracovních listů z příkazové řádky.
+
+Vstup je buď složka s texty (*.txt; název úlohy = jméno souboru), nebo JSONL manifest,
+kde každý řádek je {"title": "...", "grade": 5, "text": "..."} (místo "text" lze dát "path").
+
+Příklady (spouštěj z kořene repozitáře, kvůli assets/):
+    python batch.py texty/ -o vystup/ --grade 4 --workers 4
+    python batch.py manifest.jsonl -o vystup/ --zip vystup.zip
+    python batch.py texty/ -o vystup/ --formats docx,pdf
+
+Každá položka se uloží do vlastní podsložky; po dokončení se zapíše done.json.
+Při opakovaném spuštění se hotové položky přeskočí (lze tedy navázat po přerušení).
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import app
+
+
+@dataclass
+class BatchItem:
+    title: str
+    grade: int
+    text: str
+
+    @property
+    def item_id(self) -> str:
+        digest = hashlib.sha1(app.normalize_text(self.text).encode("utf-8")).hexdigest()[:8]
+        return f"{app.safe_filename(self.title)}_{self.grade}_{digest}"
+
+
+def load_items(source: str, default_grade: int) -> List[BatchItem]:
+    items: List[BatchItem] = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(".txt"):
+                continue
+            with open(os.path.join(source, name), "r", encoding="utf-8") as f:
+                text = f.read().strip()
+            if text:
+                items.append(BatchItem(title=os.path.splitext(name)[0], grade=default_grade, text=text))
+        return items
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                text = row.get("text")
+                if text is None:
+                    with open(os.path.join(base, row["path"]), "r", encoding="utf-8") as tf:
+                        text = tf.read()
+                items.append(
+                    BatchItem(
+                        title=str(row.get("title") or "edread_ai"),
+                        grade=int(row.get("grade", default_grade)),
+                        text=str(text).strip(),
+                    )
+                )
+            except (ValueError, KeyError, OSError) as e:
+                raise SystemExit(f"{source}:{lineno}: neplatný řádek manifestu ({e})")
+    return items
+
+
+def is_done(out_dir: str, item: BatchItem) -> bool:
+    return os.path.exists(os.path.join(out_dir, item.item_id, "done.json"))
+
+
+def run_item(out_dir: str, item: BatchItem, executor: Optional[str], formats: Optional[List[str]] = None) -> float:
+    t0 = time.perf_counter()
+    files = app.generate_all_from_text(item.title, item.grade, item.text, executor=executor, formats=formats)
+    elapsed = time.perf_counter() - t0
+
+    item_dir = os.path.join(out_dir, item.item_id)
+    os.makedirs(item_dir, exist_ok=True)
+    names = app.output_names(item.title)
+    for key, data in files.items():
+        path = os.path.join(item_dir, names[key])
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    # done.json až nakonec – podle něj se při navázání pozná hotová položka
+    with open(os.path.join(item_dir, "done.json"), "w", encoding="utf-8") as f:
+        json.dump({"title": item.title, "grade": item.grade, "seconds": round(elapsed, 3)}, f, ensure_ascii=False)
+    return elapsed
+
+
+OUTPUT_EXTENSIONS = tuple(f".{fmt}" for fmt in app.OUTPUT_FORMATS)
+
+
+def write_zip(out_dir: str, zip_path: str) -> None:
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for root, _, names in os.walk(out_dir):
+            for name in sorted(names):
+                if name.endswith(OUTPUT_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    zf.write(path, os.path.relpath(path, out_dir))
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def print_summary(latencies: List[float], skipped: int, failed: Dict[str, str], wall: float) -> None:
+    print()
+    print(f"Hotovo: {len(latencies)}, přeskočeno (už hotové): {skipped}, chyby: {len(failed)}")
+    for item_id, err in failed.items():
+        print(f"  ✗ {item_id}: {err}")
+    print(f"Celkový čas: {wall:.1f} s")
+    if latencies:
+        print(f"Propustnost: {len(latencies) / wall * 60:.1f} položek/min")
+        print(
+            f"Latence: p50 {statistics.median(latencies):.1f} s, p95 {percentile(latencies, 0.95):.1f} s, "
+            f"max {max(latencies):.1f} s"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="složka s *.txt nebo JSONL manifest")
+    parser.add_argument("-o", "--out", required=True, help="výstupní složka")
+    parser.add_argument("--zip", help="po dokončení zabalit všechny dokumenty do tohoto ZIP souboru")
+    parser.add_argument("--grade", type=int, default=5, help="ročník pro položky bez vlastního (výchozí 5)")
+    parser.add_argument("--workers", type=int, default=4, help="počet souběžných generování")
+    parser.add_argument("--executor", choices=app.RENDER_EXECUTORS, help="režim renderování dokumentů")
+    parser.add_argument(
+        "--formats", help=f"výstupní formáty oddělené čárkou ({', '.join(app.OUTPUT_FORMATS)}; výchozí EDREAD_FORMATS)"
+    )
+    args = parser.parse_args(argv)
+    app.quiet_bare_mode_logs()
+    try:
+        formats = app.get_output_formats(args.formats.split(",") if args.formats else None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    items = load_items(args.source, args.grade)
+    os.makedirs(args.out, exist_ok=True)
+    todo = [item for item in items if not is_done(args.out, item)]
+    skipped = len(items) - len(todo)
+    print(f"Položek: {len(items)}, k vygenerování: {len(todo)}, souběžně: {args.workers}")
+    if not app.get_openai_key():
+        print("⚠️ Chybí OPENAI_API_KEY → nouzový režim (bez AI úprav).")
+
+    latencies: List[float] = []
+    failed: Dict[str, str] = {}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="edread-batch") as pool:
+        futures = {pool.submit(run_item, args.out, item, args.executor, formats): item for item in todo}
+        for fut in as_completed(futures):
+            item = futures[fut]
+            try:
+                latencies.append(fut.result())
+                print(f"  ✓ {item.item_id} ({latencies[-1]:.1f} s)")
+            except Exception as e:
+                failed[item.item_id] = str(e)
+                print(f"  ✗ {item.item_id}: {e}")
+    wall = time.perf_counter() - t0
+
+    if args.zip:
+        write_zip(args.out, args.zip)
+        print(f"ZIP: {args.zip}")
+    print_summary(latencies, skipped, failed, wall)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+End-to-end benchmark EdRead AI proti lokálnímu mock LLM (benchmarks/mock_llm.py).
+
+Pro korpus krátkých, středních a velmi dlouhých českých textů měří:
+- build_student_doc, build_method_doc, doc_to_bytes (bez AI),
+- generate_all_from_text celé (mock AI + DOCX),
+- propustnost a latenci při N souběžných klientech,
+- sadu pro více ročníků (generate_all_grades) proti samostatnému generování každého ročníku,
+- špičkové RSS procesu a velikost výstupu.
+
+Výsledky se zapíší do JSON (včetně commitu), aby šly porovnat mezi verzemi:
+    python benchmarks/bench_e2e.py --out bench_results.json
+    python benchmarks/bench_e2e.py --baseline bench_results.json --out novy.json
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm import start_mock_server  # noqa: E402
+
+# věty záměrně neobsahují klíčová slova z detect_pack – pack určuje jen název úlohy
+SENTENCES = [
+    "Karetní hra se zvířaty je určená pro dva až pět hráčů od šesti let.",
+    "Každý hráč dostane na začátku stejný počet karet se zvířaty.",
+    "Silnější zvíře přebije slabší, ale malý komár dokáže přebít slona.",
+    "Jedna karta se může proměnit v jakékoliv jiné zvíře.",
+    "Vyhrává ten, kdo se jako první zbaví všech karet v ruce.",
+    "V cukrárně U Mlsného jazýčku prodávají věnečky s vanilkovým krémem.",
+    "Porota hodnotila vzhled, chuť, složení a cenu jednotlivých zákusků.",
+    "Některé věnečky měly ztvrdlé těsto a krém chutnal po margarínu.",
+    "Nejlépe dopadl zákusek z malé rodinné cukrárny na náměstí.",
+    "Televizní pořad porovnává kvalitu oblíbených dobrot.",
+]
+
+CORPUS_SIZES = {"small": 600, "medium": 5_000, "long": 40_000}
+
+
+def make_text(chars: int, seed: int = 0) -> str:
+    paragraphs: List[str] = []
+    total = 0
+    i = seed
+    while total < chars:
+        para = " ".join(SENTENCES[(i + k) % len(SENTENCES)] for k in range(5))
+        paragraphs.append(para)
+        total += len(para) + 2
+        i += 3
+    return "\n\n".join(paragraphs)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples),
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # Linux: ru_maxrss je v KiB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_corpus(app, size: str, text: str, pack: str, repeat: int, counter: Iterator[int]) -> Dict:
+    title = "Karetní hra" if pack == "karetni" else "Benchmark"
+    structure = app.ai_generate_structure(text, 5, title, use_cache=False)
+    kwargs = dict(
+        title=title,
+        grade=5,
+        variant_label="PLNÝ",
+        text_variant=text,
+        drama_intro=structure.drama_intro,
+        drama_scene=structure.drama_scene,
+        glossary=structure.glossary,
+        questions_A=structure.questions_A,
+        questions_B=structure.questions_B,
+        questions_C=structure.questions_C,
+        pack=pack,
+    )
+    student = app.build_student_doc(**kwargs)
+    method = app.build_method_doc(title=title, grade=5, full_text=text, structure=structure, pack=pack)
+
+    def generate() -> Dict[str, bytes]:
+        # unikátní text → žádné zásahy cache, pokaždé jde dotaz na mock AI
+        return app.generate_all_from_text(title, 5, f"{text}\n\n({next(counter)})")
+
+    out = generate()
+    return {
+        "corpus": size,
+        "chars": len(text),
+        "pack": pack,
+        "build_student_doc": summarize(timed(lambda: app.build_student_doc(**kwargs), repeat)),
+        "build_method_doc": summarize(
+            timed(lambda: app.build_method_doc(title=title, grade=5, full_text=text, structure=structure, pack=pack), repeat)
+        ),
+        "doc_to_bytes_student": summarize(timed(lambda: app.doc_to_bytes(student), repeat)),
+        "doc_to_bytes_method": summarize(timed(lambda: app.doc_to_bytes(method), repeat)),
+        "generate_all_from_text": summarize(timed(generate, repeat)),
+        "output_bytes": sum(len(v) for v in out.values()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_concurrency(app, text: str, clients: int, per_client: int, counter: Iterator[int]) -> Dict:
+    latencies: List[float] = []
+
+    def client(cid: int) -> None:
+        for _ in range(per_client):
+            t0 = time.perf_counter()
+            app.generate_all_from_text("Benchmark", 5, f"{text}\n\n(klient {cid}, {next(counter)})")
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - t0
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "wall_s": round(wall, 3),
+        "throughput_per_min": round(len(latencies) / wall * 60, 1),
+        "latency": summarize(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_grades(app, server, text: str, grades: List[int], counter: Iterator[int]) -> Dict:
+    """
+    Sada ročníků jedním během vs. ročník po ročníku (doba, počet dotazů a tokeny mock AI). Každý ročník
+    posílá celý text (výstup na ročníku závisí) – sada ušetří hlavně čas a slovníček, ne dotazy.
+    """
+    rows = {}
+    for label in ("separate", "shared"):
+        unique = f"{text}\n\n({next(counter)})"
+        before = server.mock_config.requests
+        t0 = time.perf_counter()
+        with app.collect_trace() as trace:
+            if label == "shared":
+                app.generate_all_grades("Benchmark", grades, unique)
+            else:
+                for grade in grades:
+                    app.generate_all("Benchmark", grade, unique)
+        usage = [e for e in trace if e.get("stage") == "usage"]
+        rows[label] = {
+            "wall_s": round(time.perf_counter() - t0, 3),
+            "ai_requests": server.mock_config.requests - before,
+            "prompt_tokens": sum(e["prompt_tokens"] for e in usage),
+            "completion_tokens": sum(e["completion_tokens"] for e in usage),
+        }
+    return {"grades": grades, **rows}
+
+
+def print_comparison(baseline: Dict, current: Dict) -> None:
+    print(f"\nPorovnání s {baseline.get('commit')} (p50, ms):")
+    old = {(r["corpus"], r["pack"]): r for r in baseline.get("corpus", [])}
+    for r in current["corpus"]:
+        b = old.get((r["corpus"], r["pack"]))
+        if not b:
+            continue
+        for metric in ("build_student_doc", "build_method_doc", "doc_to_bytes_student", "generate_all_from_text"):
+            before, after = b[metric]["p50_ms"], r[metric]["p50_ms"]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"  {r['corpus']:>6}/{r['pack']:<8} {metric:<24} {before:9.1f} → {after:9.1f}  ({change:+.0f} %)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--clients", default="1,4,8", help="počty souběžných klientů, oddělené čárkou")
+    parser.add_argument("--per-client", type=int, default=3)
+    parser.add_argument("--grades", default="3,4,5", help="ročníky pro porovnání sady (generate_all_grades)")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="latence mock AI")
+    parser.add_argument("--tokens-per-s", type=float, default=0.0, help="rychlost psaní mock AI (0 = okamžitě)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="podíl pokažených JSON odpovědí mock AI")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="dřívější výsledky pro porovnání")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(
+        latency_ms=args.latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+    )
+    cache_dir = tempfile.mkdtemp(prefix="edread_bench_cache_")
+    os.environ.update(
+        {
+            "OPENAI_CHAT_URL": url,
+            "OPENAI_API_KEY": "mock",
+            "OPENAI_RPM": "100000",
+            "OPENAI_TPM": "100000000",
+            "EDREAD_CACHE_DIR": cache_dir,
+            # texty se liší jen číslem na konci – podobné texty by se jinak převzaly z cache (NearDuplicateIndex)
+            "EDREAD_NEAR_DUP": "0",
+            # slovníček se plní během běhu (jako v provozu), ale každý běh začíná prázdný
+            "EDREAD_GLOSSARY_DB": os.path.join(cache_dir, "glossary.sqlite3"),
+        }
+    )
+    import app
+
+    app.quiet_bare_mode_logs()
+    counter = itertools.count()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "corpus": [],
+        "concurrency": [],
+    }
+    for size, chars in CORPUS_SIZES.items():
+        text = make_text(chars)
+        for pack in ("custom", "karetni"):
+            row = bench_corpus(app, size, text, pack, args.repeat, counter)
+            results["corpus"].append(row)
+            print(
+                f"{size:>6}/{pack:<8} student {row['build_student_doc']['p50_ms']:7.1f} ms, "
+                f"method {row['build_method_doc']['p50_ms']:7.1f} ms, "
+                f"to_bytes {row['doc_to_bytes_student']['p50_ms']:7.1f} ms, "
+                f"e2e p50 {row['generate_all_from_text']['p50_ms']:7.1f} / p95 {row['generate_all_from_text']['p95_ms']:7.1f} ms, "
+                f"výstup {row['output_bytes'] / 1024:.0f} KiB, RSS {row['peak_rss_mb']} MB"
+            )
+
+    medium = make_text(CORPUS_SIZES["medium"])
+    for clients in (int(c) for c in args.clients.split(",")):
+        row = bench_concurrency(app, medium, clients, args.per_client, counter)
+        results["concurrency"].append(row)
+        print(
+            f"{clients:>3} klientů: {row['throughput_per_min']:7.1f} gen/min, "
+            f"p50 {row['latency']['p50_ms']:.0f} ms, p95 {row['latency']['p95_ms']:.0f} ms, RSS {row['peak_rss_mb']} MB"
+        )
+
+    grades = [int(g) for g in args.grades.split(",")]
+    results["grades"] = bench_grades(app, server, medium, grades, counter)
+    g = results["grades"]
+    print(
+        f"ročníky {args.grades}: zvlášť {g['separate']['wall_s']:.2f} s / {g['separate']['ai_requests']} dotazů / "
+        f"{g['separate']['prompt_tokens'] + g['separate']['completion_tokens']} tokenů, "
+        f"sada {g['shared']['wall_s']:.2f} s / {g['shared']['ai_requests']} dotazů / "
+        f"{g['shared']['prompt_tokens'] + g['shared']['completion_tokens']} tokenů"
+    )
+
+    results["mock_requests"] = server.mock_config.requests
+    server.shutdown()
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nVýsledky: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Zátěžový test „celá sborovna naráz“: N učitelů klikne na generování během pár minut, AI je lokální mock
+(benchmarks/mock_llm.py). Měří se jeden proces aplikace jako při `streamlit run app.py` z .devcontainer.
+
+Ovladače (--driver):
+- direct: každá session je vlákno, které volá generate_all_from_text (jako skript Streamlitu bez úloh
+  na pozadí); --workers > 0 omezí souběh poolem, jinak vlákno na session,
+- jobs: každá session zadá úlohu do JobQueue (EDREAD_BACKGROUND_JOBS=1, EDREAD_JOB_WORKERS = --workers)
+  a čeká na její dokončení,
+- streamlit: skutečná stránka přes streamlit.testing (AppTest) – načtení, vložení textu, klik, obnovování
+  stránky, dokud nejsou soubory ke stažení. AppTest není vláknově bezpečný, takže session obsluhuje jedno
+  vlákno postupně (reruny stránky se řadí za sebou); generování běží v JobQueue jako v provozu.
+
+Výstup: latence od kliknutí po hotové soubory (p50/p95/p99), čekání ve frontě (zadání → start generování),
+čekání uvnitř aplikace (limity RPM/TPM, čekání na stejné generování jiné session), zpoždění plánovače
+(zahlcený GIL / CPU), RSS na session, podíl chyb, počet dotazů na AI. Příklady:
+    python benchmarks/bench_load.py --sessions 30 --ramp-s 120 --driver jobs --workers 2
+    python benchmarks/bench_load.py --driver streamlit --sessions 10 --latency-ms 3000 --out zatez.json
+    python benchmarks/bench_load.py --driver direct --max-p99-s 60 --max-error-rate 0.05   # do CI
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_e2e import git_commit, make_text, percentile  # noqa: E402
+from mock_llm import start_mock_server  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_WAIT_STAGES = ("rate_limit_wait", "single_flight_wait")
+
+
+def current_rss_mb() -> float:
+    """Aktuální RSS procesu (Linux /proc; jinde špička z getrusage)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Sampler:
+    """
+    Vlákno na pozadí: každých `interval_s` změří RSS a o kolik se probudilo později, než mělo
+    (zpoždění plánovače – roste, když o GIL / CPU soupeří moc vláken).
+    """
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.rss: List[float] = []
+        self.lag_ms: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-sampler", daemon=True)
+
+    def _run(self) -> None:
+        tick = 0
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            time.sleep(self.interval_s)
+            self.lag_ms.append(max(0.0, (time.perf_counter() - t0 - self.interval_s) * 1000))
+            tick += 1
+            if tick % 10 == 0:
+                self.rss.append(current_rss_mb())
+
+    def __enter__(self) -> "Sampler":
+        self.rss.append(current_rss_mb())
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.rss.append(current_rss_mb())
+
+
+def summarize_s(samples: List[float]) -> Optional[Dict[str, float]]:
+    if not samples:
+        return None
+    return {
+        "n": len(samples),
+        "p50_s": round(statistics.median(samples), 3),
+        "p95_s": round(percentile(samples, 0.95), 3),
+        "p99_s": round(percentile(samples, 0.99), 3),
+        "max_s": round(max(samples), 3),
+    }
+
+
+def plan_sessions(sessions: int, ramp_s: float, same_text_ratio: float, seed: int) -> List[Dict]:
+    """Příchody rovnoměrně náhodně v okně ramp_s; část učitelů má stejný (oblíbený) článek, ostatní vlastní text."""
+    rnd = random.Random(seed)
+    popular = make_text(3000, seed=1)
+    plan = []
+    for i in range(sessions):
+        same = rnd.random() < same_text_ratio
+        plan.append(
+            {
+                "session": i,
+                "arrival_s": rnd.uniform(0, ramp_s) if ramp_s else 0.0,
+                # stejný článek pro stejný ročník (kolegové z paralelních tříd) → sdílí cache i single-flight
+                "grade": 4 if same else rnd.choice((3, 4, 5)),
+                "title": "Karetní hra" if same else f"Text {i}",
+                # unikátní konec textu → jiný klíč cache (podobnost textů hlídá EDREAD_NEAR_DUP=0)
+                "text": popular if same else f"{make_text(rnd.choice((1500, 3000, 6000)), seed=i)}\n\n(třída {i})",
+            }
+        )
+    return sorted(plan, key=lambda s: s["arrival_s"])
+
+
+def app_wait_s(trace: List[Dict]) -> float:
+    return sum(e.get("ms", 0.0) for e in trace if e.get("stage") in APP_WAIT_STAGES) / 1000
+
+
+def wait_until(t0: float, arrival_s: float) -> None:
+    delay = t0 + arrival_s - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run_direct(app, plan: List[Dict], workers: int) -> List[Dict]:
+    results: List[Dict] = []
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+
+    def generate(s: Dict, arrived: float) -> None:
+        started = time.perf_counter()
+        row = {"session": s["session"], "queue_s": started - arrived}
+        with app.collect_trace() as trace:
+            try:
+                files = app.generate_all_from_text(s["title"], s["grade"], s["text"])
+                row["ok"] = len(files) >= len(app.DOCUMENT_KEYS)
+                row["error"] = None if row["ok"] else f"jen {len(files)} souborů"
+            except Exception as e:
+                row["ok"], row["error"] = False, str(e)
+        row["latency_s"] = time.perf_counter() - arrived
+        row["app_wait_s"] = app_wait_s(trace)
+        with lock:
+            results.append(row)
+
+    pool = ThreadPoolExecutor(max_workers=workers) if workers else None
+    threads = []
+    for s in plan:
+        wait_until(t0, s["arrival_s"])
+        arrived = time.perf_counter()
+        if pool is not None:
+            pool.submit(generate, s, arrived)
+        else:
+            # jako Streamlit: každá session má vlastní vlákno skriptu
+            thread = threading.Thread(target=generate, args=(s, arrived), name=f"session-{s['session']}")
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if pool is not None:
+        pool.shutdown(wait=True)
+    return results
+
+
+def run_jobs(app, plan: List[Dict], poll_s: float) -> List[Dict]:
+    queue = app.get_job_queue()
+    pending: Dict[str, Dict] = {}
+    results: List[Dict] = []
+    t0 = time.perf_counter()
+    upcoming = list(plan)
+    while upcoming or pending:
+        while upcoming and time.perf_counter() - t0 >= upcoming[0]["arrival_s"]:
+            s = upcoming.pop(0)
+            pending[queue.submit(s["title"], s["grade"], s["text"])] = s
+        for job_id in list(pending):
+            job = queue.get(job_id)
+            if job["status"] in ("done", "failed"):
+                s = pending.pop(job_id)
+                results.append(
+                    {
+                        "session": s["session"],
+                        "ok": job["status"] == "done",
+                        "error": job["error"],
+                        "queue_s": (job["started"] or job["finished"]) - job["created"],
+                        "latency_s": job["finished"] - job["created"],
+                        "app_wait_s": app_wait_s(job["trace"]),
+                    }
+                )
+        time.sleep(poll_s)
+    return results
+
+
+def run_streamlit(plan: List[Dict], poll_s: float, timeout_s: float) -> List[Dict]:
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(ROOT, "app.py")
+    active: List[Dict] = []
+    results: List[Dict] = []
+    t0 = time.perf_counter()
+    upcoming = list(plan)
+    while upcoming or active:
+        while upcoming and time.perf_counter() - t0 >= upcoming[0]["arrival_s"]:
+            s = upcoming.pop(0)
+            r0 = time.perf_counter()
+            at = AppTest.from_file(app_path, default_timeout=timeout_s).run()
+            page_s = time.perf_counter() - r0
+            at.text_area[0].input(s["text"])
+            next(w for w in at.text_input if w.label == "Název úlohy:").input(s["title"])
+            next(w for w in at.number_input if w.label.startswith("Ročník")).set_value(s["grade"])
+            clicked = time.perf_counter()
+            at.button(key="btn_generate").click().run()
+            active.append({"s": s, "at": at, "clicked": clicked, "page_s": page_s, "click_s": time.perf_counter() - clicked})
+
+        for item in list(active):
+            at = item["at"]
+            r0 = time.perf_counter()
+            # hotovo = tlačítka souborů (ke stažení se soubor připraví až po kliknutí na ně)
+            done = any(str(b.key).startswith("prep_") for b in at.button) or bool(at.get("download_button"))
+            errors = [e.value for e in at.exception] + [e.value for e in at.error]
+            if not done and not errors and time.perf_counter() - item["clicked"] < timeout_s:
+                at.run()
+                item.setdefault("rerun_s", []).append(time.perf_counter() - r0)
+                continue
+            active.remove(item)
+            results.append(
+                {
+                    "session": item["s"]["session"],
+                    "clicked_s": item["clicked"] - t0,
+                    "ok": done and not errors,
+                    "error": "; ".join(errors) or (None if done else "časový limit"),
+                    "latency_s": time.perf_counter() - item["clicked"],
+                    "page_s": item["page_s"],
+                    "click_s": item["click_s"],
+                    "rerun_s": statistics.median(item.get("rerun_s") or [0.0]),
+                }
+            )
+        time.sleep(poll_s)
+    return results
+
+
+def job_queue_delays(db_path: str) -> List[float]:
+    """Čekání ve frontě podle databáze úloh v pořadí zadání (u ovladače streamlit ho stránka neukazuje)."""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT created, COALESCE(started, finished) FROM jobs ORDER BY created").fetchall()
+    return [started - created for created, started in rows if started is not None]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--driver", choices=("direct", "jobs", "streamlit"), default="jobs")
+    parser.add_argument("--sessions", type=int, default=30, help="počet učitelů (session)")
+    parser.add_argument("--ramp-s", type=float, default=60.0, help="okno, ve kterém všichni kliknou")
+    parser.add_argument("--workers", type=int, default=2, help="EDREAD_JOB_WORKERS; u direct 0 = vlákno na session")
+    parser.add_argument("--same-text-ratio", type=float, default=0.2, help="podíl učitelů se stejným článkem")
+    parser.add_argument("--latency-ms", type=float, default=1500.0, help="latence mock AI")
+    parser.add_argument("--tokens-per-s", type=float, default=150.0, help="rychlost psaní mock AI")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="podíl odpovědí 429 z mock AI")
+    parser.add_argument("--rpm", default="500", help="OPENAI_RPM (limit účtu)")
+    parser.add_argument("--tpm", default="200000", help="OPENAI_TPM (limit účtu)")
+    parser.add_argument("--poll-s", type=float, default=0.25, help="jak často session obnovuje stav")
+    parser.add_argument("--timeout-s", type=float, default=600.0, help="déle čekající session je chyba (streamlit)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p99-s", type=float, help="skončit s kódem 1, když p99 latence překročí limit")
+    parser.add_argument("--max-error-rate", type=float, help="skončit s kódem 1, když podíl chyb překročí limit")
+    parser.add_argument("--out", default="load_results.json")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(
+        latency_ms=args.latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    tmp = tempfile.mkdtemp(prefix="edread_load_")
+    jobs_db = os.path.join(tmp, "jobs.sqlite3")
+    os.environ.update(
+        {
+            "OPENAI_CHAT_URL": url,
+            "OPENAI_API_KEY": "mock",
+            "OPENAI_RPM": args.rpm,
+            "OPENAI_TPM": args.tpm,
+            # každý běh začíná se studenou cache, slovníčkem i frontou
+            "EDREAD_CACHE_DIR": os.path.join(tmp, "cache"),
+            "EDREAD_GLOSSARY_DB": os.path.join(tmp, "glossary.sqlite3"),
+            "EDREAD_ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+            "EDREAD_JOBS_DB": jobs_db,
+            "EDREAD_JOB_WORKERS": str(max(1, args.workers)),
+            "EDREAD_BACKGROUND_JOBS": "0" if args.driver == "direct" else "1",
+            "EDREAD_NEAR_DUP": "0",
+        }
+    )
+    plan = plan_sessions(args.sessions, args.ramp_s, args.same_text_ratio, args.seed)
+
+    import app
+
+    app.quiet_bare_mode_logs()
+    print(
+        f"{args.driver}: {args.sessions} session během {args.ramp_s:.0f} s, workers {args.workers}, "
+        f"mock AI {args.latency_ms:.0f} ms + {args.tokens_per_s:.0f} tok/s"
+    )
+    # zahřátí mimo měření: líně načítané knihovny (python-docx, …) by se jinak započítaly do RSS na session
+    app.generate_all_from_text("Zahřátí", 5, make_text(600, seed=99))
+    warmup_requests = server.mock_config.requests
+    wall0 = time.perf_counter()
+    with Sampler() as sampler:
+        if args.driver == "direct":
+            rows = run_direct(app, plan, args.workers)
+        elif args.driver == "jobs":
+            rows = run_jobs(app, plan, args.poll_s)
+        else:
+            rows = run_streamlit(plan, args.poll_s, args.timeout_s)
+    wall = time.perf_counter() - wall0
+
+    if args.driver == "streamlit":
+        # session zadávají úlohy jedna po druhé → pořadí úloh = pořadí kliknutí
+        for row, delay in zip(sorted(rows, key=lambda r: r["clicked_s"]), job_queue_delays(jobs_db)):
+            row["queue_s"] = delay
+    ok = [r for r in rows if r["ok"]]
+    errors = [r for r in rows if not r["ok"]]
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "wall_s": round(wall, 2),
+        "throughput_per_min": round(len(ok) / wall * 60, 1),
+        "latency": summarize_s([r["latency_s"] for r in ok]),
+        "queue": summarize_s([r["queue_s"] for r in rows if "queue_s" in r]),
+        "app_wait": summarize_s([r["app_wait_s"] for r in rows if "app_wait_s" in r]),
+        "page": summarize_s([r["page_s"] for r in rows if "page_s" in r]),
+        "click": summarize_s([r["click_s"] for r in rows if "click_s" in r]),
+        "rerun": summarize_s([r["rerun_s"] for r in rows if "rerun_s" in r]),
+        "scheduler_lag_ms": {
+            "p50": round(statistics.median(sampler.lag_ms or [0.0]), 2),
+            "p99": round(percentile(sampler.lag_ms or [0.0], 0.99), 2),
+        },
+        "rss_mb": {"start": round(sampler.rss[0], 1), "peak": round(max(sampler.rss), 1)},
+        "rss_per_session_mb": round((max(sampler.rss) - sampler.rss[0]) / max(1, len(rows)), 2),
+        "error_rate": round(len(errors) / max(1, len(rows)), 3),
+        "errors": sorted({str(r["error"])[:200] for r in errors}),
+        "ai_requests": server.mock_config.requests - warmup_requests,
+        "sessions": sorted(rows, key=lambda r: r["session"]),
+    }
+    server.shutdown()
+
+    def fmt(summary: Optional[Dict], label: str) -> str:
+        if not summary:
+            return ""
+        return f"{label} p50 {summary['p50_s']:.2f} / p95 {summary['p95_s']:.2f} / p99 {summary['p99_s']:.2f} s"
+
+    print(f"hotovo {len(ok)}/{len(rows)} za {wall:.1f} s ({results['throughput_per_min']} gen/min), "
+          f"{results['ai_requests']} dotazů na AI, chybovost {results['error_rate']:.1%}")
+    for key, label in (("latency", "latence"), ("queue", "fronta"), ("app_wait", "čekání v aplikaci"),
+                       ("page", "načtení stránky"), ("click", "klik (zadání úlohy)"), ("rerun", "rerun stránky")):
+        line = fmt(results[key], label)
+        if line:
+            print(f"  {line}")
+    print(f"  zpoždění plánovače p99 {results['scheduler_lag_ms']['p99']} ms, RSS {results['rss_mb']['start']} → "
+          f"{results['rss_mb']['peak']} MB ({results['rss_per_session_mb']} MB na session)")
+    for error in results["errors"]:
+        print(f"  ✗ {error}")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Výsledky: {args.out}")
+
+    failures = []
+    p99 = (results["latency"] or {}).get("p99_s")
+    if args.max_p99_s is not None and (p99 is None or p99 > args.max_p99_s):
+        failures.append(f"p99 latence {p99} s > limit {args.max_p99_s} s")
+    if args.max_error_rate is not None and results["error_rate"] > args.max_error_rate:
+        failures.append(f"chybovost {results['error_rate']:.1%} > limit {args.max_error_rate:.1%}")
+    for failure in failures:
+        print(f"✗ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Benchmark renderování dokumentů: sériově vs. thread pool vs. process pool.
+
+Spuštění (z kořene repozitáře):
+    python benchmarks/bench_render.py --repeat 5 --paragraphs 200
+    python benchmarks/bench_render.py --formats docx,pdf,odt,html
+
+AI se nevolá – struktura je syntetická, měří se jen stavba a serializace dokumentů
+(cache hotových souborů je vypnutá, jinak by se od druhého opakování nic nerenderovalo).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+PARAGRAPH = (
+    "Karetní hra Kdo přebije koho je určená pro dva až pět hráčů. Každý hráč dostane stejný počet karet "
+    "a snaží se co nejdříve zbavit všech karet v ruce. Silnější zvíře přebije slabší, chameleon je žolík."
+)
+
+
+def long_structure(paragraphs: int) -> app.GeneratedStructure:
+    text = "\n\n".join(PARAGRAPH for _ in range(paragraphs))
+    return app.GeneratedStructure(
+        simpl=text[: len(text) * 2 // 3],
+        lmp=text[: len(text) // 2],
+        drama_intro="Zahrajeme si krátkou scénku o kartách.",
+        drama_scene=[(f"Hráč {i}", "Tohle přebiju!") for i in range(1, 6)],
+        glossary={f"slovo{i}": "krátké vysvětlení slova" for i in range(12)},
+        questions_A=[f"Otázka A{i}?" for i in range(4)],
+        questions_B=[f"Otázka B{i}?" for i in range(3)],
+        questions_C=[f"Otázka C{i}?" for i in range(3)],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=200, help="délka textu v odstavcích")
+    parser.add_argument("--pack", default="karetni", help="karetni / sladke / venecky / custom")
+    parser.add_argument("--modes", default=",".join(app.RENDER_EXECUTORS))
+    parser.add_argument("--formats", default="docx", help=f"oddělené čárkou: {', '.join(app.OUTPUT_FORMATS)}")
+    args = parser.parse_args()
+    app.quiet_bare_mode_logs()
+
+    structure = long_structure(args.paragraphs)
+    full_text = "\n\n".join(PARAGRAPH for _ in range(args.paragraphs))
+    formats = app.get_output_formats(args.formats.split(","))
+    print(f"text: {len(full_text)} znaků, pack: {args.pack}, formáty: {', '.join(formats)}, opakování: {args.repeat}")
+
+    def render(mode: str):
+        return app.render_documents("Benchmark", 5, full_text, structure, args.pack, executor=mode, formats=formats, use_cache=False)
+
+    baseline = None
+    for mode in args.modes.split(","):
+        # zahřátí (a u poolů vytvoření workerů) se do měření nepočítá
+        render(mode)
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = render(mode)
+            times.append(time.perf_counter() - t0)
+        median = statistics.median(times)
+        baseline = baseline or median
+        size = sum(len(v) for v in out.values())
+        print(
+            f"{mode:>8}: median {median * 1000:8.1f} ms   min {min(times) * 1000:8.1f} ms   "
+            f"zrychlení {baseline / median:4.2f}×   výstup {size / 1024:.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark studeného startu aplikace – hlídá, aby se úvodní stránka neprodlužovala.
+
+Každé měření běží v novém procesu (jako studený start na Streamlit Cloud):
+- import_ms: `import app` (bez importu samotného streamlitu, ten je stejný pro všechny verze),
+- first_render_ms: první vykreslení stránky (streamlit.testing AppTest, bez generování),
+- rerun_ms: další rerun téže stránky (každá změna ve formuláři),
+- heavy_modules: těžké knihovny, které se načetly už při importu (mají se načítat až při generování).
+
+Skončí s kódem 1, když medián překročí limit nebo se při importu načte těžká knihovna –
+jde tak pustit v CI jako test:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 7 --max-import-ms 200 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("docx", "requests", "PIL", "pandas", "pyarrow", "numpy", "reportlab", "lxml")
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+t0 = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - t0) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60)
+t0 = time.perf_counter()
+at.run()
+first_render_ms = (time.perf_counter() - t0) * 1000
+t0 = time.perf_counter()
+at.run()
+rerun_ms = (time.perf_counter() - t0) * 1000
+errors = [e.value for e in at.exception]
+print(json.dumps(dict(import_ms=import_ms, first_render_ms=first_render_ms, rerun_ms=rerun_ms, heavy=heavy, errors=errors)))
+"""
+
+
+def measure_once() -> Dict:
+    tmp = tempfile.mkdtemp(prefix="edread_startup_")
+    env = dict(
+        os.environ,
+        EDREAD_CACHE_DIR=os.path.join(tmp, "cache"),
+        EDREAD_JOBS_DB=os.path.join(tmp, "jobs.sqlite3"),
+        EDREAD_GLOSSARY_DB=os.path.join(tmp, "glossary.sqlite3"),
+        EDREAD_ARTIFACT_DIR=os.path.join(tmp, "artifacts"),
+    )
+    code = CHILD.format(root=ROOT, heavy=HEAVY_MODULES, app=os.path.join(ROOT, "app.py"))
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=250.0)
+    parser.add_argument("--max-first-render-ms", type=float, default=700.0)
+    parser.add_argument("--max-rerun-ms", type=float, default=400.0)
+    parser.add_argument("--allow-heavy", action="store_true", help="nehlásit těžké knihovny načtené při importu")
+    parser.add_argument("--out", help="zapsat výsledky do JSON")
+    args = parser.parse_args()
+
+    runs: List[Dict] = [measure_once() for _ in range(args.runs)]
+    results = {
+        metric: round(statistics.median(r[metric] for r in runs), 1)
+        for metric in ("import_ms", "first_render_ms", "rerun_ms")
+    }
+    results["heavy_modules"] = sorted({m for r in runs for m in r["heavy"]})
+    results["errors"] = sorted({e for r in runs for e in r["errors"]})
+
+    limits = {
+        "import_ms": args.max_import_ms,
+        "first_render_ms": args.max_first_render_ms,
+        "rerun_ms": args.max_rerun_ms,
+    }
+    failures = [f"{m} {results[m]:.0f} ms > limit {limit:.0f} ms" for m, limit in limits.items() if results[m] > limit]
+    if results["heavy_modules"] and not args.allow_heavy:
+        failures.append(f"při importu se načetlo: {', '.join(results['heavy_modules'])}")
+    if results["errors"]:
+        failures.append(f"chyby při vykreslení: {'; '.join(results['errors'])}")
+
+    print(
+        f"import {results['import_ms']:.0f} ms, první vykreslení {results['first_render_ms']:.0f} ms, "
+        f"rerun {results['rerun_ms']:.0f} ms (medián z {args.runs})"
+    )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(dict(results, limits=limits, runs=runs), f, ensure_ascii=False, indent=2)
+    for failure in failures:
+        print(f"✗ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
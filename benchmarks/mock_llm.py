@@ -0,0 +1,220 @@
+"""
+Lokální náhrada OpenAI Chat Completions API pro benchmarky a zátěžové testy.
+
+Vrací připravený JSON ve tvaru GeneratedStructure (zjednodušení = zkrácený vstupní text),
+s nastavitelnou latencí, rychlostí „psaní“ (tokeny/s), podílem chyb a podporou stream=True (SSE).
+
+Samostatné spuštění:
+    python benchmarks/mock_llm.py --port 8765 --latency-ms 500 --tokens-per-s 80
+    OPENAI_CHAT_URL=http://127.0.0.1:8765/v1/chat/completions OPENAI_API_KEY=mock streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+STRUCTURE_KEYS = (
+    "simpl",
+    "lmp",
+    "drama_intro",
+    "drama_scene",
+    "glossary",
+    "questions_A",
+    "questions_B",
+    "questions_C",
+)
+
+
+class MockConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        tokens_per_s: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = float(latency_ms)
+        self.tokens_per_s = float(tokens_per_s)  # 0 = bez zpoždění za výstupní tokeny
+        self.error_rate = float(error_rate)  # podíl odpovědí 500
+        self.rate_limit_rate = float(rate_limit_rate)  # podíl odpovědí 429 s Retry-After
+        self.malformed_rate = float(malformed_rate)  # podíl odpovědí v ```json s komentářem, nebo useknutých
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self) -> float:
+        with self.lock:
+            self.requests += 1
+            return self.random.random()
+
+    def malform(self, content: str) -> str:
+        """S pravděpodobností malformed_rate pokazí odpověď jako skutečný model (ploty / useknutí)."""
+        with self.lock:
+            roll = self.random.random()
+            cut = self.random.uniform(0.5, 0.95)
+        if roll >= self.malformed_rate:
+            return content
+        if roll < self.malformed_rate / 2:
+            return f"Tady je výsledek:\n```json\n{content}\n```\nSnad to pomůže."
+        return content[: int(len(content) * cut)]
+
+
+def simplify(text: str, max_words: int, max_word_len: int) -> str:
+    """Hrubá náhrada zjednodušení: kratší věty a bez dlouhých slov (nižší LIX než originál)."""
+    paragraphs = []
+    for para in text.split("\n\n"):
+        sentences = []
+        for sentence in re.split(r"(?<=[.!?])\s+", para.strip()):
+            words = [w for w in sentence.rstrip(".!?").split() if len(w.strip(",;:")) <= max_word_len]
+            if words:
+                sentences.append(" ".join(words[:max_words]).rstrip(",;:") + ".")
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(p for p in paragraphs if p) or text
+
+
+def canned_response(user_prompt: str) -> Dict:
+    """Odpověď odvozená ze vstupního textu v promptu; vrací jen klíče, které prompt žádá."""
+    m = re.search(r'"""(.*?)"""', user_prompt, re.S)
+    text = m.group(1).strip() if m else "Text"
+    words = [w.strip(".,;:!?()\"„“") for w in text.split()]
+    hard = sorted({w for w in words if len(w) >= 9})[:10] or ["slovo"]
+    asked = re.search(r"vysvětli jen tato slova z textu \(jiná nepřidávej\): ([^\n]*?),?\n", user_prompt)
+    if asked:
+        hard = [w.strip() for w in asked.group(1).rstrip(".").split(",") if w.strip()]
+    data = {
+        # „zjednodušení“ = zkrácené věty, aby prošla i kontrola čitelnosti v aplikaci
+        "simpl": simplify(text, 10, 9),
+        "lmp": simplify(text, 6, 7),
+        "drama_intro": "Zahrajeme si krátkou scénku k textu.",
+        "drama_scene": [["Vypravěč", "Dnes si přečteme zajímavý text."], ["Žák", "Na co se máme zaměřit?"]],
+        "glossary": {w: "krátké vysvětlení pro žáky" for w in hard},
+        "questions_A": ["Kdo vystupuje v textu?", "Kde se děj odehrává?", "Co se stalo nejdřív?"],
+        "questions_B": ["Proč to postava udělala?", "Co znamená hlavní myšlenka?"],
+        "questions_C": ["Souhlasíš s tím? Proč?", "Co bys udělal(a) ty?"],
+    }
+    tail = user_prompt.rsplit("VRAŤ POUZE JSON VE FORMÁTU:", 1)[-1]
+    wanted = [k for k in STRUCTURE_KEYS if f'"{k}"' in tail]
+    return {k: data[k] for k in (wanted or STRUCTURE_KEYS)}
+
+
+def make_handler(config: MockConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, headers: Dict[str, str] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            roll = config.roll()
+            time.sleep(config.latency_ms / 1000.0)
+            if roll < config.rate_limit_rate:
+                self._send(429, b'{"error": {"message": "Rate limit (mock)"}}', {"Retry-After": "1"})
+                return
+            if roll < config.rate_limit_rate + config.error_rate:
+                self._send(500, b'{"error": {"message": "Server error (mock)"}}')
+                return
+
+            messages = payload.get("messages", [])
+            user_prompt = messages[-1]["content"] if messages else ""
+            content = config.malform(json.dumps(canned_response(user_prompt), ensure_ascii=False, indent=1))
+            prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+            completion_tokens = max(1, len(content) // 4)
+
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            if payload.get("stream"):
+                include_usage = (payload.get("stream_options") or {}).get("include_usage")
+                self._stream(content, usage if include_usage else None)
+                return
+
+            if config.tokens_per_s:
+                time.sleep(completion_tokens / config.tokens_per_s)
+            body = {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }
+            self._send(200, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+        def _stream(self, content: str, usage: Dict = None) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            step = 16  # ~4 tokeny na kousek
+            delay = (step / 4) / config.tokens_per_s if config.tokens_per_s else 0.0
+            for i in range(0, len(content), step):
+                event = {"choices": [{"delta": {"content": content[i:i + step]}}]}
+                self._chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if delay:
+                    time.sleep(delay)
+            if usage:
+                # jako OpenAI se stream_options.include_usage: poslední událost bez choices
+                self._chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, str]:
+    """Spustí server ve vlákně na pozadí; vrací (server, URL pro OPENAI_CHAT_URL)."""
+    cfg = MockConfig(**config)
+    server = ThreadingHTTPServer((host, port), make_handler(cfg))
+    server.daemon_threads = True
+    server.mock_config = cfg
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1/chat/completions"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-s", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="podíl odpovědí s ploty / useknutých")
+    args = parser.parse_args()
+    server, url = start_mock_server(
+        args.host,
+        args.port,
+        latency_ms=args.latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+    )
+    print(f"Mock LLM běží na {url} (Ctrl+C ukončí)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Lokální server s Redis protokolem (RESP2) pro testy a benchmarky sdílené cache (EDREAD_CACHE_BACKEND=redis).
+
+Umí jen příkazy, které používá RedisBackend (GET, MGET, SET s EX/PX/NX/XX, DEL, EXISTS) a pár pomocných
+(PING, HELLO 2, DBSIZE, FLUSHDB); data drží v paměti, platnost klíčů hlídá při čtení. Volitelná latence
+napodobí server v jiné zóně.
+
+Samostatné spuštění:
+    python benchmarks/mock_redis.py --port 6380 --latency-ms 1
+    EDREAD_CACHE_BACKEND=redis EDREAD_REDIS_URL=redis://127.0.0.1:6380/0 streamlit run app.py
+"""
+import argparse
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class MockRedisStore:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = float(latency_ms)
+        self.lock = threading.Lock()
+        self.data: Dict[bytes, Tuple[bytes, float]] = {}  # klíč → (hodnota, vyprší v time.monotonic(); 0 = nikdy)
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires and time.monotonic() > expires:
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: List[bytes]):
+        """Vrací hodnotu odpovědi: bytes / int / None / list, výjimka ValueError = chybová odpověď."""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        name = args[0].upper().decode("ascii", "replace")
+        with self.lock:
+            self.commands += 1
+            if name == "PING":
+                return b"PONG" if len(args) == 1 else args[1]
+            if name == "GET":
+                return self._get(args[1])
+            if name == "MGET":
+                return [self._get(key) for key in args[1:]]
+            if name == "SET":
+                return self._set(args[1], args[2], [a.upper() for a in args[3:]], args[3:])
+            if name in ("DEL", "UNLINK"):
+                return sum(1 for key in args[1:] if self._get(key) is not None and self.data.pop(key))
+            if name == "EXISTS":
+                return sum(1 for key in args[1:] if self._get(key) is not None)
+            if name == "DBSIZE":
+                return sum(1 for key in list(self.data) if self._get(key) is not None)
+            if name == "FLUSHDB":
+                self.data.clear()
+                return "OK"
+            if name == "HELLO":
+                # jen RESP2; redis-py se protokolem HELLO ptá při každém připojení
+                if len(args) > 1 and args[1] != b"2":
+                    raise ValueError("NOPROTO this mock speaks only RESP2")
+                return [b"server", b"redis", b"version", b"7.2.0", b"proto", 2, b"mode", b"standalone"]
+            if name in ("CLIENT", "SELECT"):
+                return "OK"  # redis-py posílá CLIENT SETINFO při připojení
+        raise ValueError(f"unknown command '{name}'")
+
+    def _set(self, key: bytes, value: bytes, flags: List[bytes], raw: List[bytes]):
+        expires = 0.0
+        for i, flag in enumerate(flags):
+            if flag in (b"EX", b"PX"):
+                seconds = float(raw[i + 1]) / (1000.0 if flag == b"PX" else 1.0)
+                expires = time.monotonic() + seconds
+        exists = self._get(key) is not None
+        if (b"NX" in flags and exists) or (b"XX" in flags and not exists):
+            return None
+        self.data[key] = (value, expires)
+        return "OK"
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode("utf-8")
+    if isinstance(value, int):
+        return f":{value}\r\n".encode("ascii")
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode("ascii") + b"".join(encode(v) for v in value)
+    return f"${len(value)}\r\n".encode("ascii") + value + b"\r\n"
+
+
+def make_handler(store: MockRedisStore):
+    class Handler(socketserver.StreamRequestHandler):
+        def read_command(self) -> Optional[List[bytes]]:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b"*"):
+                return line.split()  # inline příkaz (např. z telnetu)
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            return args
+
+        def handle(self) -> None:
+            while True:
+                args = self.read_command()
+                if args is None:
+                    return
+                if not args:
+                    continue
+                try:
+                    reply = encode(store.execute(args))
+                except (ValueError, IndexError) as e:
+                    message = str(e)
+                    reply = f"-{message if message.startswith('NOPROTO') else 'ERR ' + message}\r\n".encode("utf-8")
+                self.wfile.write(reply)
+                self.wfile.flush()
+
+    return Handler
+
+
+class MockRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_mock_redis(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[MockRedisServer, str]:
+    """Spustí server ve vlákně na pozadí; vrací (server, URL pro EDREAD_REDIS_URL)."""
+    store = MockRedisStore(**config)
+    server = MockRedisServer((host, port), make_handler(store))
+    server.store = store
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_mock_redis(args.host, args.port, latency_ms=args.latency_ms)
+    print(f"Mock Redis běží na {url} (Ctrl+C ukončí)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
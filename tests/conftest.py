@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# testy nesmí sahat na cache, frontu ani slovníček v pracovním adresáři a nesmí volat skutečné API
+_TMP = tempfile.mkdtemp(prefix="edread_tests_")
+os.environ.update(
+    {
+        "OPENAI_API_KEY": "",
+        "EDREAD_CACHE_DIR": os.path.join(_TMP, "cache"),
+        "EDREAD_GLOSSARY_DB": os.path.join(_TMP, "glossary.sqlite3"),
+        "EDREAD_JOBS_DB": os.path.join(_TMP, "jobs.sqlite3"),
+        "EDREAD_ARTIFACT_DIR": os.path.join(_TMP, "artifacts"),
+    }
+)
@@ -0,0 +1,216 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import app
+
+sys.path.insert(0, os.path.join(app.APP_DIR, "benchmarks"))
+
+
+# =========================
+# Úložiště cache
+# =========================
+@pytest.fixture(scope="module")
+def redis_url():
+    # skutečný ovladač (balíček redis) proti lokálnímu serveru z benchmarků; bez balíčku se přeskočí
+    pytest.importorskip("redis")
+    from mock_redis import start_mock_redis
+
+    server, url = start_mock_redis()
+    yield url
+    server.shutdown()
+
+
+def backend_factory(kind, tmp_path, request):
+    def make(max_bytes=50 * 1024 * 1024, max_age_s=3600.0):
+        if kind == "memory":
+            return app.MemoryBackend(max_bytes=max_bytes, max_age_s=max_age_s)
+        if kind == "file":
+            return app.FileBackend(str(tmp_path / "files"), ".bin", max_bytes=max_bytes, max_age_s=max_age_s)
+        if kind == "sqlite":
+            return app.SqliteBackend(str(tmp_path / "cache.sqlite3"), "test", max_bytes=max_bytes, max_age_s=max_age_s)
+        url = request.getfixturevalue("redis_url")
+        return app.RedisBackend(url, f"test:{request.node.name}:", max_age_s=max_age_s)
+
+    return make
+
+
+@pytest.fixture(params=["memory", "file", "sqlite", "redis"])
+def make_backend(request, tmp_path):
+    return backend_factory(request.param, tmp_path, request)
+
+
+@pytest.fixture(params=["memory", "file", "sqlite"])
+def make_local_backend(request, tmp_path):
+    """Úložiště s vlastním limitem velikosti (Redis ho nechává na maxmemory-policy serveru)."""
+    return backend_factory(request.param, tmp_path, request)
+
+
+def test_backend_get_set_delete(make_backend):
+    backend = make_backend()
+    assert backend.get("a") is None
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    backend.set("a", b"3")
+    assert backend.get("a") == b"3"
+    assert backend.get_many(["a", "b", "c"]) == {"a": b"3", "b": b"2"}
+    backend.delete("a")
+    backend.delete("missing")
+    assert backend.get("a") is None and backend.get("b") == b"2"
+
+
+def test_backend_add_is_exclusive_until_ttl_expires(make_backend):
+    backend = make_backend()
+    assert backend.add("lock", b"x", ttl_s=0.2)
+    assert not backend.add("lock", b"y", ttl_s=0.2)
+    assert backend.get("lock") == b"x"
+    time.sleep(1.1)  # FileBackend měří platnost podle mtime (na některých FS s přesností na sekundy)
+    assert backend.add("lock", b"y", ttl_s=0.2)
+    assert backend.get("lock") == b"y"
+    backend.delete("lock")
+    assert backend.add("lock", b"z")
+
+
+def test_backend_peek_reads_without_extending_lock(make_backend):
+    backend = make_backend()
+    assert backend.add("lock", b"x", ttl_s=1)
+    deadline = time.monotonic() + 1.5
+    while time.monotonic() < deadline:
+        assert backend.peek("lock") in (b"x", None)
+        time.sleep(0.05)
+    assert backend.add("lock", b"y", ttl_s=1)
+
+
+def test_backend_evicts_least_recently_used(make_local_backend):
+    backend = make_local_backend(max_bytes=30)
+    for key in "abc":
+        backend.set(key, b"x" * 10)
+        time.sleep(0.02)
+    assert backend.get("a") == b"x" * 10  # „a“ je teď nejčerstvěji použitý
+    time.sleep(0.02)
+    backend.set("d", b"x" * 10)
+    assert backend.get("b") is None
+    assert all(backend.get(key) for key in "acd")
+
+
+def test_backend_concurrent_add_has_single_winner(make_backend):
+    backend = make_backend()
+    barrier = threading.Barrier(8)
+    wins = []
+
+    def worker(i):
+        barrier.wait()
+        if backend.add("flight", str(i).encode(), ttl_s=30):
+            wins.append(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(wins) == 1
+
+
+# =========================
+# SingleFlight
+# =========================
+def test_single_flight_runs_one_leader_per_key():
+    backend = app.MemoryBackend()
+    flight = app.SingleFlight(backend, lease_s=10, poll_s=0.01)
+    results = {}
+    generated = []
+    barrier = threading.Barrier(6)
+
+    def worker(i):
+        barrier.wait()
+        with flight.join("key", lambda: results.get("key")) as done:
+            if done is None:
+                generated.append(i)
+                time.sleep(0.1)
+                results["key"] = f"by {i}"
+                done = results["key"]
+        results[i] = done
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(generated) == 1
+    assert {results[i] for i in range(6)} == {f"by {generated[0]}"}
+    assert backend.get("key") is None  # zámek se po dokončení uvolní
+
+
+def test_single_flight_waiter_generates_when_leader_stored_nothing():
+    flight = app.SingleFlight(app.MemoryBackend(), lease_s=10, poll_s=0.01)
+    started = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def leader():
+        with flight.join("key", lambda: None) as done:
+            seen.append(("leader", done))
+            started.set()
+            release.wait(5)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with flight.join("key", lambda: None) as done:
+        seen.append(("waiter", done))
+    t.join()
+    assert seen == [("leader", None), ("waiter", None)]
+
+
+def test_single_flight_waits_for_lock_held_by_another_process():
+    backend = app.MemoryBackend()
+    stored = {}
+    assert backend.add("key", b"other-process", ttl_s=10)
+    threading.Timer(0.05, lambda: stored.update(key="result")).start()
+    flight = app.SingleFlight(backend, lease_s=5, poll_s=0.01)
+    with flight.join("key", lambda: stored.get("key")) as done:
+        assert done == "result"
+    assert backend.get("key") == b"other-process"  # cizí zámek se nemaže
+
+
+def test_single_flight_takes_over_stale_file_lock(tmp_path):
+    # zámek spadlého procesu: čekající ho převezme, jakmile vyprší – dotazy při čekání ho neprodlužují
+    backend = app.FileBackend(str(tmp_path / "locks"), ".lock")
+    assert backend.add("key", b"crashed-process", ttl_s=2)
+    os.utime(backend._path("key"), (time.time() - 1, time.time() - 1))  # zámek je už 1 s starý
+    flight = app.SingleFlight(backend, lease_s=2, poll_s=0.05)
+    started = time.monotonic()
+    with flight.join("key", lambda: None) as done:
+        waited = time.monotonic() - started
+        assert done is None
+        assert backend.peek("key") not in (None, b"crashed-process")
+        assert 0.8 < waited < 1.8  # po vypršení cizího zámku, ne až po vlastním lease
+    assert backend.peek("key") is None
+
+
+def test_file_backend_stale_lock_has_single_new_owner(tmp_path):
+    backend = app.FileBackend(str(tmp_path / "locks"), ".lock")
+    for _ in range(10):
+        assert backend.add("key", b"old", ttl_s=0.5)
+        os.utime(backend._path("key"), (time.time() - 5, time.time() - 5))
+        barrier = threading.Barrier(8)
+        wins = []
+
+        def worker(i):
+            barrier.wait()
+            if backend.add("key", str(i).encode(), ttl_s=0.5):
+                wins.append(i)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(wins) == 1
+        assert backend.peek("key") == str(wins[0]).encode()
+        backend.delete("key")
+    assert os.listdir(tmp_path / "locks") == []  # žádné náhrobky
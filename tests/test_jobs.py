@@ -0,0 +1,64 @@
+import time
+
+import app
+
+
+def insert_running(queue, job_id, owner, heartbeat):
+    with queue._db() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, title, grade, full_text, created, started, owner, heartbeat) "
+            "VALUES (?, 'running', 'Test', 4, 'Krátký text. Druhá věta textu.', ?, ?, ?, ?)",
+            (job_id, time.time(), time.time(), owner, heartbeat),
+        )
+
+
+def wait_for(queue, job_id, status, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.05)
+    return queue.get(job_id)
+
+
+def test_start_requeues_only_jobs_without_fresh_heartbeat(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    other = app.JobQueue(db, workers=1, heartbeat_s=60)
+    insert_running(other, "live", "other-process", time.time())
+    insert_running(other, "crashed", "gone-process", time.time() - 3600)
+    insert_running(other, "legacy", None, None)  # z verze bez heartbeatu
+
+    queue = app.JobQueue(db, workers=1, heartbeat_s=60)
+    assert wait_for(queue, "crashed", "done")["status"] == "done"
+    assert wait_for(queue, "legacy", "done")["status"] == "done"
+    assert queue.get("live")["status"] == "running"
+    assert queue.files("crashed") and not queue.files("live")
+
+
+def test_running_job_is_taken_over_once_its_owner_stops_beating(tmp_path):
+    queue = app.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=1, heartbeat_s=0.1)
+    insert_running(queue, "orphan", "gone-process", time.time())
+    assert queue.get("orphan")["status"] == "running"
+    assert wait_for(queue, "orphan", "done")["status"] == "done"
+
+
+def test_result_of_job_taken_over_by_another_process_is_discarded(tmp_path, monkeypatch):
+    queue = app.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=1, heartbeat_s=60)
+    job_id = queue.submit("Test", 4, "Krátký text. Druhá věta textu.")
+    assert wait_for(queue, job_id, "done")["status"] == "done"
+    with queue._db() as conn:
+        conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+        conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+    generate_all = app.generate_all
+
+    def taken_over(*args, **kwargs):
+        # během generování úlohu převezme jiný proces (tento dlouho neposlal heartbeat)
+        with queue._db() as conn:
+            conn.execute("UPDATE jobs SET owner = 'other-process' WHERE id = ?", (job_id,))
+        return generate_all(*args, **kwargs)
+
+    monkeypatch.setattr(app, "generate_all", taken_over)
+    queue._run(job_id)
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.files(job_id) == {}
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import app
+
+STRUCTURE = {
+    "simpl": "Krátký text.",
+    "lmp": "Velmi krátký text.",
+    "drama_intro": "Zahrajeme si scénku.",
+    "drama_scene": [["Učitel", "Dobrý den."], ["Žák", "Dobrý den."]],
+    "glossary": {"pravidla": "co se ve hře smí"},
+    "questions_A": ["Kdo hraje?"],
+    "questions_B": ["Proč vyhrál?"],
+    "questions_C": ["Co si myslíš?"],
+}
+
+
+def test_plain_json():
+    assert app.parse_model_json(json.dumps(STRUCTURE)) == STRUCTURE
+
+
+@pytest.mark.parametrize(
+    "wrap",
+    [
+        "```json\n{}\n```",
+        "```\n{}\n```",
+        "Tady je výsledek:\n```json\n{}\n```\nDoufám, že pomůže.",
+        "Výsledek: {} – hotovo.",
+        "```json\n{}",  # chybí uzavírací plot
+    ],
+)
+def test_fences_and_surrounding_text(wrap):
+    assert app.parse_model_json(wrap.format(json.dumps(STRUCTURE, ensure_ascii=False))) == STRUCTURE
+
+
+def test_truncated_in_string_keeps_complete_fields():
+    text = json.dumps(STRUCTURE, ensure_ascii=False)
+    cut = text[: text.index("Proč vyhrál") + 4]  # useknuto uprostřed otázky B
+    data = app.parse_model_json(cut)
+    assert data["simpl"] == STRUCTURE["simpl"]
+    assert data["questions_A"] == STRUCTURE["questions_A"]
+    assert "questions_C" not in data
+    assert app.invalid_fields(data) == ["questions_B", "questions_C"]
+
+
+def test_truncated_after_key_and_number():
+    assert app.parse_model_json('{"a": 1, "b": [1, 2') == {"a": 1, "b": [1, 2]}
+    assert app.parse_model_json('{"a": "x", "b":') == {"a": "x"}
+    assert app.repair_truncated_json('{"a": {"b": "c", "d": "e') == {"a": {"b": "c"}}
+
+
+@pytest.mark.parametrize("text", ["", "Omlouvám se, nevím.", "[1, 2, 3]", "```json\n```", '{"a'])
+def test_nothing_usable_raises(text):
+    with pytest.raises(ValueError):
+        app.parse_model_json(text)
+
+
+def test_invalid_fields_reports_missing_wrong_type_and_empty():
+    data = dict(STRUCTURE, simpl="  ", questions_A="jen text", glossary={}, drama_scene=[["Učitel"]])
+    del data["lmp"]
+    assert app.invalid_fields(data) == ["simpl", "lmp", "drama_scene", "glossary", "questions_A"]
+    assert app.invalid_fields(STRUCTURE) == []
+    assert app.invalid_fields({"questions_C": [" "]}, fields=["questions_C"]) == ["questions_C"]
+
+
+def test_section_parser_emits_items_as_they_complete():
+    text = "```json\n" + json.dumps(STRUCTURE, ensure_ascii=False) + "\n```"
+    parser = app.JsonSectionParser()
+    seen = []
+    for i in range(0, len(text), 7):
+        seen.extend(parser.feed(text[i : i + 7]))
+    assert [key for key, _ in seen] == list(STRUCTURE)
+    assert dict(seen) == STRUCTURE
+
+
+def test_section_parser_ignores_braces_in_strings_and_waits_for_nested_values():
+    parser = app.JsonSectionParser()
+    assert parser.feed('{"a": "x, {y}') == []
+    assert parser.feed(' \\" z", "b": [1, {"c": 2}') == [("a", 'x, {y} " z')]
+    assert parser.feed("]") == []
+    assert parser.feed("}") == [("b", [1, {"c": 2}])]
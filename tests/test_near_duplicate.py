@@ -0,0 +1,71 @@
+import pytest
+
+import app
+
+
+TEXT = " ".join(
+    [
+        "Karetní hra se zvířaty je určená pro dva až pět hráčů od šesti let.",
+        "Každý hráč dostane na začátku stejný počet karet se zvířaty.",
+        "Silnější zvíře přebije slabší, ale malý komár dokáže přebít slona.",
+        "Vyhrává ten, kdo se jako první zbaví všech karet v ruce.",
+    ]
+)
+
+
+def test_minhash_is_deterministic_and_ignores_case_accents_and_spaces():
+    a = app.minhash_signature(TEXT)
+    assert a.dtype.name == "uint32" and a.shape == (app.NEAR_DUP_PERMUTATIONS,)
+    assert (a == app.minhash_signature(TEXT)).all()
+    b = app.minhash_signature("  " + app.fold_text(TEXT).upper().replace(" ", "   ") + "\n")
+    assert app.signature_similarity(a, b) == 1.0
+
+
+def test_minhash_similarity_tracks_edits():
+    a = app.minhash_signature(TEXT)
+    typo = app.minhash_signature(TEXT.replace("stejný počet", "stejny pocet").replace("Silnější", "Silnjší"))
+    other = app.minhash_signature("V cukrárně prodávají věnečky s vanilkovým krémem a porota je hodnotí.")
+    assert app.signature_similarity(a, typo) > 0.7
+    assert app.signature_similarity(a, other) < 0.2
+    assert app.minhash_signature("") is None
+    assert app.minhash_signature("   ") is None
+
+
+def test_lsh_buckets_share_bands_only_for_similar_texts():
+    a = app.lsh_buckets(app.minhash_signature(TEXT))
+    assert len(a) == app.NEAR_DUP_BANDS and len(set(a)) == app.NEAR_DUP_BANDS
+    assert a == app.lsh_buckets(app.minhash_signature(TEXT))
+    typo = app.lsh_buckets(app.minhash_signature(TEXT.replace("komár", "komar")))
+    other = app.lsh_buckets(app.minhash_signature("Úplně jiný text o počasí na horách a v nížinách."))
+    assert set(a) & set(typo)
+    assert not set(a) & set(other)
+
+
+# =========================
+# Index téměř stejných textů
+# =========================
+@pytest.fixture(params=["sqlite", "shared"])
+def near_dup_index(request, tmp_path):
+    if request.param == "sqlite":
+        return app.NearDuplicateIndex(str(tmp_path / "near_dup.sqlite3"))
+    return app.SharedNearDuplicateIndex(app.MemoryBackend())
+
+
+def test_near_duplicate_index_finds_similar_text_in_same_scope(near_dup_index):
+    near_dup_index.add("orig", "scope-a", app.minhash_signature(TEXT))
+    near_dup_index.add("other", "scope-a", app.minhash_signature("Úplně jiný text o počasí na horách."))
+    typo = app.minhash_signature(TEXT.replace("komár", "komar"))
+    found = near_dup_index.find("scope-a", typo, threshold=0.8)
+    assert found is not None and found.key == "orig" and found.similarity >= 0.8
+    assert near_dup_index.find("scope-b", typo, threshold=0.8) is None
+    assert near_dup_index.find("scope-a", typo, threshold=1.01) is None
+
+
+def test_near_duplicate_index_remove(near_dup_index):
+    signature = app.minhash_signature(TEXT)
+    near_dup_index.add("orig", "scope-a", signature)
+    near_dup_index.remove("orig")
+    near_dup_index.remove("missing")
+    assert near_dup_index.find("scope-a", signature, threshold=0.5) is None
+    near_dup_index.add("orig", "scope-a", signature)
+    assert near_dup_index.find("scope-a", signature, threshold=1.0).key == "orig"
@@ -0,0 +1,124 @@
+import pytest
+
+import app
+
+
+# =========================
+# Omezení rychlosti a jistič
+# =========================
+def test_token_bucket_spends_and_refills():
+    bucket = app.TokenBucket(rate_per_min=60, capacity=10)
+    assert bucket.wait_time(6) == 0.0
+    assert bucket.wait_time(6) == pytest.approx(2.0, abs=0.05)
+    bucket.updated -= 2.0  # uplynuly 2 s = 2 jednotky
+    assert bucket.wait_time(6) == 0.0
+    assert bucket.tokens == pytest.approx(0.0, abs=0.05)
+
+
+def test_token_bucket_caps_large_requests_and_refill():
+    bucket = app.TokenBucket(rate_per_min=60, capacity=10)
+    bucket.updated -= 3600
+    assert bucket.wait_time(1000) == 0.0  # víc než zásobník se čeká nanejvýš na plný zásobník
+    assert bucket.wait_time(10) == pytest.approx(10.0, abs=0.05)
+
+
+def test_token_bucket_refund_does_not_overflow_capacity():
+    bucket = app.TokenBucket(rate_per_min=60, capacity=10)
+    bucket.refund(5)
+    assert bucket.tokens == 10
+    assert bucket.wait_time(4) == 0.0
+    bucket.refund(4)
+    assert bucket.tokens == pytest.approx(10, abs=0.05)
+
+
+def test_circuit_breaker_opens_after_threshold_failures():
+    breaker = app.CircuitBreaker(threshold=3, cooldown_s=30)
+    for _ in range(2):
+        breaker.record(False)
+        assert breaker.allow()
+    breaker.record(True)
+    assert breaker.failures == 0
+    for _ in range(3):
+        breaker.record(False)
+    assert breaker.opened_at is not None
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_half_open_lets_one_probe_through():
+    breaker = app.CircuitBreaker(threshold=1, cooldown_s=30)
+    breaker.record(False)
+    assert not breaker.allow()
+    breaker.opened_at -= 31
+    assert breaker.allow()
+    assert not breaker.allow()  # další dotazy čekají na výsledek zkušebního
+    breaker.record(False)
+    assert not breaker.allow()
+    breaker.opened_at -= 31
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.opened_at is None and breaker.allow() and breaker.allow()
+
+
+# =========================
+# OpenAIClient a jistič
+# =========================
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = f"status {status_code}"
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Místo requests.Session: vrací předem dané stavové kódy."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def post(self, url, **kwargs):
+        return FakeResponse(self.statuses.pop(0))
+
+
+def make_client(statuses, threshold=3):
+    client = app.OpenAIClient(max_retries=0, breaker=app.CircuitBreaker(threshold=threshold, cooldown_s=30))
+    client.session = FakeSession(statuses)
+    return client
+
+
+def post(client):
+    payload = {"messages": [{"role": "user", "content": "x"}], "max_tokens": 1}
+    return client.post("http://mock", {}, payload, timeout=1)
+
+
+def test_client_errors_do_not_reset_server_error_count():
+    client = make_client([500, 400, 502, 401, 503])
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            post(client)
+    assert client.breaker.failures == 3
+    assert not client.breaker.allow()
+
+
+def test_rate_limit_does_not_open_breaker():
+    client = make_client([429] * 5 + [200])
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            post(client)
+    assert client.breaker.failures == 0
+    assert post(client).status_code == 200
+
+
+def test_half_open_probe_with_client_error_keeps_breaker_open():
+    client = make_client([500, 401, 200], threshold=1)
+    with pytest.raises(RuntimeError):
+        post(client)
+    client.breaker.opened_at -= 31
+    with pytest.raises(RuntimeError):
+        post(client)  # zkušební dotaz s 401 o dostupnosti API nic neříká
+    assert client.breaker.opened_at is not None and not client.breaker.allow()
+    client.breaker.opened_at -= 31
+    assert post(client).status_code == 200
+    assert client.breaker.opened_at is None
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import app
+
+
+def naive_find(patterns, text):
+    return {p for p in patterns if p in text}
+
+
+def test_keyword_matcher_overlapping_and_nested_patterns():
+    patterns = ["he", "she", "his", "hers", "h", "ushers"]
+    matcher = app.KeywordMatcher(patterns)
+    for text in ["ushers", "ahishers", "", "xyz", "hhh", "she sells"]:
+        assert matcher.find(text) == naive_find(patterns, text), text
+
+
+def test_keyword_matcher_matches_naive_search_on_czech_text():
+    patterns = ["kdo prebije koho", "zolik", "chameleon", "mameni", "sladke", "venecek", "cukrarn", "karetni"]
+    text = app.fold_text("Sladké mámení: věneček z cukrárny. Žolík i chameleon! Kdo přebije koho?")
+    assert app.KeywordMatcher(patterns).find(text) == naive_find(patterns, text)
+
+
+def test_keyword_matcher_without_patterns():
+    assert app.KeywordMatcher([]).find("cokoliv") == set()
+
+
+def test_fold_text():
+    assert app.fold_text("Karetní HRA – Žolík") == "karetni hra – zolik"
+    assert app.fold_text(None) == ""
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return app.load_pack_registry(os.path.join(app.APP_DIR, "packs.json"))
+
+
+@pytest.mark.parametrize(
+    "title, text, pack",
+    [
+        ("Karetní hra", "", "karetni"),
+        ("KARETNI HRA se zvířaty", "", "karetni"),
+        ("Pravidla", "Kdo přebije koho? Rozhoduje síla zvířete.", "karetni"),
+        ("Pravidla", "Žolík se může proměnit v jiné zvíře.", "karetni"),
+        ("Sladké mámení", "", "sladke"),
+        ("Test", "V pořadu Sladké mámení porota hodnotila zákusky.", "sladke"),
+        ("Test", "Věneček z cukrárny U Mlsného jazýčku.", "venecky"),
+        ("Test", "Věneček upekla babička doma.", "custom"),  # pravidlo potřebuje obě slova
+        # text splní pravidla věnečků i sladkého mámení – jako dřív vyhrají věnečky (text_priority)
+        ("Test", "V pořadu Sladké mámení hodnotili věneček z cukrárny.", "venecky"),
+        ("Moje čtení", "Obyčejný text o počasí.", "custom"),
+    ],
+)
+def test_pack_detection(registry, title, text, pack):
+    assert registry.detect(title, text) == pack
+
+
+def test_pack_title_wins_over_text(registry):
+    assert registry.detect("Věnečky", "Žolík a chameleon") == "venecky"
+
+
+def test_text_priority_overrides_file_order_only_for_text():
+    def pack(name, title, rule, priority=None):
+        return app.Pack(name, name, [title], [rule], [], [], [], priority)
+
+    registry = app.PackRegistry(
+        [pack("a", "alfa", ["spolecne"], 2), pack("b", "beta", ["spolecne"], 1), pack("c", "alfa", ["jine"])]
+    )
+    assert registry.detect("Test", "Společné slovo") == "b"
+    assert registry.detect("Alfa beta", "Společné slovo") == "a"
+    assert [p.name for p in registry.text_order] == ["b", "a", "c"]
+
+
+def test_unknown_builder_is_rejected():
+    pack = app.Pack("x", "X", ["x"], [], [], ["neexistuje"], [])
+    with pytest.raises(ValueError):
+        app.PackRegistry([pack])
@@ -0,0 +1,75 @@
+import io
+import zipfile
+
+import pytest
+
+import app
+
+TITLE = "Karetní hra"
+TEXT = "Kdo přebije koho? Silnější zvíře přebije slabší. Žolík se může proměnit v jiné zvíře."
+
+
+@pytest.fixture(scope="module")
+def worksheets():
+    structure = app.fallback_structure(TEXT)
+    return app.build_worksheets(TITLE, 4, TEXT, structure, app.detect_pack(TITLE, TEXT))
+
+
+def render(worksheets, fmt):
+    output = app.OUTPUT_FORMATS[fmt]
+    return {
+        key: app.render_job(fmt, worksheet, output.prepare(worksheet) if output.prepare else None)
+        for key, worksheet in worksheets.items()
+    }
+
+
+def test_docx_contains_title_and_table_image(worksheets):
+    for key, data in render(worksheets, "docx").items():
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            assert "Karetní hra" in z.read("word/document.xml").decode("utf-8"), key
+            if key != "method":
+                assert any(name.startswith("word/media/") for name in z.namelist()), key
+
+
+def test_odt_is_a_valid_opendocument_package(worksheets):
+    for key, data in render(worksheets, "odt").items():
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            first = z.infolist()[0]
+            assert first.filename == "mimetype" and first.compress_type == zipfile.ZIP_STORED
+            assert z.read("mimetype") == b"application/vnd.oasis.opendocument.text"
+            assert "Karetní hra" in z.read("content.xml").decode("utf-8"), key
+            assert z.testzip() is None
+
+
+def test_html_contains_title(worksheets):
+    for key, data in render(worksheets, "html").items():
+        assert "Karetní hra" in data.decode("utf-8"), key
+
+
+def test_pdf_renders_czech_text(worksheets):
+    # reportlab je v requirements.txt, ale PDF je volitelný formát – bez balíčku nebo písma se test přeskočí
+    pytest.importorskip("reportlab")
+    try:
+        app.get_pdf_fonts()
+    except RuntimeError as e:
+        pytest.skip(str(e))
+    files = render(worksheets, "pdf")
+    assert all(data.startswith(b"%PDF") for data in files.values())
+    pypdf = pytest.importorskip("pypdf")
+    text = "".join(page.extract_text() for page in pypdf.PdfReader(io.BytesIO(files["pl_full"])).pages)
+    assert "Karetní hra" in text and "přebije" in text
+
+
+def test_missing_reportlab_is_reported(monkeypatch):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def no_reportlab(name, *args, **kwargs):
+        if name == "reportlab" or name.startswith("reportlab."):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_reportlab)
+    with pytest.raises(RuntimeError, match="reportlab"):
+        app.prepare_pdf(None)
@@ -0,0 +1,26 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# těžké knihovny se mají načítat až při generování / exportu, ne při prvním vykreslení stránky
+HEAVY_MODULES = (
+    "docx", "reportlab", "odf", "pypdf", "numpy", "redis", "requests", "PIL", "pandas", "pyarrow", "lxml",
+)
+
+
+def test_import_app_leaves_heavy_modules_unloaded():
+    code = (
+        "import json, sys; import app; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    # stejné sys.path jako testy, aby se knihovny nainstalované mimo site-packages daly najít (a odhalit)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + [p for p in sys.path if p]))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
@@ -0,0 +1,27 @@
+import app
+
+
+# =========================
+# StructureCache
+# =========================
+def test_structure_cache_round_trip_and_stats():
+    cache = app.StructureCache(app.MemoryBackend(), max_age_s=3600)
+    structure = app.fallback_structure("Krátký text. Druhá věta textu.")
+    assert cache.get("k") is None
+    cache.put("k", structure)
+    assert app.structure_to_dict(cache.get("k")) == app.structure_to_dict(structure)
+    assert cache.get("k", count=False) is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_structure_cache_drops_expired_and_corrupt_records():
+    backend = app.MemoryBackend()
+    cache = app.StructureCache(backend, max_age_s=3600)
+    cache.put("old", app.fallback_structure("Text."))
+    record = app.json.loads(backend.get("old"))
+    record["created"] -= 7200
+    backend.set("old", app.json.dumps(record).encode())
+    backend.set("bad", b"{not json")
+    assert cache.get("old") is None and backend.get("old") is None
+    assert cache.get("bad") is None